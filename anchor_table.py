@@ -0,0 +1,135 @@
+import json
+import os
+from array import array
+
+ANCHOR_FORMAT_VERSION = 2
+STRING_COLUMNS = ('media', 'ext', 'index', 'title', 'text', 'snippet')
+
+def source_fingerprint(docx_path):
+    """Dấu vân tay rẻ của file DOCX (size + mtime), đủ để biết bảng neo còn dùng được không"""
+    st = os.stat(docx_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _scan_state(state):
+    """Phần state ảnh hưởng tới kết quả quét (chỉ mục/tiêu đề mang sang từ shard trước)"""
+    state = state or {}
+    return {'current_index': state.get('current_index'), 'current_title': state.get('current_title')}
+
+class AnchorTable:
+    """Bảng neo ảnh của một DOCX: mỗi ảnh một hàng, lưu theo cột
+
+    Các cột chuỗi (media, ext, index, title, text, snippet) là array id trỏ vào một bảng chuỗi
+    dùng chung, nên chỉ mục lặp lại hàng trăm lần chỉ tốn 4 byte mỗi ảnh; paragraph là
+    vị trí đoạn văn (thứ tự trong docx_stream) chứa ảnh. Thứ tự hàng = STT của ảnh.
+    Preview, extract và các công cụ kiểm tra dùng lại bảng này thay vì parse lại DOCX.
+    """
+
+    def __init__(self, source=None, rules_version=None, state_in=None, state_out=None):
+        self.source = source or {}
+        self.rules_version = rules_version
+        self.state_in = _scan_state(state_in)
+        self.state_out = _scan_state(state_out)
+        self.strings = []
+        self._string_ids = {}
+        self.columns = {name: array('I') for name in STRING_COLUMNS}
+        self.paragraph = array('I')
+
+    @classmethod
+    def from_images(cls, images, docx_path, rules_version, state_in=None, state_out=None):
+        """Tạo bảng từ kết quả scan_images"""
+        table = cls(source_fingerprint(docx_path), rules_version, state_in, state_out)
+        for img in images:
+            table.append(img['file_path'], img.get('ext'), img['index'], img['title'], img['paragraph'],
+                         img['text'], img['context'])
+        return table
+
+    def _intern(self, value):
+        value = value or ''
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def append(self, media, ext, index, title, paragraph, text, snippet):
+        for name, value in zip(STRING_COLUMNS, (media, ext, index, title, text, snippet)):
+            self.columns[name].append(self._intern(value))
+        self.paragraph.append(paragraph)
+
+    def __len__(self):
+        return len(self.paragraph)
+
+    def row(self, i):
+        """Hàng thứ i (từ 0): dict ordinal (từ 1), media, ext, index, title, paragraph, text, snippet"""
+        row = {'ordinal': i + 1}
+        for name in STRING_COLUMNS:
+            row[name] = self.strings[self.columns[name][i]]
+        row['paragraph'] = self.paragraph[i]
+        return row
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def images(self):
+        """Danh sách ảnh cùng dạng với scan_images (file_path, ext, index, context, text, title, paragraph)"""
+        return [{
+            'file_path': row['media'],
+            'ext': row['ext'],
+            'index': row['index'],
+            'context': row['snippet'],
+            'text': row['text'],
+            'title': row['title'] or None,
+            'paragraph': row['paragraph'],
+        } for row in self]
+
+    def matches(self, docx_path, rules_version, state=None):
+        """True nếu bảng được tạo từ đúng file này, cùng luật đặt tên và cùng state đầu vào"""
+        try:
+            source = source_fingerprint(docx_path)
+        except OSError:
+            return False
+        return (self.source == source and self.rules_version == rules_version
+                and self.state_in == _scan_state(state))
+
+    def to_dict(self):
+        data = {
+            'version': ANCHOR_FORMAT_VERSION,
+            'source': self.source,
+            'rules_version': self.rules_version,
+            'state_in': self.state_in,
+            'state_out': self.state_out,
+            'count': len(self),
+            'strings': self.strings,
+            'columns': {name: self.columns[name].tolist() for name in STRING_COLUMNS},
+        }
+        data['columns']['paragraph'] = self.paragraph.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != ANCHOR_FORMAT_VERSION:
+            raise ValueError(f"phiên bản bảng neo không hỗ trợ: {data.get('version')}")
+        table = cls(data['source'], data['rules_version'], data['state_in'], data['state_out'])
+        table.strings = list(data['strings'])
+        table._string_ids = {value: i for i, value in enumerate(table.strings)}
+        for name in STRING_COLUMNS:
+            table.columns[name] = array('I', data['columns'][name])
+        table.paragraph = array('I', data['columns']['paragraph'])
+        return table
+
+    def save(self, path):
+        """Ghi bảng ra JSON gọn (ghi ra file tạm rồi đổi tên)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Đọc bảng đã lưu; file không có hoặc hỏng thì trả về None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
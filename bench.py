@@ -0,0 +1,490 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+# ==========================================================
+# Sinh DOCX giả lập sách SBT (không cần python-docx, chạy offline)
+# ==========================================================
+
+DEFAULT_PAGES = (10, 100, 400)
+DEFAULT_DENSITY = 30       # Số paragraph mỗi trang
+DEFAULT_IMAGE_RATE = 0.2   # Tỉ lệ paragraph là ảnh
+DEFAULT_TABLE_RATE = 0.3   # Xác suất mỗi trang có một bảng (có ô gộp, đôi khi có bảng lồng)
+DEFAULT_MEDIA_KB = 8
+
+_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+)
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+
+_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/></w:style>'
+    '</w:styles>'
+)
+
+_IMAGE_REL_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+_FILLER = (
+    "Một vật có khối lượng m được thả rơi tự do từ độ cao h so với mặt đất.",
+    "Cho đồ thị vận tốc theo thời gian như hình bên, hãy xác định gia tốc của vật.",
+    "Hai điện tích điểm đặt trong chân không cách nhau một khoảng r.",
+    "Chọn đáp án đúng nhất trong các phương án sau đây.",
+)
+
+_SECTION_TITLES = ("A. KIẾN THỨC CẦN NHỚ", "B. BÀI TẬP", "C. ĐÁP ÁN VÀ HƯỚNG DẪN GIẢI")
+_NO_LABEL = "Không xác định"
+
+def make_png(seed, size_bytes):
+    """Một file PNG hợp lệ 4x4 px, được độn chunk tEXt cho đủ khoảng size_bytes"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    color = bytes(((seed * 37) % 256, (seed * 91) % 256, (seed * 13) % 256))
+    raw = b''.join(b'\x00' + color * 4 for _ in range(4))
+    header = chunk(b'IHDR', struct.pack('>IIBBBBB', 4, 4, 8, 2, 0, 0, 0))
+    body = chunk(b'IDAT', zlib.compress(raw))
+    padding = max(0, size_bytes - 64)
+    filler = b'bench\x00' + random.Random(seed).randbytes(padding)
+    return b'\x89PNG\r\n\x1a\n' + header + chunk(b'tEXt', filler) + body + chunk(b'IEND', b'')
+
+class SyntheticBook:
+    """Sinh document.xml + media của một cuốn SBT giả lập
+
+    Mỗi trang gồm các paragraph: chỉ mục (Bài x.y, Hình x.y, Câu n, H.x.y), tiêu đề chương/mục,
+    ảnh inline và text thường; thỉnh thoảng có bảng với ô gộp ngang/dọc và bảng lồng.
+    Trong lúc sinh, expected ghi lại (media, nhãn) của từng ảnh theo thứ tự trong tài liệu - nhãn là
+    chỉ mục gần nhất phía trước, không có thì tiêu đề đang áp dụng - làm đáp án để kiểm tra extract.
+    """
+
+    def __init__(self, pages, density=DEFAULT_DENSITY, image_rate=DEFAULT_IMAGE_RATE,
+                 table_rate=DEFAULT_TABLE_RATE, media_kb=DEFAULT_MEDIA_KB, seed=1):
+        self.pages = pages
+        self.density = density
+        self.image_rate = image_rate
+        self.table_rate = table_rate
+        self.media_size = media_kb * 1024
+        self.rng = random.Random(seed)
+        self.media = []  # (rId, tên file trong word/media)
+        self.labels = set()  # Mọi chỉ mục/tiêu đề đã sinh
+        self.expected = []  # (media, nhãn) của từng ảnh theo thứ tự trong tài liệu
+        self.current_index = None
+        self.current_title = None
+        self.counts = {'paragraphs': 0, 'images': 0, 'table_images': 0, 'nested_images': 0, 'tables': 0}
+        self.table_depth = 0
+        self.chapter = 0
+        self.number = 0
+
+    def _image_run(self):
+        n = len(self.media) + 1
+        rid = f"rIdImg{n}"
+        self.media.append((rid, f"image{n}.png"))
+        self.expected.append((f"media/image{n}.png", self.current_index or self.current_title or _NO_LABEL))
+        self.counts['images'] += 1
+        if self.table_depth:
+            self.counts['table_images'] += 1
+        if self.table_depth > 1:
+            self.counts['nested_images'] += 1
+        return (
+            '<w:r><w:drawing><wp:inline><wp:extent cx="914400" cy="914400"/>'
+            f'<wp:docPr id="{n}" name="Picture {n}"/>'
+            '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="{n}" name="image{n}.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            '<pic:spPr/></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+        )
+
+    def _paragraph(self, text='', style=None, images=0):
+        self.counts['paragraphs'] += 1
+        ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+        run = f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>' if text else ''
+        return f'<w:p>{ppr}{run}{"".join(self._image_run() for _ in range(images))}</w:p>'
+
+    def _set_index(self, label):
+        self.labels.add(label)
+        self.current_index = label
+
+    def _set_title(self, title):
+        self.labels.add(title)
+        self.current_title = title
+        self.current_index = None  # Tiêu đề mới bỏ chỉ mục đang áp dụng
+
+    def _index_text(self):
+        self.number += 1
+        chapter, number = self.chapter, self.number
+        kind = self.rng.random()
+        if kind < 0.4:
+            self._set_index(f"Bài {chapter}.{number}")
+            return f"Bài {chapter}.{number}. {self.rng.choice(_FILLER)}"
+        if kind < 0.65:
+            self._set_index(f"Hình {chapter}.{number}")
+            return f"Hình {chapter}.{number} mô tả thí nghiệm."
+        if kind < 0.85:
+            self._set_index(f"Câu {number}")
+            return f"Câu {number}: {self.rng.choice(_FILLER)}"
+        self._set_index(f"Hình {chapter}.{number}")
+        return f"Quan sát H.{chapter}.{number} và trả lời câu hỏi."
+
+    def _cell(self, content, props=''):
+        return f'<w:tc>{"<w:tcPr>" + props + "</w:tcPr>" if props else ""}{content}</w:tc>'
+
+    def _table(self, nested=True):
+        """Bảng 3 cột: hàng tiêu đề gộp ngang, ô gộp dọc 2 hàng, ảnh trong ô, có thể có bảng lồng"""
+        self.counts['tables'] += 1
+        self.table_depth += 1
+        rows = []
+        rows.append('<w:tr>' + self._cell(self._paragraph(self._index_text()), '<w:gridSpan w:val="2"/>')
+                    + self._cell(self._paragraph("Đáp án")) + '</w:tr>')
+        for r in range(self.rng.randint(2, 4)):
+            first = (self._cell(self._paragraph("Hình vẽ", images=1), '<w:vMerge w:val="restart"/>')
+                     if r % 2 == 0 else self._cell('<w:p/>', '<w:vMerge/>'))
+            middle = self._cell(self._paragraph(self._index_text()))
+            last_content = self._paragraph(self.rng.choice(_FILLER), images=1)
+            if nested and r == 0 and self.rng.random() < 0.3:
+                last_content += self._table(nested=False) + '<w:p/>'
+            rows.append('<w:tr>' + first + middle + self._cell(last_content) + '</w:tr>')
+        self.table_depth -= 1
+        return ('<w:tbl><w:tblPr/><w:tblGrid><w:gridCol/><w:gridCol/><w:gridCol/></w:tblGrid>'
+                + ''.join(rows) + '</w:tbl>')
+
+    def iter_body(self):
+        """Các phần tử con của w:body, theo từng trang"""
+        for page in range(self.pages):
+            if page % 20 == 0:
+                self.chapter += 1
+                self.number = 0
+                title = f"CHƯƠNG {self.chapter}. CHUYỂN ĐỘNG VÀ LỰC"
+                self._set_title(title)
+                yield self._paragraph(title, style='Heading1')
+            if page % 5 == 0:
+                title = self.rng.choice(_SECTION_TITLES)
+                self._set_title(title)
+                yield self._paragraph(title, style='Heading2')
+
+            for _ in range(self.density):
+                roll = self.rng.random()
+                if roll < self.image_rate:
+                    yield self._paragraph(images=self.rng.choice((1, 1, 1, 2)))
+                elif roll < self.image_rate + 0.25:
+                    yield self._paragraph(self._index_text())
+                else:
+                    yield self._paragraph(self.rng.choice(_FILLER))
+
+            if self.rng.random() < self.table_rate:
+                yield self._table()
+
+    def write(self, docx_path):
+        """Ghi file DOCX, trả về dict mô tả (số paragraph/ảnh/bảng, kích thước, nhãn đã sinh, expected)"""
+        os.makedirs(os.path.dirname(os.path.abspath(docx_path)), exist_ok=True)
+        with zipfile.ZipFile(docx_path, 'w', zipfile.ZIP_DEFLATED) as docx_zip:
+            docx_zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+            docx_zip.writestr('_rels/.rels', _PACKAGE_RELS)
+            docx_zip.writestr('word/styles.xml', _STYLES)
+            with docx_zip.open('word/document.xml', 'w') as f:
+                f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        f'<w:document {_NAMESPACES}><w:body>'.encode('utf-8'))
+                for element in self.iter_body():
+                    f.write(element.encode('utf-8'))
+                f.write(b'<w:sectPr/></w:body></w:document>')
+
+            rels = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">',
+                    '<Relationship Id="rIdStyles" Type="http://schemas.openxmlformats.org/officeDocument/'
+                    '2006/relationships/styles" Target="styles.xml"/>']
+            for i, (rid, name) in enumerate(self.media):
+                rels.append(f'<Relationship Id="{rid}" Type="{_IMAGE_REL_TYPE}" Target="media/{name}"/>')
+                # PNG đã nén sẵn → lưu kiểu stored như Word
+                docx_zip.writestr(zipfile.ZipInfo(f'word/media/{name}', (2025, 1, 1, 0, 0, 0)),
+                                  make_png(i, self.media_size), zipfile.ZIP_STORED)
+            rels.append('</Relationships>')
+            docx_zip.writestr('word/_rels/document.xml.rels', ''.join(rels))
+
+        return dict(self.counts, pages=self.pages, bytes=os.path.getsize(docx_path),
+                    labels=sorted(self.labels), expected=list(self.expected))
+
+def generate_book(docx_path, pages, **options):
+    """Sinh một cuốn SBT giả lập tại docx_path, trả về dict mô tả"""
+    return SyntheticBook(pages, **options).write(docx_path)
+
+# ==========================================================
+# Đo: mỗi lần đo chạy trong một process mới (spawn) để peak RSS không bị lẫn
+# ==========================================================
+
+def _peak_rss_mb():
+    """Peak RSS của process hiện tại (MB), None nếu không đo được trên hệ điều hành này"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+def _run_extract(docx_path, output_folder):
+    from process import extract_images
+    shutil.rmtree(output_folder, ignore_errors=True)
+    result = extract_images(docx_path, output_folder)
+    return {'items': result['saved'], 'filenames': [img['filename'] for img in result['images']],
+            'anchors': [(img['media'], img['index']) for img in result['images']],
+            'errors': len(result['errors'])}
+
+def _run_preview(docx_path):
+    from process import preview_images_and_indices
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        images = preview_images_and_indices(docx_path)
+    return {'items': len(images), 'filenames': [img['filename'] for img in images], 'errors': 0}
+
+def _run_rename(images_folder, json_file):
+    from rename_with_json import rename_images_with_json
+    return {'items': rename_images_with_json(images_folder, json_file), 'errors': 0}
+
+_TARGETS = {'extract': _run_extract, 'preview': _run_preview, 'rename': _run_rename}
+
+def _measure(target, args):
+    """Chạy trong process con: import module cần đo, rồi đo thời gian + peak RSS của một lần chạy"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import process  # noqa: F401  - tính thời gian import riêng, không tính vào lần đo
+    import rename_with_json  # noqa: F401
+    baseline_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    result = _TARGETS[target](*args)
+    result['seconds'] = time.perf_counter() - start
+    peak_rss = _peak_rss_mb()
+    result['peak_rss_mb'] = peak_rss
+    result['rss_delta_mb'] = None if peak_rss is None else peak_rss - baseline_rss
+    return result
+
+def measure(target, *args):
+    """Đo một target trong process mới"""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_measure, (target, args))
+
+# ==========================================================
+# Kiểm tra kết quả
+# ==========================================================
+
+def check_extract(docx_path, output_folder, run, book):
+    """So kết quả extract với đáp án của bộ sinh: cùng dãy (media, nhãn), mỗi file tồn tại và đúng
+    nội dung media part; trả về list lỗi"""
+    problems = []
+    filenames = run['filenames']
+    anchors = [tuple(anchor) for anchor in run['anchors']]
+    expected = [tuple(anchor) for anchor in book['expected']]
+    if len(anchors) != len(expected):
+        problems.append(f"số ảnh {len(anchors)} != số ảnh đã sinh {len(expected)}")
+    wrong = [i for i, (got, want) in enumerate(zip(anchors, expected)) if got != want]
+    if wrong:
+        i = wrong[0]
+        problems.append(f"{len(wrong)} ảnh sai media/nhãn, đầu tiên {filenames[i]}: "
+                        f"{anchors[i]} != {expected[i]}")
+    with zipfile.ZipFile(docx_path) as docx_zip:
+        for filename, (media, _) in zip(filenames, expected):
+            path = os.path.join(output_folder, filename)
+            if not os.path.exists(path):
+                problems.append(f"thiếu file {filename}")
+                continue
+            with open(path, 'rb') as f:
+                if f.read() != docx_zip.read(f"word/{media}"):
+                    problems.append(f"sai nội dung {filename}")
+    if len(set(filenames)) != len(filenames):
+        problems.append(f"{len(filenames) - len(set(filenames))} tên file bị trùng")
+    return problems
+
+def rename_key(label):
+    """Key đổi tên của một nhãn đã sinh (Bài/Hình x.y, KIẾN THỨC CẦN NHỚ), nhãn khác không đổi tên"""
+    if label.startswith(("Bài ", "Hình ")):
+        return label
+    if label.endswith("KIẾN THỨC CẦN NHỚ"):
+        return "KIẾN THỨC CẦN NHỚ"
+    return None
+
+def write_rename_manifest(book, json_file):
+    """Manifest JSON giả lập code.json: ảnh thứ n có key được tên đích riêng "SBT n key" (theo đáp án)"""
+    entries = []
+    for n, (_, label) in enumerate(book['expected'], 1):
+        key = rename_key(label)
+        if key:
+            entries.append({'filename': f"SBT {n:05d} {key}"})
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    return len(entries)
+
+def expected_after_rename(filenames, book):
+    """Tập tên file sau khi đổi tên theo manifest của write_rename_manifest, tính từ đáp án
+
+    Ảnh cùng key lấy lần lượt các entry theo thứ tự, nên ảnh thứ n có key thành "SBT n key.ext";
+    ảnh không có key giữ tên. Trả về (tập tên, số ảnh được đổi tên).
+    """
+    names = set()
+    renamed = 0
+    for n, (filename, (_, label)) in enumerate(zip(filenames, book['expected']), 1):
+        key = rename_key(label)
+        if key:
+            names.add(f"SBT {n:05d} {key}{os.path.splitext(filename)[1]}")
+            renamed += 1
+        else:
+            names.add(filename)
+    return names, renamed
+
+# ==========================================================
+# Chạy benchmark
+# ==========================================================
+
+def _summarize(runs, size_bytes):
+    seconds = [run['seconds'] for run in runs]
+    best = min(seconds)
+    rss = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    return {
+        'items': runs[0]['items'],
+        'best_seconds': round(best, 4),
+        'median_seconds': round(statistics.median(seconds), 4),
+        'items_per_second': round(runs[0]['items'] / best, 1) if best else None,
+        'mb_per_second': round(size_bytes / (1024 * 1024) / best, 2) if best else None,
+        'peak_rss_mb': round(max(rss), 1) if rss else None,
+        'rss_delta_mb': round(max(run['rss_delta_mb'] for run in runs), 1) if rss else None,
+    }
+
+def run_benchmark(pages_list=DEFAULT_PAGES, repeat=3, work_dir=None, keep=False, **book_options):
+    """Sinh sách ở từng kích thước rồi đo extract / preview / rename, trả về list kết quả"""
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="sbt_bench_")
+    results = []
+    try:
+        for pages in pages_list:
+            docx_path = os.path.join(work_dir, f"SBT bench {pages}p ruot.docx")
+            gen_start = time.perf_counter()
+            book = generate_book(docx_path, pages, **book_options)
+            gen_seconds = time.perf_counter() - gen_start
+            print(f"📚 {pages} trang: {book['paragraphs']} paragraph, {book['images']} ảnh "
+                  f"({book['table_images']} trong bảng, {book['nested_images']} trong bảng lồng), "
+                  f"{book['tables']} bảng, {book['bytes'] / 1024 / 1024:.1f} MB ({gen_seconds:.1f}s)")
+
+            output_folder = os.path.join(work_dir, f"images_{pages}p")
+            extract_runs = [measure('extract', docx_path, output_folder) for _ in range(repeat)]
+            preview_runs = [measure('preview', docx_path) for _ in range(repeat)]
+            filenames = extract_runs[0]['filenames']
+            problems = check_extract(docx_path, output_folder, extract_runs[0], book)
+            if preview_runs[0]['filenames'] != filenames:
+                problems.append("preview và extract cho danh sách tên file khác nhau")
+
+            json_file = os.path.join(work_dir, f"manifest_{pages}p.json")
+            write_rename_manifest(book, json_file)
+            expected_names, expected_count = expected_after_rename(filenames, book)
+            rename_runs = []
+            rename_folder_path = os.path.join(work_dir, f"rename_{pages}p")
+            for _ in range(repeat):
+                shutil.rmtree(rename_folder_path, ignore_errors=True)
+                shutil.copytree(output_folder, rename_folder_path)
+                run = measure('rename', rename_folder_path, json_file)
+                if run['items'] != expected_count or set(os.listdir(rename_folder_path)) != expected_names:
+                    problems.append("kết quả đổi tên khác đáp án")
+                rename_runs.append(run)
+
+            entry = {
+                'pages': pages,
+                'book': {k: v for k, v in book.items() if k not in ('labels', 'expected')},
+                'extract': _summarize(extract_runs, book['bytes']),
+                'preview': _summarize(preview_runs, book['bytes']),
+                'rename': _summarize(rename_runs, book['bytes']),
+                # Ảnh quét được nhiều hơn ảnh đã sinh = ô gộp bị đếm lặp; ít hơn = ảnh bị bỏ sót
+                'duplicate_or_missing_images': len(filenames) - book['images'],
+                'problems': sorted(set(problems)),
+            }
+            results.append(entry)
+            print_entry(entry)
+    finally:
+        if own_dir and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        elif keep:
+            print(f"📁 Giữ lại dữ liệu benchmark: {work_dir}")
+    return results
+
+def print_entry(entry):
+    for target in ('extract', 'preview', 'rename'):
+        s = entry[target]
+        rss = f"{s['peak_rss_mb']:.1f} MB (+{s['rss_delta_mb']:.1f})" if s['peak_rss_mb'] is not None else "n/a"
+        print(f"   ⏱️  {target:8s}: {s['items']:6d} mục, best {s['best_seconds']:.3f}s "
+              f"(median {s['median_seconds']:.3f}s), {s['items_per_second'] or 0:.0f} mục/s, "
+              f"{s['mb_per_second'] or 0:.1f} MB/s, peak RSS {rss}")
+    diff = entry['duplicate_or_missing_images']
+    if diff:
+        print(f"   ⚠️  Số ảnh quét được lệch {diff:+d} so với số ảnh đã sinh")
+    if entry['problems']:
+        for problem in entry['problems']:
+            print(f"   ❌ {problem}")
+    else:
+        print("   ✅ Kết quả đúng")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract/preview/rename trên sách SBT giả lập")
+    parser.add_argument('--pages', default=",".join(map(str, DEFAULT_PAGES)),
+                        help="Các kích thước sách (số trang), cách nhau bởi dấu phẩy")
+    parser.add_argument('--density', type=int, default=DEFAULT_DENSITY, help="Số paragraph mỗi trang")
+    parser.add_argument('--image-rate', type=float, default=DEFAULT_IMAGE_RATE, help="Tỉ lệ paragraph ảnh")
+    parser.add_argument('--table-rate', type=float, default=DEFAULT_TABLE_RATE,
+                        help="Xác suất mỗi trang có một bảng")
+    parser.add_argument('--media-kb', type=int, default=DEFAULT_MEDIA_KB, help="Kích thước mỗi ảnh (KB)")
+    parser.add_argument('--seed', type=int, default=1, help="Seed sinh dữ liệu")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Số lần đo mỗi thao tác")
+    parser.add_argument('--work-dir', default=None, help="Thư mục làm việc (mặc định: thư mục tạm)")
+    parser.add_argument('--keep', action='store_true', help="Giữ lại DOCX/ảnh đã sinh")
+    parser.add_argument('--json', metavar='PATH', default=None, help="Ghi kết quả dạng JSON vào file này")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        [int(p) for p in args.pages.split(',')], args.repeat, args.work_dir, args.keep,
+        density=args.density, image_rate=args.image_rate, table_rate=args.table_rate,
+        media_kb=args.media_kb, seed=args.seed)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'platform': sys.platform, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 Kết quả: {args.json}")
+    return 1 if any(entry['problems'] for entry in results) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import time
+
+# Trạng thái của một job Mathpix trong ledger
+STATUS_UPLOADED = 'uploaded'      # Đã có pdf_id, đang convert
+STATUS_COMPLETED = 'completed'    # Mathpix báo completed, chưa download xong
+STATUS_DOWNLOADED = 'downloaded'  # Đã có file DOCX
+STATUS_ERROR = 'error'            # Convert lỗi → lần sau upload lại
+
+DEFAULT_LEDGER_PATH = os.getenv('MATHPIX_LEDGER', os.path.join('output', '.mathpix_ledger.sqlite'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    pdf_sha256 TEXT PRIMARY KEY,
+    pdf_path TEXT NOT NULL,
+    pdf_id TEXT,
+    status TEXT NOT NULL,
+    output_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class ConversionLedger:
+    """Ledger SQLite cho các job PDF → DOCX, khoá theo SHA-256 nội dung PDF
+
+    Giúp chạy lại không upload lại PDF đã có pdf_id: bỏ qua file đã xong,
+    tiếp tục poll job đang chạy và chỉ upload PDF mới hoặc đã thay đổi.
+    """
+
+    def __init__(self, db_path=DEFAULT_LEDGER_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_SCHEMA)
+
+    def get(self, pdf_sha256):
+        """Dòng ledger của một PDF (sqlite3.Row) hoặc None"""
+        return self.conn.execute("SELECT * FROM jobs WHERE pdf_sha256 = ?", (pdf_sha256,)).fetchone()
+
+    def resumable_pdf_id(self, pdf_sha256):
+        """pdf_id của job đã upload nhưng chưa download xong (có thể poll tiếp), ngược lại None"""
+        row = self.get(pdf_sha256)
+        if row and row['pdf_id'] and row['status'] in (STATUS_UPLOADED, STATUS_COMPLETED):
+            return row['pdf_id']
+        return None
+
+    def finished_output(self, pdf_sha256):
+        """Đường dẫn DOCX nếu PDF này đã convert xong và file vẫn còn, ngược lại None"""
+        row = self.get(pdf_sha256)
+        if row and row['status'] == STATUS_DOWNLOADED and row['output_path'] \
+                and os.path.exists(row['output_path']):
+            return row['output_path']
+        return None
+
+    def record(self, pdf_sha256, pdf_path, status, pdf_id=None, output_path=None, error=None):
+        """Thêm/cập nhật trạng thái job (giữ nguyên pdf_id/output_path cũ nếu không truyền)"""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (pdf_sha256, pdf_path, pdf_id, status, output_path, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(pdf_sha256) DO UPDATE SET "
+                "pdf_path = excluded.pdf_path, "
+                "pdf_id = COALESCE(excluded.pdf_id, jobs.pdf_id), "
+                "status = excluded.status, "
+                "output_path = COALESCE(excluded.output_path, jobs.output_path), "
+                "error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                (pdf_sha256, os.path.abspath(pdf_path), pdf_id, status, output_path, error, now, now))
+
+    def close(self):
+        self.conn.close()
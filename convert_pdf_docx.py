@@ -1,159 +1,551 @@
 import requests 
+import asyncio
 import base64 
 import os 
+import io
 import json 
+import random
+import sys
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from event_log import event, get_logger, setup_logging
+from conversion_ledger import (DEFAULT_LEDGER_PATH, STATUS_COMPLETED, STATUS_DOWNLOADED, STATUS_ERROR,
+                               STATUS_UPLOADED, ConversionLedger)
+from extract_cache import file_sha256
+from run_stats import RunStats
 
 load_dotenv()
 
+log = get_logger('convert')
+
 app_key = os.getenv('APP_KEY')
 app_id = os.getenv('APP_ID')
 
+# Cho phép trỏ tới server giả lập khi test (vd. http://127.0.0.1:8000/v3)
+MATHPIX_BASE_URL = os.getenv('MATHPIX_BASE_URL', 'https://api.mathpix.com/v3').rstrip('/')
+
+# Polling: backoff luỹ thừa + jitter
+POLL_INITIAL_DELAY = 2
+POLL_MAX_DELAY = 60
+POLL_MAX_WAIT = 2000
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+JOB_GONE_STATUS_CODES = (404, 410)  # pdf_id không còn trên Mathpix (hết hạn/không tồn tại)
+
+class ConversionFailed(RuntimeError):
+    """Job Mathpix không thể hoàn thành (báo lỗi conversion hoặc pdf_id không còn): lần sau phải upload lại"""
+
+class TransientStatusError(RuntimeError):
+    """Lỗi tạm thời khi check status (429, 5xx): poll lại sau"""
+
+# Lỗi poll được thử lại với cùng backoff cho tới hết thời gian chờ
+RETRYABLE_POLL_ERRORS = (TransientStatusError, requests.ConnectionError, requests.Timeout)
+
+class MultipartFileStream:
+    """Body multipart/form-data đọc dần từ file (không dựng cả body trong bộ nhớ)
+
+    Có __len__ nên requests gửi kèm Content-Length và đọc body theo từng block qua read().
+    """
+
+    def __init__(self, file_path, field_name="file", content_type="application/pdf"):
+        self.boundary = uuid.uuid4().hex
+        filename = os.path.basename(file_path).replace('"', '')
+        self._preamble = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+        self._epilogue = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+        self._file = open(file_path, 'rb')
+        self._length = len(self._preamble) + os.path.getsize(file_path) + len(self._epilogue)
+        self._parts = [io.BytesIO(self._preamble), self._file, io.BytesIO(self._epilogue)]
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        while size > 0 and self._parts:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def post_pdf_streaming(http, file_path, headers=None):
+    """POST /pdf với body multipart stream từ đĩa; http là requests hoặc một Session"""
+    with MultipartFileStream(file_path) as body:
+        request_headers = dict(headers or {})
+        request_headers['Content-Type'] = body.content_type
+        return http.post(f"{MATHPIX_BASE_URL}/pdf", headers=request_headers, data=body)
+
+def _read_part_meta(meta_path):
+    """Thông tin của file .part đang tải dở (job_id, validator), không có/hỏng thì {}"""
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _discard_part(part_path, meta_path):
+    for path in (part_path, meta_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _content_range_start(value):
+    """Byte bắt đầu trong header Content-Range ("bytes 100-199/200"), không đọc được thì None"""
+    try:
+        return int(value.split()[1].split('-')[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def _response_validator(response):
+    """ETag mạnh hoặc Last-Modified của response, dùng cho If-Range khi resume"""
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+def stream_download(http, url, output_path, headers=None, job_id=None):
+    """Download theo chunk vào <output>.part, hỗ trợ resume bằng HTTP Range, xong thì rename atomic
+
+    File .part được gắn với job_id (vd. pdf_id) và validator (ETag/Last-Modified) qua file
+    <output>.part.json: chỉ resume khi cùng job, gửi kèm If-Range, và kiểm tra Content-Range bắt đầu
+    đúng offset. Không khớp hoặc server trả 416 thì bỏ .part và tải lại từ đầu.
+    Trả về output_path; lỗi HTTP thì raise RuntimeError (không ghi nội dung lỗi thành file).
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    part_path = output_path + ".part"
+    meta_path = part_path + ".json"
+
+    for _ in range(2):  # Lần 2: tải lại từ đầu sau khi bỏ .part không dùng được
+        request_headers = dict(headers or {})
+        meta = _read_part_meta(meta_path)
+        offset = 0
+        if os.path.exists(part_path):
+            if meta.get('job_id') == job_id:
+                offset = os.path.getsize(part_path)
+            else:
+                _discard_part(part_path, meta_path)  # .part của job khác (PDF đã upload lại)
+                meta = {}
+        if offset:
+            request_headers['Range'] = f"bytes={offset}-"
+            if meta.get('validator'):
+                request_headers['If-Range'] = meta['validator']
+
+        with http.get(url, headers=request_headers, stream=True) as response:
+            if offset and response.status_code == 416:
+                _discard_part(part_path, meta_path)
+                continue
+            if response.status_code == 206 and offset:
+                if _content_range_start(response.headers.get('Content-Range')) != offset:
+                    _discard_part(part_path, meta_path)
+                    continue
+                mode = 'ab'
+            elif response.status_code == 200:
+                mode = 'wb'  # Server không hỗ trợ Range hoặc file đã đổi (If-Range) → tải lại từ đầu
+            else:
+                raise RuntimeError(f"{response.status_code} - {response.text[:200]}")
+
+            if mode == 'wb':
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'job_id': job_id, 'validator': _response_validator(response)}, f)
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+        os.replace(part_path, output_path)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        return output_path
+
+    raise RuntimeError("Không resume được download sau khi tải lại từ đầu")
+
 def send_pdf_to_mathpix(file_path):
     """Gửi PDF đến Mathpix API để convert"""
     try:
-        with open(file_path, "rb") as f:
-            print("📤 Đang gửi request đến Mathpix...")
-
-            files = {
-                "file": (os.path.basename(file_path), f, "application/pdf")
-            }
-
-            response = requests.post(
-                "https://api.mathpix.com/v3/pdf",
-                headers={
-                    "app_id": app_id,
-                    "app_key": app_key
-                },
-                files=files
-                # data={"conversion_formats[docx]": "true"}
-            )
-
-            if response.status_code == 200:
-                result = response.json()
-                print("✅ Gửi thành công!")
-                print(result)
-                return result
-            else:
-                print(f"❌ Lỗi API: {response.status_code} - {response.text}")
-                return None
+        log.debug("📤 Đang gửi request đến Mathpix...")
+
+        # Body multipart được stream từ đĩa, bộ nhớ không phụ thuộc kích thước PDF
+        response = post_pdf_streaming(requests, file_path, headers={
+            "app_id": app_id,
+            "app_key": app_key
+        })
+
+        if response.status_code == 200:
+            result = response.json()
+            log.debug("✅ Gửi thành công!")
+            log.debug(f"{result}")
+            return result
+        else:
+            log.error(f"❌ Lỗi API: {response.status_code} - {response.text}")
+            return None
 
     except Exception as e:
-        print(f"❌ Lỗi: {e}")
+        log.error(f"❌ Lỗi: {e}")
         return None
 
+def conversion_status(http, pdf_id, headers=None):
+    """GET trạng thái job, trả về dict của Mathpix; http là requests hoặc một Session
+
+    Job báo lỗi hoặc pdf_id không còn tồn tại thì raise ConversionFailed; 429/5xx raise
+    TransientStatusError; lỗi 4xx khác raise RuntimeError.
+    """
+    response = http.get(f"{MATHPIX_BASE_URL}/pdf/{pdf_id}", headers=headers)
+    if response.status_code in JOB_GONE_STATUS_CODES:
+        raise ConversionFailed(f"Job {pdf_id} không còn trên Mathpix: {response.status_code}")
+    if response.status_code == 429 or response.status_code >= 500:
+        raise TransientStatusError(f"Lỗi check status: {response.status_code}")
+    if response.status_code != 200:
+        raise RuntimeError(f"Lỗi check status: {response.status_code}")
+    result = response.json()
+    if result.get('status') == 'error':
+        raise ConversionFailed(f"Conversion lỗi: {result.get('error', 'Unknown')}")
+    return result
+
 def check_conversion_status(pdf_id):
     """Kiểm tra trạng thái conversion"""
     headers = {'app_key': app_key,
                 'app_id':app_id}
     
     try:
-        url = f"https://api.mathpix.com/v3/pdf/{pdf_id}"
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result
-        else:
-            print(f"❌ Lỗi check status: {response.status_code}")
-            return None
+        return conversion_status(requests, pdf_id, headers)
+    except RuntimeError as e:
+        log.error(f"❌ {e}")
+        return None
     except Exception as e:
-        print(f"❌ Lỗi check status: {e}")
+        log.error(f"❌ Lỗi check status: {e}")
         return None
 
-def download_docx(pdf_id, output_path):
+def download_docx(pdf_id, output_path, session=None):
     """Download file DOCX đã convert"""
     headers = {'app_key': app_key, 'app_id': app_id}
-    print(pdf_id)
-    time.sleep(15)
+    http = session or requests
     try:
-        url = f"https://api.mathpix.com/v3/pdf/{pdf_id}.docx"
-        response = requests.get(url, headers=headers)
-        # print(response.json())
-        
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-            print(f"✅ Downloaded: {output_path}")
+        url = f"{MATHPIX_BASE_URL}/pdf/{pdf_id}.docx"
+        stream_download(http, url, output_path, headers=headers, job_id=pdf_id)
+        log.debug(f"✅ Downloaded: {output_path}")
         return output_path
     except Exception as e:
-        print(f"❌ Lỗi download: {str(e)}")
+        log.error(f"❌ Lỗi download: {str(e)}")
         return None
 
-# def wait_for_conversion(pdf_id, max_wait_time=2000):
-#     """Chờ conversion hoàn thành"""
-#     print(f"⏳ Chờ conversion hoàn thành...")
-#     start_time = time.time()
+def next_poll_delay(delay):
+    """Backoff luỹ thừa có jitter: trả về (thời gian chờ lần này, delay cho lần sau)"""
+    wait = random.uniform(delay / 2, delay)
+    return wait, min(delay * 2, POLL_MAX_DELAY)
+
+def wait_for_conversion(pdf_id, max_wait_time=POLL_MAX_WAIT, stats=None):
+    """Chờ conversion hoàn thành (poll trạng thái với backoff + jitter)
+
+    429/5xx/lỗi kết nối được poll lại với cùng backoff cho tới max_wait_time.
+    Trả về 'completed', 'error' (job lỗi/pdf_id không còn, cần upload lại), 'timeout' hoặc None
+    (không check được trạng thái).
+    """
+    log.debug(f"⏳ Chờ conversion hoàn thành...")
+    headers = {'app_key': app_key, 'app_id': app_id}
+    start_time = time.time()
+    delay = POLL_INITIAL_DELAY
     
-#     while time.time() - start_time < max_wait_time:
-#         status_result = check_conversion_status(pdf_id)
-        
-#         if not status_result:
-#             return False
+    while time.time() - start_time < max_wait_time:
+        try:
+            status_result = conversion_status(requests, pdf_id, headers)
+        except ConversionFailed as e:
+            log.error(f"❌ {e}")
+            return 'error'
+        except RETRYABLE_POLL_ERRORS as e:
+            log.warning(f"⚠️  {e}, thử lại sau")
+            status_result = {}
+        except RuntimeError as e:
+            log.error(f"❌ {e}")
+            return None
+        except Exception as e:
+            log.error(f"❌ Lỗi check status: {e}")
+            return None
+        finally:
+            if stats:
+                stats.count('convert.polls')
         
-#         status = status_result.get('status', 'unknown')
-#         print(f"📋 Status: {status}")
+        status = status_result.get('status', 'unknown')
+        log.debug(f"📋 Status: {status}")
         
-#         if status == 'completed':
-#             print("✅ Conversion hoàn thành!")
-#             return True
-#         elif status == 'error':
-#             print(f"❌ Conversion lỗi: {status_result.get('error', 'Unknown')}")
-#             return False
+        if status == 'completed':
+            log.debug("✅ Conversion hoàn thành!")
+            return 'completed'
         
-#         time.sleep(10)
+        wait, delay = next_poll_delay(delay)
+        time.sleep(wait)
     
-#     print("⏰ Timeout!")
-#     return False
+    log.warning("⏰ Timeout!")
+    return 'timeout'
+
+def default_output_path(pdf_path, output_dir="output"):
+    """output/<tên pdf>_converted.docx"""
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, f"{pdf_name}_converted.docx")
+
+def convert_pdf_to_docx(pdf_path, output_path=None, ledger_path=DEFAULT_LEDGER_PATH, stats=None):
+    """Convert PDF to DOCX
 
-def convert_pdf_to_docx(pdf_path, output_path=None):
-    """Convert PDF to DOCX"""
-    print("🎯 Bắt đầu convert PDF to DOCX")
+    Ledger (ledger_path, None để tắt) ghi lại pdf_id theo hash PDF: chạy lại sẽ bỏ qua file đã
+    convert, poll tiếp job đang chạy và chỉ upload PDF mới/thay đổi.
+    stats (RunStats, tuỳ chọn): thời gian upload/chờ API/download (convert.*) và bộ đếm.
+    """
+    stats = stats or RunStats('convert')
+    log.debug("🎯 Bắt đầu convert PDF to DOCX")
     
     if not os.path.exists(pdf_path):
-        print(f"❌ File không tồn tại: {pdf_path}")
+        log.error(f"❌ File không tồn tại: {pdf_path}")
         return None
     
-    # Gửi PDF
-    result = send_pdf_to_mathpix(pdf_path)
-    if not result:
-        return None
-    
-    pdf_id = result.get('pdf_id')
-    # pdf_id = "2025_06_26_d7ac6f92205324b78fd9g"
-    if not pdf_id:
-        print("❌ Không nhận được pdf_id")
-        return None
-    
-    print(f"📋 PDF ID: {pdf_id}")
-    
-    # Đợi 15 giây để server cập nhật
-    print("⏳ Đợi 15 giây để server cập nhật PDF ID...")
-    time.sleep(15)
-    print("✅ Hoàn thành delay, bắt đầu check status...")
-    
-    # Chờ conversion
-    # if not wait_for_conversion(pdf_id):
-    #     return None
-    
     # Tạo output path
     if not output_path:
-        pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        output_path = f"output/{pdf_name}_converted.docx"
-    
-    # Download
-    downloaded_file = download_docx(pdf_id, output_path)
+        output_path = default_output_path(pdf_path)
     
-    if downloaded_file:
-        print(f"🎉 Hoàn thành! File DOCX: {downloaded_file}")
-        return downloaded_file
-    else:
-        return None
+    ledger = ConversionLedger(ledger_path) if ledger_path else None
+    try:
+        with stats.timer('convert.hash'):
+            pdf_sha256 = file_sha256(pdf_path) if ledger else None
+        
+        if ledger:
+            finished = ledger.finished_output(pdf_sha256)
+            if finished:
+                log.info(f"⏭️  Đã convert trước đó: {finished}")
+                stats.count('convert.skipped')
+                return finished
+        
+        pdf_id = ledger.resumable_pdf_id(pdf_sha256) if ledger else None
+        if pdf_id:
+            log.info(f"🔁 Tiếp tục job đã upload, PDF ID: {pdf_id}")
+            stats.count('convert.resumed')
+        else:
+            # Gửi PDF
+            with stats.timer('convert.upload'):
+                result = send_pdf_to_mathpix(pdf_path)
+            stats.count('convert.uploads')
+            stats.count('convert.upload_bytes', os.path.getsize(pdf_path))
+            if not result:
+                return None
+            
+            pdf_id = result.get('pdf_id')
+            if not pdf_id:
+                log.error("❌ Không nhận được pdf_id")
+                return None
+            
+            log.debug(f"📋 PDF ID: {pdf_id}")
+            if ledger:
+                ledger.record(pdf_sha256, pdf_path, STATUS_UPLOADED, pdf_id=pdf_id)
+        
+        # Chờ conversion (poll trạng thái thay vì đợi cố định)
+        with stats.timer('convert.wait'):
+            status = wait_for_conversion(pdf_id, stats=stats)
+        if status != 'completed':
+            if ledger and status == 'error':
+                ledger.record(pdf_sha256, pdf_path, STATUS_ERROR, error="Mathpix báo lỗi hoặc job không còn")
+            return None
+        if ledger:
+            ledger.record(pdf_sha256, pdf_path, STATUS_COMPLETED)
+        
+        # Download
+        with stats.timer('convert.download'):
+            downloaded_file = download_docx(pdf_id, output_path)
+        
+        if downloaded_file:
+            stats.count('convert.download_bytes', os.path.getsize(downloaded_file))
+            if ledger:
+                ledger.record(pdf_sha256, pdf_path, STATUS_DOWNLOADED, output_path=downloaded_file)
+            log.info(f"🎉 Hoàn thành! File DOCX: {downloaded_file}",
+                     extra=event('convert.done', pdf=pdf_path, pdf_id=pdf_id, output=downloaded_file))
+            return downloaded_file
+        else:
+            return None
+    finally:
+        if ledger:
+            ledger.close()
+
+# ==========================================================
+# Client bất đồng bộ: nhiều PDF cùng lúc, dùng chung connection pool
+# ==========================================================
+
+def make_session(pool_size):
+    """requests.Session dùng chung cho mọi job, connection pool đủ cho số job song song"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'app_id': app_id or '', 'app_key': app_key or ''})
+    return session
+
+async def _send_pdf_async(session, pdf_path):
+    response = await asyncio.to_thread(post_pdf_streaming, session, pdf_path)
+    if response.status_code != 200:
+        raise RuntimeError(f"Lỗi API: {response.status_code} - {response.text[:200]}")
+    pdf_id = response.json().get('pdf_id')
+    if not pdf_id:
+        raise RuntimeError("Không nhận được pdf_id")
+    return pdf_id
+
+async def poll_conversion_async(session, pdf_id, max_wait_time=POLL_MAX_WAIT, stats=None):
+    """Poll trạng thái tới khi 'completed' (backoff luỹ thừa + jitter)
+
+    429/5xx/lỗi kết nối được poll lại với cùng backoff cho tới deadline. Job lỗi/pdf_id không còn
+    thì raise ConversionFailed, hết thời gian thì TimeoutError, lỗi 4xx khác RuntimeError.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait_time
+    delay = POLL_INITIAL_DELAY
+
+    while True:
+        try:
+            result = await asyncio.to_thread(conversion_status, session, pdf_id)
+        except RETRYABLE_POLL_ERRORS as e:
+            log.warning(f"⚠️  {pdf_id}: {e}, thử lại sau")
+            result = {}
+        finally:
+            if stats:
+                stats.count('convert.polls')
+        if result.get('status') == 'completed':
+            return result
+
+        wait, delay = next_poll_delay(delay)
+        if loop.time() + wait > deadline:
+            raise TimeoutError(f"Timeout chờ conversion {pdf_id}")
+        await asyncio.sleep(wait)
+
+async def _download_docx_async(session, pdf_id, output_path):
+    url = f"{MATHPIX_BASE_URL}/pdf/{pdf_id}.docx"
+    try:
+        return await asyncio.to_thread(stream_download, session, url, output_path, None, pdf_id)
+    except RuntimeError as e:
+        raise RuntimeError(f"Lỗi download: {e}") from e
+
+async def convert_pdf_to_docx_async(session, semaphore, pdf_path, output_path=None,
+                                    max_wait_time=POLL_MAX_WAIT, ledger=None, stats=None):
+    """Upload → poll → download cho một PDF, giới hạn số job đang chạy bằng semaphore
+
+    Có ledger thì bỏ qua PDF đã convert, poll tiếp job đã upload thay vì upload lại.
+    Trả về dict: pdf_path, pdf_id, output_path, seconds, error, skipped.
+    """
+    stats = stats or RunStats('convert')
+    output_path = output_path or default_output_path(pdf_path)
+    result = {'pdf_path': pdf_path, 'pdf_id': None, 'output_path': None, 'seconds': 0.0,
+              'error': None, 'skipped': False}
+    start = time.perf_counter()
+
+    async with semaphore:
+        pdf_sha256 = None
+        try:
+            if ledger:
+                with stats.timer('convert.hash'):
+                    pdf_sha256 = await asyncio.to_thread(file_sha256, pdf_path)
+                finished = ledger.finished_output(pdf_sha256)
+                if finished:
+                    result.update(output_path=finished, skipped=True)
+                    stats.count('convert.skipped')
+                    log.debug(f"⏭️  {os.path.basename(pdf_path)}: đã convert trước đó")
+                    return result
+
+            pdf_id = ledger.resumable_pdf_id(pdf_sha256) if ledger else None
+            if pdf_id:
+                log.debug(f"🔁 {os.path.basename(pdf_path)} → tiếp tục PDF ID: {pdf_id}")
+                stats.count('convert.resumed')
+            else:
+                with stats.timer('convert.upload'):
+                    pdf_id = await _send_pdf_async(session, pdf_path)
+                stats.count('convert.uploads')
+                stats.count('convert.upload_bytes', os.path.getsize(pdf_path))
+                log.debug(f"📤 {os.path.basename(pdf_path)} → PDF ID: {pdf_id}")
+                if ledger:
+                    ledger.record(pdf_sha256, pdf_path, STATUS_UPLOADED, pdf_id=pdf_id)
+            result['pdf_id'] = pdf_id
+
+            try:
+                with stats.timer('convert.wait'):
+                    await poll_conversion_async(session, pdf_id, max_wait_time, stats)
+            except ConversionFailed as e:
+                # Job lỗi/không còn → lần sau upload lại (timeout, lỗi mạng thì giữ để poll tiếp)
+                if ledger:
+                    ledger.record(pdf_sha256, pdf_path, STATUS_ERROR, error=str(e))
+                raise
+            if ledger:
+                ledger.record(pdf_sha256, pdf_path, STATUS_COMPLETED)
+
+            # Download ngay khi job báo completed
+            with stats.timer('convert.download'):
+                result['output_path'] = await _download_docx_async(session, pdf_id, output_path)
+            stats.count('convert.download_bytes', os.path.getsize(output_path))
+            if ledger:
+                ledger.record(pdf_sha256, pdf_path, STATUS_DOWNLOADED, output_path=output_path)
+            log.debug(f"✅ Downloaded: {output_path}")
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+            log.error(f"❌ {os.path.basename(pdf_path)}: {result['error']}")
+        finally:
+            result['seconds'] = time.perf_counter() - start
+            log.debug(f"📄 {os.path.basename(pdf_path)}: {result['seconds']:.1f}s",
+                      extra=event('convert.file', pdf=pdf_path, pdf_id=result['pdf_id'],
+                                  output=result['output_path'], seconds=round(result['seconds'], 3),
+                                  skipped=result['skipped'], error=result['error']))
+
+    return result
+
+async def convert_many_async(pdf_paths, output_dir="output", concurrency=4, max_wait_time=POLL_MAX_WAIT,
+                             ledger_path=DEFAULT_LEDGER_PATH, stats=None):
+    """Convert nhiều PDF song song (tối đa `concurrency` job cùng lúc), trả về list kết quả"""
+    semaphore = asyncio.Semaphore(concurrency)
+    session = make_session(concurrency)
+    ledger = ConversionLedger(ledger_path) if ledger_path else None
+    try:
+        tasks = [
+            convert_pdf_to_docx_async(session, semaphore, pdf_path,
+                                      default_output_path(pdf_path, output_dir), max_wait_time, ledger, stats)
+            for pdf_path in pdf_paths
+        ]
+        return await asyncio.gather(*tasks)
+    finally:
+        session.close()
+        if ledger:
+            ledger.close()
+
+def convert_pdfs_concurrently(pdf_paths, output_dir="output", concurrency=4, max_wait_time=POLL_MAX_WAIT,
+                              ledger_path=DEFAULT_LEDGER_PATH, stats=None):
+    """Bản đồng bộ của convert_many_async (gọi từ script thường)"""
+    # Mỗi request blocking chạy trong một thread → cần đủ thread cho số job song song
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        return await convert_many_async(pdf_paths, output_dir, concurrency, max_wait_time, ledger_path, stats)
+
+    results = asyncio.run(run())
+    ok = sum(1 for r in results if not r['error'])
+    log.info(f"🎉 Convert xong {ok}/{len(results)} file",
+             extra=event('convert.batch', files=len(results), failed=len(results) - ok))
+    return results
 
 # THỰC HIỆN CONVERT NGAY
 if __name__ == "__main__": 
+    setup_logging()
     # Đặt đường dẫn PDF của bạn ở đây
     pdf_path = r"E:\Data\Work\SeperateImage\Unlock_SBT\SBT Vat li 10 ruot (TB 2025)_KNTT (16.3.2025).pdf"
     
@@ -161,6 +553,11 @@ if __name__ == "__main__":
     print(f"🔑 App Key: {app_key[:10]}..." if app_key else "❌ APP_KEY not found")
     print()
     
+    # Nhiều PDF truyền qua dòng lệnh → convert song song
+    if len(sys.argv) > 1:
+        results = convert_pdfs_concurrently(sys.argv[1:])
+        sys.exit(0 if all(not r['error'] for r in results) else 1)
+    
     # CONVERT NGAY
     result = convert_pdf_to_docx(pdf_path)
     
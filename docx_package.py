@@ -0,0 +1,141 @@
+import io
+import mmap
+import struct
+import zipfile
+import zlib
+
+INFLATE_CHUNK_SIZE = 256 * 1024  # Số byte nén đưa vào zlib mỗi lần khi giải nén dạng stream
+
+_LOCAL_HEADER = struct.Struct('<4s22xHH')  # chữ ký, ..., độ dài tên file, độ dài extra field
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+class _MemberReader(io.RawIOBase):
+    """Đọc một member từ vùng nhớ mmap: stored thì cắt thẳng, deflated thì giải nén dần (kiểm tra CRC ở cuối)"""
+
+    def __init__(self, view, info):
+        self._view = view
+        self._info = info
+        self._pos = 0
+        self._crc = 0
+        self._inflater = zlib.decompressobj(-15) if info.compress_type == zipfile.ZIP_DEFLATED else None
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self, size):
+        if self._inflater is None:
+            chunk = self._view[self._pos:self._pos + size]
+            self._pos += len(chunk)
+            return chunk
+        while True:
+            if self._inflater.unconsumed_tail:
+                data = self._inflater.decompress(self._inflater.unconsumed_tail, size)
+            elif self._pos < len(self._view):
+                src = self._view[self._pos:self._pos + INFLATE_CHUNK_SIZE]
+                self._pos += len(src)
+                data = self._inflater.decompress(src, size)
+            else:
+                return self._inflater.flush()
+            if data:
+                return data
+
+    def readinto(self, buffer):
+        chunk = self._next_chunk(len(buffer))
+        n = len(chunk)
+        if n:
+            buffer[:n] = chunk
+            self._crc = zlib.crc32(chunk, self._crc)
+        elif self._crc != self._info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {self._info.filename!r}")
+        return n
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        super().close()
+
+class DocxPackage:
+    """Gói DOCX mở một lần và map vào bộ nhớ (mmap), central directory chỉ đọc một lần
+
+    Dùng thay zipfile.ZipFile (open/getinfo/namelist/read) cho extract: member stored (ảnh
+    thường được lưu không nén) được trả về dạng memoryview cắt thẳng từ mmap, không copy;
+    member deflated được giải nén dần từ mmap. Member mã hoá hoặc nén kiểu khác thì đọc qua zipfile.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._zip = zipfile.ZipFile(self._file)
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as e:  # File rỗng/không map được
+            self._file.close()
+            raise zipfile.BadZipFile(f"Không đọc được gói DOCX {path}: {e}") from e
+        except BaseException:
+            self._file.close()
+            raise
+        self._buffer = memoryview(self._mmap)
+        self._offsets = {}  # tên member -> vị trí bắt đầu dữ liệu trong file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def getinfo(self, name):
+        return self._zip.getinfo(name)
+
+    def namelist(self):
+        return self._zip.namelist()
+
+    def infolist(self):
+        return self._zip.infolist()
+
+    def _data_view(self, info):
+        """memoryview dữ liệu (còn nén) của member, None nếu member phải đọc qua zipfile"""
+        if info.flag_bits & 0x1 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return None
+        start = self._offsets.get(info.filename)
+        if start is None:
+            signature, name_length, extra_length = _LOCAL_HEADER.unpack_from(self._buffer, info.header_offset)
+            if signature != _LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"Local header hỏng: {info.filename!r}")
+            start = info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+            self._offsets[info.filename] = start
+        return self._buffer[start:start + info.compress_size]
+
+    def member_view(self, name):
+        """memoryview không copy của một member stored; member nén thì None (dùng open)
+
+        Gọi view.release() (hoặc with view:) khi dùng xong để đóng được mmap.
+        """
+        info = self.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        return self._data_view(info)
+
+    def open(self, name):
+        """File-like đọc nội dung member (giống ZipFile.open), KeyError nếu không có"""
+        info = self.getinfo(name)
+        view = self._data_view(info)
+        if view is None:
+            return self._zip.open(info)
+        return io.BufferedReader(_MemberReader(view, info))
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+    def close(self):
+        if self._buffer is None:
+            return
+        self._buffer.release()
+        self._buffer = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Còn memoryview đang được dùng: mmap tự đóng khi các view đó được giải phóng
+        self._zip.close()
+        self._file.close()
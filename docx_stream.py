@@ -0,0 +1,210 @@
+import xml.etree.ElementTree as ET
+from collections import deque, namedtuple
+from concurrent.futures import Future
+
+# Namespace của WordprocessingML / DrawingML
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+W = '{%s}' % W_NS
+W_BODY = W + 'body'
+W_P = W + 'p'
+W_R = W + 'r'
+W_HYPERLINK = W + 'hyperlink'
+W_TBL = W + 'tbl'
+W_TR = W + 'tr'
+W_TC = W + 'tc'
+A_BLIP = '{%s}blip' % A_NS
+R_EMBED = '{%s}embed' % R_NS
+
+BIG_TABLE_CELLS = 500  # Bảng từ chừng này ô trở lên mới đáng gửi sang process con
+MAX_PENDING = 64       # Số phần tử tối đa chờ sau một bảng lớn chưa đọc xong
+
+# Paragraph đọc được từ document.xml (tương đương python-docx Paragraph)
+#   text: giống para.text, style_name: giống para.style.name,
+#   embed_ids: r:embed của các a:blip trong run, context: text của ô bảng ("" nếu ở body)
+Paragraph = namedtuple('Paragraph', ['text', 'style_name', 'embed_ids', 'context'])
+
+def read_image_relationships(docx_zip):
+    """Đọc mapping relationship ID -> file ảnh (media/...) từ document.xml.rels"""
+    image_files = {}
+    with docx_zip.open('word/_rels/document.xml.rels') as f:
+        root = ET.parse(f).getroot()
+    for rel in root.findall('.//{*}Relationship'):
+        if rel.get('Target', '').startswith('media/'):
+            image_files[rel.get('Id')] = rel.get('Target')
+    return image_files
+
+def read_style_names(docx_zip):
+    """Đọc styles.xml -> (dict styleId -> tên style paragraph, tên style paragraph mặc định)"""
+    names = {}
+    default_name = None
+    try:
+        f = docx_zip.open('word/styles.xml')
+    except KeyError:
+        return names, default_name
+
+    with f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag != W + 'style':
+                continue
+            if elem.get(W + 'type') == 'paragraph':
+                name_elem = elem.find(W + 'name')
+                name = name_elem.get(W + 'val') if name_elem is not None else None
+                names[elem.get(W + 'styleId')] = name
+                if elem.get(W + 'default') in ('1', 'true', 'on') and default_name is None:
+                    default_name = name
+            elem.clear()
+    return names, default_name
+
+def _run_text(r):
+    """Text của một run (w:r) - giống run.text của python-docx"""
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W + 't':
+            parts.append(child.text or '')
+        elif tag in (W + 'tab', W + 'ptab'):
+            parts.append('\t')
+        elif tag == W + 'cr':
+            parts.append('\n')
+        elif tag == W + 'br':
+            if child.get(W + 'type', 'textWrapping') == 'textWrapping':
+                parts.append('\n')
+        elif tag == W + 'noBreakHyphen':
+            parts.append('-')
+    return ''.join(parts)
+
+def _read_paragraph(p, style_names, default_style, context=''):
+    """Chuyển một phần tử w:p đã parse xong thành Paragraph"""
+    parts = []
+    embed_ids = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+            # Chỉ lấy ảnh trong run trực tiếp (giống para.runs + xpath('.//a:blip'))
+            for blip in child.iter(A_BLIP):
+                embed_ids.append(blip.get(R_EMBED))
+        elif child.tag == W_HYPERLINK:
+            for r in child.findall(W_R):
+                parts.append(_run_text(r))
+
+    style_name = default_style
+    ppr = p.find(W + 'pPr')
+    if ppr is not None:
+        pstyle = ppr.find(W + 'pStyle')
+        if pstyle is not None:
+            style_name = style_names.get(pstyle.get(W + 'val'), default_style)
+
+    return Paragraph(''.join(parts), style_name, embed_ids, context)
+
+def _cell_props(tc):
+    """(số cột lưới mà ô chiếm - gridSpan, giá trị vMerge hoặc None) của một w:tc"""
+    span = 1
+    vmerge = None
+    tcpr = tc.find(W + 'tcPr')
+    if tcpr is not None:
+        grid_span = tcpr.find(W + 'gridSpan')
+        if grid_span is not None:
+            span = int(grid_span.get(W + 'val', '1'))
+        vmerge_elem = tcpr.find(W + 'vMerge')
+        if vmerge_elem is not None:
+            vmerge = vmerge_elem.get(W + 'val', 'continue')
+    return span, vmerge
+
+def _read_table_paragraphs(tbl, style_names, default_style):
+    """Duyệt bảng theo hàng → ô, mỗi ô thật chỉ một lần, trả về list Paragraph theo thứ tự tài liệu
+
+    Ô gộp ngang (gridSpan) là một w:tc nên chỉ đọc một lần; phần nối tiếp của ô gộp dọc
+    (vMerge="continue") thuộc về ô phía trên nên bỏ qua (python-docx lặp lại các ô này trong
+    row.cells nên ảnh bị lưu nhiều lần). Bảng lồng trong ô được đọc tại đúng chỗ của nó.
+    Ô không có text bị bỏ qua (giống điều kiện cell.text.strip() cũ), context = text của ô.
+    """
+    paragraphs = []
+    above = set()  # các cột lưới có ô ở hàng phía trên
+
+    for tr in tbl.findall(W_TR):
+        row = set()
+        col = 0
+        for tc in tr.findall(W_TC):
+            span, vmerge = _cell_props(tc)
+            continued = vmerge == 'continue' and col in above
+            row.update(range(col, col + span))
+            col += span
+            if continued:
+                continue
+
+            items = []  # Paragraph của ô, hoặc list Paragraph của bảng lồng
+            cell_paragraphs = []
+            for child in tc:
+                if child.tag == W_P:
+                    para = _read_paragraph(child, style_names, default_style)
+                    cell_paragraphs.append(para)
+                    items.append(para)
+                elif child.tag == W_TBL:
+                    items.append(_read_table_paragraphs(child, style_names, default_style))
+            cell_text = '\n'.join(para.text for para in cell_paragraphs).strip()
+            for item in items:
+                if isinstance(item, list):
+                    paragraphs.extend(item)
+                elif cell_text:
+                    paragraphs.append(item._replace(context=cell_text))
+        above = row
+
+    return paragraphs
+
+def read_table_xml(tbl_xml, style_names, default_style):
+    """Đọc một bảng đã serialize (ET.tostring) - chạy trong process con cho bảng lớn"""
+    return _read_table_paragraphs(ET.fromstring(tbl_xml), style_names, default_style)
+
+def iter_paragraphs(docx_zip, table_executor=None, big_table_cells=BIG_TABLE_CELLS):
+    """Đọc word/document.xml theo kiểu streaming (iterparse), yield Paragraph theo thứ tự tài liệu
+
+    Paragraph của bảng được phát ra ngay tại vị trí của bảng (xen kẽ với body), mỗi ô
+    thật một lần. Mỗi paragraph/bảng cấp body được giải phóng ngay sau khi xử lý.
+
+    Nếu có table_executor (ProcessPoolExecutor), bảng có từ big_table_cells ô trở lên được
+    gửi sang process con; trong lúc chờ vẫn parse tiếp, kết quả vẫn phát ra đúng thứ tự.
+    """
+    style_names, default_style = read_style_names(docx_zip)
+    pending = deque()  # list Paragraph hoặc Future (bảng lớn), theo thứ tự tài liệu
+
+    with docx_zip.open('word/document.xml') as f:
+        body = None
+        depth = 0
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 2 and elem.tag == W_BODY:
+                    body = elem
+                continue
+
+            depth -= 1
+            if depth != 2 or body is None:
+                continue
+
+            # Phần tử con trực tiếp của w:body đã parse xong
+            if elem.tag == W_P:
+                para = _read_paragraph(elem, style_names, default_style)
+                if pending:
+                    pending.append([para])
+                else:
+                    yield para
+            elif elem.tag == W_TBL:
+                if table_executor is not None and sum(1 for _ in elem.iter(W_TC)) >= big_table_cells:
+                    pending.append(table_executor.submit(
+                        read_table_xml, ET.tostring(elem), style_names, default_style))
+                else:
+                    pending.append(_read_table_paragraphs(elem, style_names, default_style))
+            body.clear()
+
+            # Phát phần đầu hàng đợi đã sẵn sàng; chờ bảng lớn nếu hàng đợi quá dài
+            while pending and (not isinstance(pending[0], Future) or pending[0].done()
+                               or len(pending) > MAX_PENDING):
+                item = pending.popleft()
+                yield from (item.result() if isinstance(item, Future) else item)
+
+    while pending:
+        item = pending.popleft()
+        yield from (item.result() if isinstance(item, Future) else item)
@@ -0,0 +1,107 @@
+import json
+import logging
+import sys
+
+LOGGER_NAME = 'sbt'  # Logger gốc của mọi module, vd. sbt.process, sbt.pipeline
+
+enabled = False  # True khi đang ghi file sự kiện JSON-lines (setup_logging với json_path)
+
+class EventLogger(logging.LoggerAdapter):
+    """Logger của module: lọc theo level của console như bình thường, riêng dòng log có sự kiện
+    (extra=event(...)) vẫn tới file JSON-lines khi enabled dù thấp hơn level đó
+
+    Nhờ vậy bật --log-json không cần hạ logger xuống DEBUG: log chi tiết từng ảnh (không có sự
+    kiện) vẫn bị bỏ ngay từ đầu, không tạo record.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, None)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+    def log(self, level, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, **kwargs)
+        elif enabled and 'event' in (kwargs.get('extra') or {}):
+            # Handler console có level riêng nên không in dòng này, chỉ handler sự kiện nhận
+            self.logger._log(level, msg, args, **kwargs)
+
+def get_logger(module_name):
+    """Logger con của một module; chưa gọi setup_logging thì chỉ WARNING trở lên được in ra"""
+    return EventLogger(logging.getLogger(f"{LOGGER_NAME}.{module_name}"))
+
+def event(event_name, **fields):
+    """extra= cho một dòng log kèm sự kiện máy đọc được, vd. log.info("...", extra=event('extract.done', saved=3))"""
+    return {'event': event_name, 'fields': fields}
+
+class JsonLinesFormatter(logging.Formatter):
+    """Mỗi sự kiện một dòng JSON: ts, level, logger, event, msg + các field của sự kiện"""
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.event,
+            'msg': record.getMessage(),
+        }
+        data.update(record.fields)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class EventFilter(logging.Filter):
+    """Chỉ giữ các dòng log có sự kiện (bỏ log chi tiết từng ảnh/từng đoạn văn)"""
+
+    def filter(self, record):
+        return hasattr(record, 'event')
+
+def setup_logging(level=logging.INFO, json_path=None):
+    """Cấu hình logger 'sbt': console (stderr) theo level, thêm file JSON-lines các sự kiện nếu có json_path
+
+    Gọi lại nhiều lần được (handler cũ bị thay thế). Logger giữ level của console; sự kiện ở level
+    thấp hơn vẫn được ghi vào file (xem EventLogger).
+    """
+    global enabled
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(level)
+    console.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(console)
+
+    if json_path:
+        events = logging.FileHandler(json_path, mode='a', encoding='utf-8')
+        events.setLevel(logging.DEBUG)
+        events.addFilter(EventFilter())
+        events.setFormatter(JsonLinesFormatter())
+        logger.addHandler(events)
+
+    enabled = bool(json_path)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+def init_worker_logging(level=logging.WARNING):
+    """initializer cho ProcessPoolExecutor: process con chỉ in cảnh báo/lỗi, không ghi file sự kiện"""
+    setup_logging(level)
+
+def add_logging_arguments(parser):
+    """Thêm -q/-v/--log-json vào một argparse parser"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-q', '--quiet', action='store_true', help="Chỉ in cảnh báo và lỗi")
+    group.add_argument('-v', '--verbose', action='store_true', help="In chi tiết từng ảnh/từng file")
+    parser.add_argument('--log-json', metavar='PATH', default=None,
+                        help="Ghi các sự kiện dạng JSON-lines vào file này")
+
+def setup_logging_from_args(args, default_level=logging.INFO):
+    """Cấu hình logging theo -q/-v/--log-json"""
+    if getattr(args, 'quiet', False):
+        level = logging.WARNING
+    elif getattr(args, 'verbose', False):
+        level = logging.DEBUG
+    else:
+        level = default_level
+    return setup_logging(level, getattr(args, 'log_json', None))
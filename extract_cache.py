@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+CACHE_FILENAME = ".extract_cache.sqlite"  # Nằm cạnh thư mục output
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    output_folder TEXT PRIMARY KEY,
+    docx_path TEXT NOT NULL,
+    docx_sha256 TEXT NOT NULL,
+    rules_version TEXT NOT NULL,
+    dedup INTEGER NOT NULL,
+    saved_count INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    output_folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    media TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (output_folder, filename)
+);
+"""
+
+def file_sha256(path):
+    """SHA-256 của một file, đọc theo từng chunk"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def media_fingerprint(docx_zip, member):
+    """Dấu vân tay của một media part lấy từ central directory (CRC32 + size), không cần giải nén"""
+    info = docx_zip.getinfo(member)
+    return f"{info.CRC:08x}-{info.file_size}", info.file_size
+
+class ExtractCache:
+    """Cache SQLite lưu hash DOCX, dấu vân tay media và tên file đã ghi cho từng thư mục output"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.executescript(_SCHEMA)
+
+    @classmethod
+    def for_output(cls, output_folder):
+        """Mở cache nằm cạnh thư mục output"""
+        parent = os.path.dirname(os.path.abspath(output_folder))
+        return cls(os.path.join(parent, CACHE_FILENAME))
+
+    @staticmethod
+    def _key(output_folder):
+        return os.path.abspath(output_folder)
+
+    def lookup_document(self, output_folder, docx_sha256, rules_version, dedup):
+        """Trả về số ảnh đã lưu nếu DOCX + luật đặt tên không đổi và file output còn đủ, ngược lại None"""
+        key = self._key(output_folder)
+        row = self.conn.execute(
+            "SELECT docx_sha256, rules_version, dedup, saved_count FROM documents WHERE output_folder = ?",
+            (key,)).fetchone()
+        if row is None or row[:3] != (docx_sha256, rules_version, int(dedup)):
+            return None
+
+        for filename, size in self.conn.execute(
+                "SELECT filename, size FROM images WHERE output_folder = ?", (key,)):
+            filepath = os.path.join(output_folder, filename)
+            if not os.path.exists(filepath) or os.path.getsize(filepath) != size:
+                return None
+        return row[3]
+
+    def load_images(self, output_folder):
+        """dict filename -> fingerprint của lần trích xuất trước"""
+        return dict(self.conn.execute(
+            "SELECT filename, fingerprint FROM images WHERE output_folder = ?",
+            (self._key(output_folder),)))
+
+    def is_current(self, previous, filename, fingerprint, filepath, size):
+        """File đã có trên đĩa với đúng tên và đúng nội dung media thì không cần ghi lại"""
+        return (previous.get(filename) == fingerprint
+                and os.path.exists(filepath)
+                and os.path.getsize(filepath) == size)
+
+    def record_document(self, output_folder, docx_path, docx_sha256, rules_version, dedup,
+                        saved_count, images):
+        """Ghi lại kết quả trích xuất; images là list (filename, media, fingerprint, size).
+
+        Chỉ gọi khi lần trích xuất không có lỗi (ghi nhận kết quả thiếu thì ảnh lỗi không bao giờ được thử lại).
+
+        Trả về list tên file của lần trước không còn trong kết quả mới (cần xoá khỏi output).
+        """
+        key = self._key(output_folder)
+        new_names = {filename for filename, _, _, _ in images}
+        stale = [name for name in self.load_images(output_folder) if name not in new_names]
+
+        with self.conn:
+            self.conn.execute("DELETE FROM images WHERE output_folder = ?", (key,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO images (output_folder, filename, media, fingerprint, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(key, filename, media, fingerprint, size) for filename, media, fingerprint, size in images])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(output_folder, docx_path, docx_sha256, rules_version, dedup, saved_count, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, os.path.abspath(docx_path), docx_sha256, rules_version, int(dedup),
+                 saved_count, time.time()))
+        return stale
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,244 @@
+import argparse
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from event_log import add_logging_arguments, event, get_logger, init_worker_logging, setup_logging_from_args
+from run_stats import RunStats, add_stats_arguments, profile_to
+
+SNIFF_BYTES = 64  # Đủ để nhận ra mọi định dạng bên dưới (EMF cần tới byte 44)
+DEFAULT_QUALITY = 80
+THUMB_DIRNAME = "thumbs"  # Thư mục thumbnail, nằm trong thư mục output
+
+# Chữ ký đầu file -> extension (ảnh vector EMF/WMF/SVG chỉ được sửa extension, không chuyển định dạng)
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'II*\x00', '.tiff'),
+    (b'MM\x00*', '.tiff'),
+    (b'\xd7\xcd\xc6\x9a', '.wmf'),  # WMF có placeable header
+    (b'\x01\x00\x09\x00', '.wmf'),
+    (b'\x02\x00\x09\x00', '.wmf'),
+    (b'BM', '.bmp'),
+)
+RASTER_EXTS = {'.png', '.jpg', '.gif', '.tiff', '.bmp', '.webp'}  # Pillow đọc được trên mọi hệ điều hành
+FORMAT_EXTS = {'jpeg': '.jpg', 'webp': '.webp'}
+
+log = get_logger('transcode')
+
+def sniff_format(head):
+    """Extension thật của ảnh từ các byte đầu (magic bytes), không nhận ra thì None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if head[:4] == b'\x01\x00\x00\x00' and head[40:44] == b' EMF':
+        return '.emf'
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if b'<svg' in head[:SNIFF_BYTES]:
+        return '.svg'
+    return None
+
+def sniff_file(path):
+    """sniff_format cho một file trên đĩa"""
+    with open(path, 'rb') as f:
+        return sniff_format(f.read(SNIFF_BYTES))
+
+def _pillow():
+    """Import Pillow khi thật sự cần chuyển định dạng/tạo thumbnail (thư viện tuỳ chọn)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Cần cài Pillow để chuyển định dạng/tạo thumbnail: pip install Pillow") from None
+    return Image
+
+def _encode(image, fmt, quality):
+    """Mã hoá ảnh Pillow sang JPEG/WebP trong bộ nhớ, trả về bytes"""
+    Image = _pillow()
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    buffer = io.BytesIO()
+    if fmt == 'jpeg':
+        if has_alpha:
+            # JPEG không có kênh alpha: đặt ảnh lên nền trắng như khi in trong sách
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+def _write_bytes(data, path):
+    tmp_path = path + ".part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def transcode_image(src_path, output_folder, fmt=None, quality=DEFAULT_QUALITY, thumb_size=None):
+    """Chạy trong process con: xử lý một ảnh đã trích xuất, trả về dict kết quả
+
+    Extension của file output lấy theo định dạng thật (magic bytes). fmt ('jpeg'/'webp'): chuyển
+    ảnh raster sang định dạng đó, giữ bản gốc nếu bản chuyển không nhỏ hơn. thumb_size: tạo
+    thumbnail cạnh dài tối đa thumb_size px trong output_folder/thumbs. output_folder trùng thư mục
+    ảnh gốc (xử lý tại chỗ) mà extension đổi thì file gốc bị xoá sau khi đã ghi xong file mới.
+    """
+    name = os.path.basename(src_path)
+    stem = os.path.splitext(name)[0]
+    result = {
+        'source': src_path,
+        'output': None,
+        'thumbnail': None,
+        'format_in': None,
+        'format_out': None,
+        'bytes_in': 0,
+        'bytes_out': 0,
+        'error': None,
+    }
+    try:
+        with open(src_path, 'rb') as f:
+            data = f.read()
+        real_ext = sniff_format(data[:SNIFF_BYTES]) or os.path.splitext(name)[1].lower()
+        result.update(format_in=real_ext, bytes_in=len(data))
+
+        out_ext, out_data = real_ext, data
+        image = None
+        if real_ext in RASTER_EXTS and (fmt or thumb_size):
+            image = _pillow().open(io.BytesIO(data))
+            image.load()
+        if fmt and image is not None:
+            encoded = _encode(image, fmt, quality)
+            if len(encoded) < len(data):
+                out_ext, out_data = FORMAT_EXTS[fmt], encoded
+
+        output_path = os.path.join(output_folder, stem + out_ext)
+        _write_bytes(out_data, output_path)
+        if output_path != src_path and os.path.samefile(os.path.dirname(src_path) or ".", output_folder):
+            os.remove(src_path)  # Tại chỗ: không để lại cả x.png lẫn x.jpg
+        result.update(output=output_path, format_out=out_ext, bytes_out=len(out_data))
+
+        if thumb_size and image is not None:
+            thumb = image.copy()
+            thumb.thumbnail((thumb_size, thumb_size))
+            thumb_fmt = fmt or 'jpeg'
+            thumb_path = os.path.join(output_folder, THUMB_DIRNAME, stem + FORMAT_EXTS[thumb_fmt])
+            _write_bytes(_encode(thumb, thumb_fmt, quality), thumb_path)
+            result['thumbnail'] = thumb_path
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+def list_images(images_folder):
+    """Các file ảnh trong thư mục output của extract (bỏ manifest/báo cáo _*.json, file ẩn và file tạm)"""
+    return sorted(name for name in os.listdir(images_folder)
+                  if not name.startswith(('_', '.')) and not name.endswith('.part')
+                  and os.path.isfile(os.path.join(images_folder, name)))
+
+def transcode_folder(images_folder, output_folder, fmt=None, quality=DEFAULT_QUALITY, thumb_size=None,
+                     workers=None, executor=None, stats=None):
+    """Xử lý song song mọi ảnh trong images_folder, ghi kết quả vào output_folder
+
+    Không có fmt/thumb_size thì chỉ copy và sửa extension theo định dạng thật (không cần Pillow).
+    output_folder có thể trùng images_folder (xử lý tại chỗ): ảnh đổi extension thay cho file gốc;
+    khi đó hai ảnh cùng tên (khác extension) bị từ chối vì có thể ghi đè lên nhau.
+    executor: ProcessPoolExecutor dùng chung (vd. của pipeline), không có thì tự tạo với workers process.
+    Trả về list dict kết quả theo từng ảnh (xem transcode_image).
+    """
+    stats = stats or RunStats('transcode')
+    if fmt is not None and fmt not in FORMAT_EXTS:
+        raise ValueError(f"định dạng không hỗ trợ: {fmt} (chọn {', '.join(FORMAT_EXTS)})")
+    if fmt or thumb_size:
+        _pillow()  # Báo lỗi ngay thay vì lỗi ở từng ảnh
+    os.makedirs(output_folder, exist_ok=True)
+    if thumb_size:
+        os.makedirs(os.path.join(output_folder, THUMB_DIRNAME), exist_ok=True)
+
+    names = list_images(images_folder)
+    if os.path.samefile(images_folder, output_folder):
+        stems = {}
+        for name in names:
+            stems.setdefault(os.path.splitext(name)[0], []).append(name)
+        clashes = [', '.join(group) for group in stems.values() if len(group) > 1]
+        if clashes:
+            raise ValueError(f"không xử lý tại chỗ được, ảnh trùng tên: {'; '.join(clashes)}")
+    with stats.timer('transcode.total'):
+        pool = executor or ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging)
+        try:
+            futures = [pool.submit(transcode_image, os.path.join(images_folder, name), output_folder,
+                                   fmt, quality, thumb_size)
+                       for name in names]
+            results = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+    bytes_in = sum(r['bytes_in'] for r in results)
+    bytes_out = sum(r['bytes_out'] for r in results)
+    failed = 0
+    for r in results:
+        fields = event('transcode.file', source=r['source'], output=r['output'], format_in=r['format_in'],
+                       format_out=r['format_out'], bytes_in=r['bytes_in'], bytes_out=r['bytes_out'],
+                       error=r['error'])
+        if r['error']:
+            failed += 1
+            log.error(f"❌ {os.path.basename(r['source'])}: {r['error']}", extra=fields)
+        else:
+            log.debug(f"🖼️  {os.path.basename(r['source'])} → {os.path.basename(r['output'])} "
+                      f"({r['bytes_in']:,} → {r['bytes_out']:,} bytes)", extra=fields)
+
+    stats.count('transcode.files', len(results))
+    stats.count('transcode.errors', failed)
+    stats.count('transcode.thumbnails', sum(1 for r in results if r['thumbnail']))
+    stats.count('transcode.bytes_in', bytes_in)
+    stats.count('transcode.bytes_out', bytes_out)
+    log.info(f"🎉 {len(results) - failed}/{len(results)} ảnh → '{output_folder}', "
+             f"{bytes_in / 1048576:.1f} MB → {bytes_out / 1048576:.1f} MB",
+             extra=event('transcode.done', images=images_folder, output=output_folder, files=len(results),
+                         failed=failed, bytes_in=bytes_in, bytes_out=bytes_out))
+    return results
+
+def add_transcode_arguments(parser):
+    """Thêm --format/--quality/--thumbnail vào một argparse parser"""
+    parser.add_argument('--format', dest='image_format', choices=sorted(FORMAT_EXTS), default=None,
+                        help="Chuyển ảnh raster sang định dạng này (cần Pillow)")
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY,
+                        help=f"Chất lượng JPEG/WebP (mặc định: {DEFAULT_QUALITY})")
+    parser.add_argument('--thumbnail', type=int, default=None, metavar='PX',
+                        help="Tạo thumbnail cạnh dài tối đa PX (cần Pillow)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sửa extension theo định dạng thật, chuyển JPEG/WebP và tạo thumbnail cho ảnh đã trích xuất")
+    parser.add_argument('images', help="Thư mục ảnh đã trích xuất")
+    parser.add_argument('-o', '--output', required=True, help="Thư mục ghi ảnh đã xử lý")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Số process song song (mặc định: số core)")
+    parser.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+    add_transcode_arguments(parser)
+    add_logging_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_logging_from_args(args)
+
+    stats = RunStats('transcode')
+    try:
+        with profile_to(args.profile):
+            results = transcode_folder(args.images, args.output, args.image_format, args.quality,
+                                       args.thumbnail, args.workers, stats=stats)
+    except (RuntimeError, ValueError, OSError) as e:
+        log.error(f"❌ {e}")
+        return 2
+    if args.stats:
+        stats.write_report(args.stats)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 1 if any(r['error'] for r in results) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+import re
+from collections import namedtuple
+
+# Loại chỉ mục nhận diện được trong một paragraph
+KIND_TITLE = 'title'
+KIND_HINH = 'hinh'    # "Hình 1.1"
+KIND_CAU = 'cau'      # "Câu 3"
+KIND_H = 'h'          # "H.4.22" (dạng rút gọn của Hình)
+KIND_BAI = 'bai'      # "1.23" → Bài 1.23
+
+# Thứ tự ưu tiên khi một paragraph có nhiều loại chỉ mục
+INDEX_PRIORITY = (KIND_HINH, KIND_CAU, KIND_H, KIND_BAI)
+
+_LABELS = {
+    KIND_HINH: 'Hình',
+    KIND_CAU: 'Câu',
+    KIND_H: 'Hình',   # H.4.22 → Hình 4.22
+    KIND_BAI: 'Bài',
+}
+
+# ✅ PATTERN NHẬN DIỆN TIÊU ĐỀ - gộp thành một regex, dùng với .match()
+TITLE_RE = re.compile(
+    r'^(?:'
+    r'[A-Z][^a-z]*$'          # Toàn chữ hoa: "PHÉP NHÂN VÀ PHÉP CHIA SỐ TỰ NHIÊN"
+    r'|[A-Z]\.\s*[A-Z]'       # "A. KIẾN THỨC CẦN NHỚ"
+    r'|[IVX]+\.\s*[A-Z]'      # "I. GIỚI THIỆU"
+    r'|\d+\.\s*[A-Z]'         # "1. CHƯƠNG ĐẦU"
+    r'|BÀI\s*$'               # Chỉ có chữ "BÀI"
+    r'|CHƯƠNG\s+[IVX\d]'      # "CHƯƠNG I", "CHƯƠNG 1"
+    r')'
+)
+
+TITLE_STYLE_KEYWORDS = ('heading', 'title', 'header')
+
+# ✅ Một lần quét duy nhất cho Hình / Câu / H. / Bài (mỗi nhánh là một named group)
+INDEX_RE = re.compile(
+    r'(?i:Hình)\s+(?P<hinh>\d+\.\d+)'
+    r'|Câu\s+(?P<cau>\d+)'
+    r'|H\.(?P<h>\d+\.\d+)'
+    r'|(?P<bai>\d+\.\d+)'
+)
+
+_UNSAFE_CHARS_RE = re.compile(r'[<>:"/\\|?*]')
+_SPACES_RE = re.compile(r'\s+')
+
+class ParagraphIndex(namedtuple('ParagraphIndex', ['kind', 'number', 'title'])):
+    """Kết quả phân loại một paragraph: tiêu đề, chỉ mục (Hình/Câu/Bài) hoặc không có gì"""
+
+    __slots__ = ()
+
+    @property
+    def is_title(self):
+        return self.kind == KIND_TITLE
+
+    @property
+    def label(self):
+        """Tên chỉ mục dùng trong tên file: "Hình 1.1", "Câu 3", "Bài 1.23" hoặc tiêu đề"""
+        if self.kind == KIND_TITLE:
+            return self.title
+        if self.kind is None:
+            return None
+        return f"{_LABELS[self.kind]} {self.number}"
+
+NO_INDEX = ParagraphIndex(None, None, None)
+
+def clean_title(title):
+    """Làm sạch tiêu đề để dùng làm tên file"""
+    # Loại bỏ ký tự đặc biệt
+    cleaned = _UNSAFE_CHARS_RE.sub('', title)
+    # Thay thế khoảng trắng liền nhau bằng 1 khoảng trắng
+    cleaned = _SPACES_RE.sub(' ', cleaned).strip()
+    # Giới hạn độ dài
+    if len(cleaned) > 50:
+        cleaned = cleaned[:47] + "..."
+    return cleaned
+
+def is_title(text, style_name=None):
+    """Kiểm tra xem paragraph (text đã strip) có phải là tiêu đề không"""
+    # Kiểm tra độ dài (tiêu đề thường ngắn hơn 100 ký tự)
+    if len(text) > 100:
+        return False
+
+    if TITLE_RE.match(text):
+        return True
+
+    # Kiểm tra style của paragraph (nếu có)
+    if style_name:
+        style_name = style_name.lower()
+        if any(keyword in style_name for keyword in TITLE_STYLE_KEYWORDS):
+            return True
+
+    return False
+
+def find_index(text):
+    """Tìm chỉ mục trong text, trả về (kind, number) theo thứ tự ưu tiên, lấy số cuối cùng"""
+    last = {}
+    for match in INDEX_RE.finditer(text):
+        kind = match.lastgroup
+        last[kind] = match.group(kind)
+
+    if not last:
+        return None, None
+
+    for kind in INDEX_PRIORITY:
+        if kind in last:
+            return kind, last[kind]
+
+def classify_paragraph(text, style_name=None):
+    """Phân loại paragraph (text đã strip) → ParagraphIndex"""
+    if is_title(text, style_name):
+        return ParagraphIndex(KIND_TITLE, None, clean_title(text))
+
+    kind, number = find_index(text)
+    if kind is None:
+        return NO_INDEX
+    return ParagraphIndex(kind, number, None)
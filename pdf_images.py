@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from docx_stream import Paragraph
+from event_log import add_logging_arguments, event, get_logger, init_worker_logging, setup_logging_from_args
+from process import build_image_filename, get_base_filename, link_or_copy, scan_images
+from run_stats import RunStats, add_stats_arguments, profile_to
+
+MIN_IMAGE_SIZE = 16     # Bỏ qua ảnh nhỏ hơn chừng này px (gạch đầu dòng, đường kẻ trang trí)
+PAGES_PER_CHUNK = 20    # Số trang mỗi process con xử lý trong một lượt (mở PDF một lần mỗi lượt)
+
+log = get_logger('pdf_images')
+
+def _pymupdf():
+    """Import PyMuPDF (thư viện tuỳ chọn, chỉ cần cho đường trích ảnh trực tiếp từ PDF)"""
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            import fitz as pymupdf
+        except ImportError:
+            raise RuntimeError("Cần cài PyMuPDF để trích ảnh trực tiếp từ PDF: pip install pymupdf") from None
+    return pymupdf
+
+def _image_filters(doc, xref):
+    """Danh sách filter của stream ảnh, vd. ['/FlateDecode', '/DCTDecode']"""
+    kind, value = doc.xref_get_key(xref, 'Filter')
+    if kind not in ('name', 'array'):
+        return []
+    return value.strip('[]').replace('/', ' /').split()
+
+def _image_ext(doc, xref):
+    """Extension của ảnh khi ghi ra
+
+    Chỉ stream nén đúng một filter DCTDecode (JPEG) hoặc JPXDecode (JPEG 2000) mới được copy nguyên
+    (extension JPX lấy theo extract_image); chuỗi filter khác (vd. Flate + DCT) thì giải mã rồi ghi PNG.
+    """
+    filters = _image_filters(doc, xref)
+    if filters == ['/DCTDecode']:
+        return '.jpg'
+    if filters == ['/JPXDecode']:
+        return '.' + doc.extract_image(xref)['ext']
+    return '.png'
+
+def scan_pages(pdf_path, first_page, last_page, min_size=MIN_IMAGE_SIZE):
+    """Chạy trong process con: đọc các trang first_page..last_page (đánh số từ 1)
+
+    Trả về list (số trang, items) với items là các dòng text và ảnh của trang theo thứ tự đọc
+    (từ trên xuống, trái sang phải): ('text', dòng) hoặc ('image', xref, extension).
+    """
+    pymupdf = _pymupdf()
+    text_flags = pymupdf.TEXTFLAGS_DICT & ~pymupdf.TEXT_PRESERVE_IMAGES
+    pages = []
+    with pymupdf.open(pdf_path) as doc:
+        for page_number in range(first_page, last_page + 1):
+            page = doc[page_number - 1]
+            positioned = []
+            for block in page.get_text('dict', flags=text_flags)['blocks']:
+                for line in block.get('lines', ()):
+                    text = ''.join(span['text'] for span in line['spans'])
+                    if text.strip():
+                        x0, y0 = line['bbox'][:2]
+                        positioned.append((y0, x0, ('text', text)))
+            for info in page.get_image_info(xrefs=True):
+                xref = info['xref']
+                if xref <= 0 or min(info['width'], info['height']) < min_size:
+                    continue  # Ảnh inline (không có xref) hoặc ảnh trang trí
+                x0, y0 = info['bbox'][:2]
+                positioned.append((y0, x0, ('image', xref, _image_ext(doc, xref))))
+            positioned.sort(key=lambda item: (round(item[0], 1), item[1]))
+            pages.append((page_number, [item for _, _, item in positioned]))
+    return pages
+
+def write_images(pdf_path, jobs):
+    """Chạy trong process con: ghi các ảnh (xref, filepath), trả về (số ảnh, số byte, list lỗi)"""
+    pymupdf = _pymupdf()
+    saved = 0
+    bytes_written = 0
+    errors = []
+    with pymupdf.open(pdf_path) as doc:
+        for xref, filepath in jobs:
+            try:
+                if filepath.endswith('.png'):
+                    pixmap = pymupdf.Pixmap(doc, xref)
+                    if pixmap.n - pixmap.alpha > 3:  # CMYK → RGB để ghi được PNG
+                        pixmap = pymupdf.Pixmap(pymupdf.csRGB, pixmap)
+                    data = pixmap.tobytes('png')
+                else:
+                    data = doc.xref_stream_raw(xref)
+                tmp_path = filepath + ".part"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, filepath)
+                saved += 1
+                bytes_written += len(data)
+            except Exception as e:
+                errors.append(f"{os.path.basename(filepath)}: {type(e).__name__}: {e}")
+    return saved, bytes_written, errors
+
+def _page_paragraphs(pages, image_files, image_pages):
+    """Chuyển các trang thành Paragraph cho scan_images (dùng chung luật chỉ mục với DOCX)
+
+    Mỗi ảnh là một paragraph không có text (giống ảnh nằm riêng một dòng trong DOCX) nên
+    scan_images luôn giữ nó, theo đúng thứ tự; image_pages nhận số trang của từng ảnh theo thứ tự đó.
+    """
+    for page_number, items in pages:
+        for item in items:
+            if item[0] == 'text':
+                yield Paragraph(item[1], None, [], '')
+            else:
+                _, xref, ext = item
+                embed_id = str(xref)
+                image_files.setdefault(embed_id, f"xref{xref}{ext}")
+                image_pages.append(page_number)
+                yield Paragraph('', None, [embed_id], '')
+
+def _map_chunks(pool, func, pdf_path, chunks, *args):
+    futures = [pool.submit(func, pdf_path, *chunk, *args) for chunk in chunks]
+    return [future.result() for future in futures]
+
+def extract_pdf_images(pdf_path, output_folder="images", workers=None, executor=None, base_filename=None,
+                       min_size=MIN_IMAGE_SIZE, dry_run=False, stats=None):
+    """Trích ảnh (image XObject) trực tiếp từ PDF, không qua Mathpix/DOCX
+
+    Text của từng trang được đưa qua cùng luật Bài/Hình/Câu/tiêu đề như extract_images; tên file
+    "STT - tên gốc - chỉ mục - trang N.ext". Các trang được đọc và ghi song song trên process pool
+    (executor dùng chung, hoặc tự tạo với workers process). dry_run=True: chỉ trả về danh sách tên.
+    Trả về dict: pdf_path, output_folder, pages, found, saved, images (filename, index, page, media,
+    context), errors.
+    """
+    pymupdf = _pymupdf()
+    stats = stats or RunStats('pdf_images')
+    start = time.perf_counter()
+    result = {
+        'pdf_path': pdf_path,
+        'output_folder': output_folder,
+        'pages': 0,
+        'found': 0,
+        'saved': 0,
+        'images': [],
+        'errors': [],
+    }
+    base_filename = base_filename or get_base_filename(pdf_path)
+    with pymupdf.open(pdf_path) as doc:
+        page_count = doc.page_count
+    result['pages'] = page_count
+    stats.count('pdf.documents')
+    stats.count('pdf.pages', page_count)
+    chunks = [(first, min(first + PAGES_PER_CHUNK - 1, page_count))
+              for first in range(1, page_count + 1, PAGES_PER_CHUNK)]
+
+    pool = executor or ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging)
+    try:
+        # Bước 1: đọc text + vị trí ảnh của các trang song song
+        with stats.timer('pdf.scan_pages'):
+            pages = [page for chunk in _map_chunks(pool, scan_pages, pdf_path, chunks, min_size)
+                     for page in chunk]
+
+        # Bước 2: gắn chỉ mục theo thứ tự trang (tuần tự vì chỉ mục mang từ trang trước sang)
+        image_files = {}
+        image_pages = []
+        with stats.timer('pdf.index'):
+            images = scan_images(_page_paragraphs(pages, image_files, image_pages), image_files,
+                                 verbose=False, stats=stats)
+        for img, page_number in zip(images, image_pages):
+            img['page'] = page_number
+        filenames = [build_image_filename(stt, base_filename, img) for stt, img in enumerate(images, 1)]
+        result['found'] = len(images)
+        result['images'] = [{'filename': filename, 'index': img['index'], 'page': img['page'],
+                             'media': img['file_path'], 'context': img['text']}
+                            for filename, img in zip(filenames, images)]
+        if dry_run or not images:
+            return result
+
+        # Bước 3: ghi ảnh song song; ảnh lặp lại (cùng xref) chỉ giải mã một lần rồi link
+        os.makedirs(output_folder, exist_ok=True)
+        media_xrefs = {media: int(embed_id) for embed_id, media in image_files.items()}
+        first_paths = {}
+        duplicates = []
+        jobs_by_chunk = {}
+        for filename, img in zip(filenames, images):
+            filepath = os.path.join(output_folder, filename)
+            xref = media_xrefs[img['file_path']]
+            if xref in first_paths:
+                duplicates.append((first_paths[xref], filepath))
+                continue
+            first_paths[xref] = filepath
+            chunk = (img['page'] - 1) // PAGES_PER_CHUNK
+            jobs_by_chunk.setdefault(chunk, []).append((xref, filepath))
+
+        with stats.timer('pdf.write'):
+            futures = [pool.submit(write_images, pdf_path, jobs) for _, jobs in sorted(jobs_by_chunk.items())]
+            for future in futures:
+                saved, bytes_written, errors = future.result()
+                result['saved'] += saved
+                result['errors'].extend(errors)
+                stats.count('pdf.bytes_written', bytes_written)
+            for src_path, dst_path in duplicates:
+                if os.path.exists(src_path):
+                    link_or_copy(src_path, dst_path)
+                    result['saved'] += 1
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    stats.count('pdf.images_saved', result['saved'])
+    stats.count('pdf.files_linked', len(duplicates))
+    for error in result['errors']:
+        log.error(f"❌ {error}", extra=event('pdf.error', pdf=pdf_path, error=error))
+    log.info(f"🎉 Đã lưu {result['saved']}/{len(images)} ảnh từ {page_count} trang vào '{output_folder}' "
+             f"({time.perf_counter() - start:.1f}s)",
+             extra=event('pdf.done', pdf=pdf_path, output=output_folder, pages=page_count,
+                         found=len(images), saved=result['saved'], errors=len(result['errors'])))
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trích ảnh trực tiếp từ PDF (không qua Mathpix), đặt tên theo chỉ mục")
+    parser.add_argument('pdf', help="File PDF (nên là bản đã unlock bằng qpdf)")
+    parser.add_argument('-o', '--output', default="images", help="Thư mục lưu ảnh")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Số process song song (mặc định: số core)")
+    parser.add_argument('--min-size', type=int, default=MIN_IMAGE_SIZE,
+                        help=f"Bỏ qua ảnh có cạnh nhỏ hơn số px này (mặc định: {MIN_IMAGE_SIZE})")
+    parser.add_argument('--dry-run', action='store_true', help="Chỉ liệt kê tên file, không ghi ảnh")
+    parser.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+    add_logging_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args(argv)
+    setup_logging_from_args(args)
+
+    stats = RunStats('pdf_images')
+    try:
+        with profile_to(args.profile):
+            result = extract_pdf_images(args.pdf, args.output, args.workers, min_size=args.min_size,
+                                        dry_run=args.dry_run, stats=stats)
+    except RuntimeError as e:
+        log.error(f"❌ {e}")
+        return 2
+    if args.stats:
+        stats.write_report(args.stats)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.dry_run:
+        for img in result['images']:
+            print(img['filename'])
+    return 1 if result['errors'] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,268 @@
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from convert_pdf_docx import convert_pdf_to_docx, default_output_path
+from event_log import add_logging_arguments, event, get_logger, init_worker_logging, setup_logging_from_args
+from image_transcode import add_transcode_arguments, transcode_folder
+from pdf_images import extract_pdf_images
+from process import extract_one
+from rename_with_json import rename_folder
+from run_stats import RunStats, add_stats_arguments, profile_to
+from unlock_pdf import find_pdf_jobs, is_up_to_date, remove_pdf_restrictions
+
+STAGES = ('unlock', 'convert', 'extract', 'rename', 'transcode')
+
+_STOP = object()  # Sentinel báo worker của một stage dừng lại
+
+log = get_logger('pipeline')
+
+def find_manifest(manifest_dir, book_name):
+    """Manifest JSON/JSONL của một cuốn sách, không có thì None
+
+    Tìm <manifest_dir>/<đường dẫn tương đối của PDF>.json(l) trước, rồi <manifest_dir>/<tên PDF>.json(l).
+    """
+    if not manifest_dir:
+        return None
+    for name in dict.fromkeys((book_name, os.path.basename(book_name))):
+        for ext in ('.json', '.jsonl'):
+            path = os.path.join(manifest_dir, name + ext)
+            if os.path.exists(path):
+                return path
+    return None
+
+def book_names(sources, input_dir):
+    """Tên của từng PDF trong pipeline = đường dẫn tương đối so với input_dir, bỏ extension
+
+    Các thư mục docx/images/web của mỗi cuốn đặt theo tên này nên hai PDF cùng tên ở hai thư mục
+    con không ghi đè lên nhau. Trả về (dict source -> tên, dict source -> source trùng tên trước đó).
+    """
+    names = {}
+    collisions = {}
+    seen = {}
+    for source in sources:
+        name = os.path.splitext(os.path.relpath(source, input_dir))[0]
+        key = os.path.normcase(name).lower()
+        if key in seen:
+            collisions[source] = seen[key]
+        else:
+            seen[key] = source
+        names[source] = name
+    return names, collisions
+
+class Pipeline:
+    """Chạy unlock → convert → extract → rename → transcode theo kiểu dây chuyền
+
+    Mỗi stage có một nhóm worker thread riêng, giữa các stage là queue có giới hạn,
+    nên cuốn 2 đang unlock trong khi cuốn 1 đang convert và cuốn 0 đang extract.
+    Extract và transcode chạy trong ProcessPoolExecutor vì tốn CPU. transcode (dict tham số
+    fmt/quality/thumb_size của transcode_folder) là stage tuỳ chọn, None thì bỏ qua.
+    direct_pdf=True: bỏ qua Mathpix, extract lấy ảnh trực tiếp từ PDF đã unlock (extract_pdf_images).
+    """
+
+    def __init__(self, work_dir="pipeline_output", manifest_dir=None, concurrency=None, queue_size=2,
+                 transcode=None, direct_pdf=False):
+        self.work_dir = work_dir
+        self.manifest_dir = manifest_dir
+        self.transcode = transcode
+        self.direct_pdf = direct_pdf
+        self.concurrency = {'unlock': 2, 'convert': 4, 'extract': os.cpu_count() or 1, 'rename': 1,
+                            'transcode': 1}
+        self.concurrency.update(concurrency or {})
+        self.queue_size = queue_size
+        self.items = []
+        self.stats = RunStats('pipeline')  # Thời gian bận từng stage + bộ đếm của convert/extract
+
+    # ---------- các stage: nhận item dict, cập nhật item, raise nếu lỗi ----------
+
+    def _unlock(self, item):
+        if is_up_to_date(item['source'], item['unlocked']):
+            item['notes'].append("unlock: đã cập nhật, bỏ qua")
+            return
+        _, error = remove_pdf_restrictions(item['source'], item['unlocked'])
+        if error:
+            raise RuntimeError(error)
+
+    def _convert(self, item):
+        if self.direct_pdf:
+            return
+        docx_dir = os.path.join(self.work_dir, 'docx', os.path.dirname(item['name']))
+        docx_path = default_output_path(item['unlocked'], docx_dir)
+        if not convert_pdf_to_docx(item['unlocked'], docx_path, stats=self.stats):
+            raise RuntimeError("convert thất bại")
+        item['docx'] = docx_path
+
+    def _extract(self, item):
+        item['images'] = os.path.join(self.work_dir, 'images', item['name'])
+        if self.direct_pdf:
+            # Các trang của một cuốn được chia cho process pool của extract
+            result = extract_pdf_images(item['unlocked'], item['images'], executor=self._extract_pool,
+                                        stats=self.stats)
+            if result['errors']:
+                raise RuntimeError(f"{len(result['errors'])} ảnh lỗi: {result['errors'][0]}")
+            item['saved'] = result['saved']
+            return
+        saved_count, _, error, worker_stats = self._extract_pool.submit(
+            extract_one, item['docx'], item['images']).result()
+        self.stats.merge(worker_stats)
+        if error:
+            raise RuntimeError(error)
+        item['saved'] = saved_count
+
+    def _rename(self, item):
+        manifest = find_manifest(self.manifest_dir, item['name'])
+        if not manifest:
+            item['notes'].append("rename: không có manifest, bỏ qua")
+            return
+        result = rename_folder(item['images'], manifest)
+        # Manifest hỏng, journal còn sót hay trùng tên đích đều làm kết quả đổi tên không đầy đủ
+        if result['error']:
+            raise RuntimeError(result['error'])
+        if result['collisions']:
+            first = result['collisions'][0]
+            raise RuntimeError(f"{len(result['collisions'])} ảnh trùng tên đích, vd. {first['old']} → "
+                               f"{first['new']} ({first['reason']})")
+        item['notes'].append(f"rename: đổi tên {len(result['renamed'])}, không khớp {len(result['unmatched'])}")
+
+    def _transcode(self, item):
+        if not self.transcode:
+            return
+        # Các ảnh của một cuốn được chia cho process pool dùng chung với extract
+        results = transcode_folder(item['images'], os.path.join(self.work_dir, 'web', item['name']),
+                                   executor=self._extract_pool, stats=self.stats, **self.transcode)
+        failed = sum(1 for r in results if r['error'])
+        if failed:
+            raise RuntimeError(f"{failed} ảnh lỗi")
+
+    # ---------- điều phối ----------
+
+    def _worker(self, stage, inbox, outbox):
+        handler = getattr(self, '_' + stage)
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            if item['error'] is None:
+                start = time.perf_counter()
+                try:
+                    handler(item)
+                except Exception as e:
+                    item['error'] = f"{stage}: {type(e).__name__}: {e}"
+                item['timings'][stage] = time.perf_counter() - start
+                self.stats.add_time(f"pipeline.{stage}", item['timings'][stage])
+                fields = event('pipeline.stage', stage=stage, name=item['name'],
+                               seconds=round(item['timings'][stage], 3), error=item['error'])
+                if item['error'] is None:
+                    log.debug(f"✅ [{stage}] {item['name']} ({item['timings'][stage]:.1f}s)", extra=fields)
+                else:
+                    log.error(f"❌ {item['name']} - {item['error']}", extra=fields)
+            if outbox is not None:
+                outbox.put(item)
+
+    def run(self, input_dir):
+        """Đưa mọi PDF trong input_dir qua cả 4 stage, trả về list item (kèm timing từng stage)"""
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in STAGES]
+        jobs = find_pdf_jobs(input_dir, os.path.join(self.work_dir, 'unlocked'))
+        names, collisions = book_names([source for source, _ in jobs], input_dir)
+        self.items = [{
+            'name': names[source],
+            'source': source,
+            'unlocked': unlocked,
+            'docx': None,
+            'images': None,
+            'saved': 0,
+            'timings': {},
+            'notes': [],
+            # PDF trùng tên (vd. chỉ khác hoa/thường) với một PDF khác thì không xử lý
+            'error': f"trùng thư mục output với {collisions[source]}" if source in collisions else None,
+        } for source, unlocked in jobs]
+
+        log.info(f"🚀 Pipeline: {len(self.items)} file PDF, concurrency {self.concurrency}")
+        self._extract_pool = ProcessPoolExecutor(max_workers=self.concurrency['extract'],
+                                                 initializer=init_worker_logging)
+        try:
+            threads = []
+            for i, stage in enumerate(STAGES):
+                outbox = queues[i + 1] if i + 1 < len(STAGES) else None
+                stage_threads = [threading.Thread(target=self._worker, args=(stage, queues[i], outbox),
+                                                  name=f"{stage}-{n}", daemon=True)
+                                 for n in range(self.concurrency[stage])]
+                for thread in stage_threads:
+                    thread.start()
+                threads.append(stage_threads)
+
+            # Nạp input (block khi queue đầu đầy), rồi đóng từng stage theo thứ tự
+            for item in self.items:
+                queues[0].put(item)
+            for i, stage_threads in enumerate(threads):
+                for _ in stage_threads:
+                    queues[i].put(_STOP)
+                for thread in stage_threads:
+                    thread.join()
+        finally:
+            self._extract_pool.shutdown()
+
+        self.report(time.perf_counter() - start)
+        return self.items
+
+    def report(self, wall_time):
+        """Báo cáo tổng hợp: file lỗi, tổng thời gian bận của từng stage, thời gian thực"""
+        for item in self.items:
+            timings = "  ".join(f"{stage}={item['timings'][stage]:.1f}s"
+                                for stage in STAGES if stage in item['timings'])
+            status = f"❌ {item['error']}" if item['error'] else f"✅ {item['saved']} ảnh"
+            level = logging.WARNING if item['error'] else logging.DEBUG
+            log.log(level, f"{item['name']}: {status}\n    {timings}",
+                    extra=event('pipeline.item', name=item['name'], saved=item['saved'], error=item['error'],
+                                timings={k: round(v, 3) for k, v in item['timings'].items()},
+                                notes=item['notes']))
+            for note in item['notes']:
+                log.debug(f"    ℹ️  {note}")
+
+        busy = {stage: sum(item['timings'].get(stage, 0.0) for item in self.items) for stage in STAGES}
+        for stage in STAGES:
+            log.info(f"⏱️  {stage:9s}: {busy[stage]:8.1f}s tổng ({self.concurrency[stage]} worker)")
+        failed = sum(1 for item in self.items if item['error'])
+        log.info(f"🎉 {len(self.items) - failed}/{len(self.items)} file thành công, thời gian thực {wall_time:.1f}s",
+                 extra=event('pipeline.done', files=len(self.items), failed=failed,
+                             seconds=round(wall_time, 3),
+                             busy={stage: round(busy[stage], 3) for stage in STAGES}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline unlock → convert → extract → rename")
+    parser.add_argument('input_dir', help="Thư mục chứa các PDF gốc")
+    parser.add_argument('-w', '--work-dir', default="pipeline_output", help="Thư mục output của các stage")
+    parser.add_argument('--manifest-dir', default=None,
+                        help="Thư mục chứa manifest <tên PDF>.json dùng cho stage rename")
+    for stage in STAGES:
+        parser.add_argument(f'--{stage}-workers', type=int, default=None,
+                            help=f"Số worker cho stage {stage}")
+    parser.add_argument('--queue-size', type=int, default=2, help="Kích thước queue giữa các stage")
+    parser.add_argument('--direct-pdf', action='store_true',
+                        help="Không qua Mathpix: trích ảnh trực tiếp từ PDF (cần PyMuPDF)")
+    add_transcode_arguments(parser)
+    add_logging_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    setup_logging_from_args(args)
+
+    concurrency = {stage: getattr(args, f'{stage}_workers') for stage in STAGES
+                   if getattr(args, f'{stage}_workers')}
+    transcode = None
+    if args.image_format or args.thumbnail:
+        transcode = {'fmt': args.image_format, 'quality': args.quality, 'thumb_size': args.thumbnail}
+    pipeline = Pipeline(args.work_dir, args.manifest_dir, concurrency, args.queue_size, transcode,
+                        args.direct_pdf)
+    with profile_to(args.profile):
+        items = pipeline.run(args.input_dir)
+    if args.stats:
+        pipeline.stats.write_report(args.stats)
+    return 1 if any(item['error'] for item in items) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
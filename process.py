@@ -1,234 +1,562 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
 import os
 import re
+import logging
+import shutil
+import time
 import zipfile
-from docx import Document
-import xml.etree.ElementTree as ET
-
-def extract_images_with_precise_index(docx_path, output_folder="images"):
-    """Trích xuất ảnh và gắn tên theo chỉ mục gần nhất như Bài 1.23, Hình 1.1 hoặc tiêu đề chương"""
-
-    # Tạo thư mục lưu ảnh
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    # Đọc document bằng python-docx
-    doc = Document(docx_path)
-
-    # ✅ SỬA: LẤY TÊN FILE GỐC VÀ CẮT TRƯỚC CHỮ "RUOT"
+import zlib
+from anchor_table import AnchorTable
+from docx_package import DocxPackage
+from docx_stream import iter_paragraphs, read_image_relationships
+from event_log import (add_logging_arguments, event, get_logger, init_worker_logging, setup_logging,
+                       setup_logging_from_args)
+from extract_cache import media_fingerprint
+from image_transcode import SNIFF_BYTES, sniff_format
+from index_rules import KIND_CAU, KIND_H, KIND_HINH, classify_paragraph
+from rename_with_json import load_mapping, resolve_final_names
+from run_stats import RunStats, add_stats_arguments, profile_to
+
+RUOT_RE = re.compile(r'\s*[rR]uot')
+COPY_CHUNK_SIZE = 1024 * 1024  # 1 MB mỗi lần đọc/ghi khi lưu ảnh
+DEDUP_MANIFEST = "_manifest.json"  # Manifest của chế độ dedup, nằm trong thư mục output
+RENAME_REPORT = "_rename_report.json"  # Báo cáo khớp tên với manifest JSON (chế độ manifest)
+# Phiên bản luật đặt tên: tăng mỗi khi sửa gì làm đổi tên file hoặc thứ tự ảnh (index_rules, thứ tự
+# đoạn văn/bảng của docx_stream, scan_images, build_image_filename) để cache và bảng neo được làm lại
+NAMING_RULES_VERSION = 1
+
+log = get_logger('process')
+
+def get_base_filename(docx_path):
+    """Lấy tên file gốc, cắt trước chữ "ruot" và thêm hậu tố "- KNTT " """
     base_filename = os.path.splitext(os.path.basename(docx_path))[0]
     
     # Tìm vị trí của "ruot" hoặc "Ruot" (không phân biệt hoa thường)
-    ruot_match = re.search(r'\s*[rR]uot', base_filename)
+    ruot_match = RUOT_RE.search(base_filename)
     if ruot_match:
         base_filename = base_filename[:ruot_match.start()].strip()
     
-    base_filename = base_filename + "- KNTT "
-    print(f"📁 Tên file gốc (đã cắt): {base_filename}")
-
-    # Bước 1: Mapping relationship ID -> file ảnh
-    image_files = {}
-    with zipfile.ZipFile(docx_path, 'r') as docx_zip:
-        try:
-            rels_content = docx_zip.read('word/_rels/document.xml.rels').decode('utf-8')
-            root = ET.fromstring(rels_content)
-
-            for rel in root.findall('.//{*}Relationship'):
-                if rel.get('Target', '').startswith('media/'):
-                    image_files[rel.get('Id')] = rel.get('Target')
-        except Exception as e:
-            print(f"❌ Không thể đọc relationships: {e}")
+    return base_filename + "- KNTT "
+
+def get_rules_version():
+    """Phiên bản luật đặt tên dùng cho cache và bảng neo ảnh (xem NAMING_RULES_VERSION)"""
+    return f"rules-{NAMING_RULES_VERSION}"
+
+def build_image_filename(stt, base_filename, img):
+    """Tên file ảnh: STT + tên file gốc + bài/hình/title (+ "trang N" nếu biết trang) + extension"""
+    ext = img.get('ext') or os.path.splitext(img['file_path'])[1].lower() or ".png"
+    index = img['index'] or "Không xác định"
+    page = f" - trang {img['page']}" if img.get('page') else ""
+    return f"{stt:02d} - {base_filename} - {index}{page}{ext}"
+
+def save_zip_member(docx_zip, member, filepath, hash_name=None):
+    """Ghi một member của zip ra đĩa theo từng chunk (không đọc cả ảnh vào bộ nhớ)
+
+    Member stored của DocxPackage được ghi thẳng từ mmap (không copy qua buffer). Lỗi giữa chừng
+    thì file ghi dở bị xoá trước khi raise. Nếu có hash_name (vd "sha256") thì băm nội dung trong lúc ghi và trả về hexdigest.
+    """
+    # Xoá file cũ trước để không ghi đè lên inode đang được hard link với file khác
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    hasher = hashlib.new(hash_name) if hash_name else None
+    try:
+        view = docx_zip.member_view(member) if isinstance(docx_zip, DocxPackage) else None
+        if view is not None:
+            with view:
+                if zlib.crc32(view) != docx_zip.getinfo(member).CRC:
+                    raise zipfile.BadZipFile(f"Bad CRC-32 for file {member!r}")
+                with open(filepath, 'wb') as dst:
+                    dst.write(view)
+                if hasher is not None:
+                    hasher.update(view)
+            return hasher.hexdigest() if hasher is not None else None
+        with docx_zip.open(member) as src, open(filepath, 'wb') as dst:
+            if hasher is None:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                return None
+            while True:
+                chunk = src.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                dst.write(chunk)
+        return hasher.hexdigest()
+    except BaseException:
+        # Không để lại file ghi dở (CRC sai, đĩa đầy, bị ngắt giữa chừng...)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+def media_extension(docx_zip, media):
+    """Extension của một media part: theo tên, media không có extension thì đoán từ magic bytes"""
+    ext = os.path.splitext(media)[1].lower()
+    if ext:
+        return ext
+    with docx_zip.open(f"word/{media}") as f:
+        return sniff_format(f.read(SNIFF_BYTES)) or ".png"
+
+def link_or_copy(src_path, dst_path):
+    """Tạo hard link tới file đã ghi, nếu hệ thống file không hỗ trợ thì copy"""
+    if os.path.exists(dst_path):
+        if os.path.samefile(src_path, dst_path):
             return
-    
-    print(f"📋 Tìm thấy {len(image_files)} file ảnh trong document")
-
-    # Bước 2: Duyệt đoạn văn + bảng, tìm ảnh và chỉ mục gần nhất
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+def remove_stale_files(output_folder, names):
+    """Xoá các file ảnh của lần trích xuất trước (theo cache) không còn trong kết quả mới"""
+    for name in names:
+        stale_path = os.path.join(output_folder, name)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+def scan_images(paragraphs, image_files, verbose=True, state=None, stats=None):
+    """Duyệt paragraphs (theo thứ tự của docx_stream), gắn mỗi ảnh với chỉ mục gần nhất
+
+    Dùng chung cho extract và preview nên kết quả của hai chế độ luôn giống nhau.
+    state (dict, tuỳ chọn): current_index/current_title mang sang từ DOCX trước (vd. các shard
+    của cùng một cuốn sách) và được cập nhật lại khi duyệt xong.
+    stats (RunStats, tuỳ chọn): đếm paragraph, số lần khớp theo loại chỉ mục và số blip.
+    Trả về list dict: file_path, index, context, text, title (tiêu đề đang áp dụng),
+    paragraph (vị trí đoạn văn chứa ảnh).
+    """
+    state = state if state is not None else {}
+    verbose = verbose and log.isEnabledFor(logging.DEBUG)  # Không format log chi tiết khi không in ra
     images_to_save = []
-    current_index = None
-    current_title = None  # ✅ THÊM: Lưu tiêu đề hiện tại
-
-    def is_title_paragraph(para):
-        """Kiểm tra xem paragraph có phải là tiêu đề không"""
+    current_index = state.get('current_index')
+    current_title = state.get('current_title')  # ✅ THÊM: Lưu tiêu đề hiện tại
+    paragraph_count = 0
+    table_paragraph_count = 0
+    blip_count = 0
+    hits = {}  # loại chỉ mục -> số lần khớp
+
+    for para in paragraphs:
+        paragraph_count += 1
+        if para.context:
+            table_paragraph_count += 1
+        blip_count += len(para.embed_ids)
         text = para.text.strip()
-        
-        # ✅ PATTERN NHẬN DIỆN TIÊU đề
-        title_patterns = [
-            r'^[A-Z][^a-z]*$',  # Toàn chữ hoa: "PHÉP NHÂN VÀ PHÉP CHIA SỐ TỰ NHIÊN"
-            r'^[A-Z]\.\s*[A-Z]',  # "A. KIẾN THỨC CẦN NHỚ"
-            r'^[IVX]+\.\s*[A-Z]',  # "I. GIỚI THIỆU"
-            r'^\d+\.\s*[A-Z]',     # "1. CHƯƠNG ĐẦU"
-            r'^BÀI\s*$',           # Chỉ có chữ "BÀI"
-            r'^CHƯƠNG\s+[IVX\d]',  # "CHƯƠNG I", "CHƯƠNG 1"
-        ]
-        
-        # Kiểm tra độ dài (tiêu đề thường ngắn hơn 100 ký tự)
-        if len(text) > 100:
-            return False
-            
-        # Kiểm tra pattern
-        for pattern in title_patterns:
-            if re.match(pattern, text):
-                return True
-                
-        # Kiểm tra style của paragraph (nếu có)
-        if para.style and para.style.name:
-            style_name = para.style.name.lower()
-            if any(keyword in style_name for keyword in ['heading', 'title', 'header']):
-                return True
-                
-        return False
-
-    def clean_title(title):
-        """Làm sạch tiêu đề để dùng làm tên file"""
-        # Loại bỏ ký tự đặc biệt
-        cleaned = re.sub(r'[<>:"/\\|?*]', '', title)
-        # Thay thế khoảng trắng liền nhau bằng 1 khoảng trắng
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        # Giới hạn độ dài
-        if len(cleaned) > 50:
-            cleaned = cleaned[:47] + "..."
-        return cleaned
-
-    def process_paragraphs(paragraphs, context_text=""):
-        nonlocal current_index, current_title
-        paragraph_count = 0
-        last_index_paragraph = -1
-
-        for i, para in enumerate(paragraphs):
-            text = para.text.strip()
-            paragraph_count += 1
-            
-            # ✅ KIỂM TRA TIÊU ĐỀ - ĐỒNG BỘ VỚI PREVIEW
-            if is_title_paragraph(para):
-                current_title = clean_title(text)
-                current_index = None  # Reset như preview
-                print(f"📋 Tiêu đề mới: {text}")
-                print(f"    → Reset current_index, lưu title: '{current_title}'")
-                continue
-            
-            # ✅ SỬA: DÙNG LOGIC GIỐNG HỆT PREVIEW
-            found_index = None
-            
-            # 1. TÌM HÌNH TRƯỚC (giống preview)
-            hinh_matches = re.findall(r'Hình\s+(\d+\.\d+)', text, re.IGNORECASE)
-            if hinh_matches:
-                found_index = f"Hình {hinh_matches[-1]}"  # Lấy số cuối cùng
-                print(f"🖼️  Phát hiện hình: {found_index}")
-            
-            if not found_index:
-                cau_matches = re.findall(r'Câu\s+(\d+)',text) 
-                if cau_matches:
-                    found_index = f"Câu {cau_matches[-1]}"  # Lấy số cuối cùng
-                    print(f"📝 Phát hiện câu: {found_index}")
-            if not found_index:
-                h_matches = re.findall(r'H\.(\d+\.\d+)', text)
-                if h_matches:
-                    found_index = f"Hình {h_matches[-1]}"  # Chuyển H.4.22 → Hình 4.22
-                    print(f"🖼️  Phát hiện hình (rút gọn): H.{h_matches[-1]} → {found_index}")
-            # 2. NẾU KHÔNG CÓ HÌNH, TÌM SỐ BÀI (giống preview)
-            if not found_index:
-                bai_matches = re.findall(r'(\d+\.\d+)', text)
-                if bai_matches:
-                    found_index = f"Bài {bai_matches[-1]}"  # Lấy số cuối cùng
-                    print(f"📚 Phát hiện bài: {found_index}")
-        
-            if found_index:
-                current_index = found_index
-                last_index_paragraph = paragraph_count
+        result = classify_paragraph(text, para.style_name)
+        if result.kind is not None:
+            hits[result.kind] = hits.get(result.kind, 0) + 1
+
+        # ✅ KIỂM TRA TIÊU ĐỀ
+        if result.is_title:
+            current_title = result.title
+            current_index = None
+            if verbose:
+                log.debug(f"📋 Tiêu đề mới: {text}")
+                log.debug(f"    → Reset current_index, lưu title: '{current_title}'")
+            continue
+
+        # Chỉ mục theo thứ tự ưu tiên: Hình → Câu → H.x.y → Bài
+        if result.kind is not None:
+            current_index = result.label
+            if verbose:
+                if result.kind == KIND_HINH:
+                    log.debug(f"🖼️  Phát hiện hình: {current_index}")
+                elif result.kind == KIND_CAU:
+                    log.debug(f"📝 Phát hiện câu: {current_index}")
+                elif result.kind == KIND_H:
+                    log.debug(f"🖼️  Phát hiện hình (rút gọn): H.{result.number} → {current_index}")
+                else:
+                    log.debug(f"📚 Phát hiện bài: {current_index}")
+            continue
+
+        # ✅ XỬ LÝ ẢNH: current_index → current_title → "Không xác định"
+        for embed_id in para.embed_ids:
+            if embed_id not in image_files:
                 continue
 
-            # ✅ XỬ LÝ ẢNH - LOGIC GIỐNG PREVIEW
-            for run in para.runs:
-                blips = run._element.xpath('.//a:blip')
-                for blip in blips:
-                    embed_id = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                    if embed_id in image_files:
-                        
-                        # ✅ LOGIC GIỐNG HỆT PREVIEW: current_index → current_title → "Không xác định"
-                        final_index = current_index or current_title or "Không xác định"
-                        
-                        # Xác định lý do (cho debug)
-                        if current_index:
-                            reason = "current_index"
-                        elif current_title:
-                            reason = "current_title"
-                        else:
-                            reason = "không xác định"
-                        
-                        print(f"    🖼️  Ảnh → gắn với '{final_index}' (lý do: {reason})")
-                        
-                        images_to_save.append({
-                            'file_path': image_files[embed_id],
-                            'index': final_index,
-                            'context': (text or context_text)[:50] + "..."
-                        })
-
-    # Duyệt đoạn văn chính
-    print("\n🔍 Đang duyệt paragraphs...")
-    process_paragraphs(doc.paragraphs)
-
-    # Duyệt bảng
-    print("🔍 Đang duyệt tables...")
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                if cell.text.strip():
-                    process_paragraphs(cell.paragraphs, context_text=cell.text.strip())
+            final_index = current_index or current_title or "Không xác định"
+
+            if verbose:
+                # Xác định lý do (cho debug)
+                if current_index:
+                    reason = "current_index"
+                elif current_title:
+                    reason = "current_title"
+                else:
+                    reason = "không xác định"
+                log.debug(f"    🖼️  Ảnh → gắn với '{final_index}' (lý do: {reason})")
+
+            images_to_save.append({
+                'file_path': image_files[embed_id],
+                'index': final_index,
+                'context': (text or para.context)[:50] + "...",
+                'text': text,
+                'title': current_title,
+                'paragraph': paragraph_count - 1,
+            })
+
+    state['current_index'] = current_index
+    state['current_title'] = current_title
+    if stats:
+        stats.count('scan.paragraphs', paragraph_count)
+        stats.count('scan.table_paragraphs', table_paragraph_count)
+        stats.count('scan.blips', blip_count)
+        stats.count('scan.images', len(images_to_save))
+        for kind, n in hits.items():
+            stats.count(f'scan.hits.{kind}', n)
+    return images_to_save
+
+@contextlib.contextmanager
+def table_pool(workers):
+    """ProcessPoolExecutor cho iter_paragraphs đọc các bảng lớn; workers <= 0 thì trả về None"""
+    if not workers or workers <= 0:
+        yield None
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging) as executor:
+        yield executor
+
+def build_anchor_table(docx_path, state=None, stats=None, table_workers=0, verbose=True, package=None):
+    """Quét DOCX một lượt (relationships + paragraphs/bảng) thành AnchorTable; state được cập nhật như scan_images
+
+    package: DocxPackage đã mở của docx_path (không có thì tự mở rồi đóng).
+    """
+    stats = stats or RunStats('anchors')
+    state = state if state is not None else {}
+    state_in = dict(state)
+    with (contextlib.nullcontext(package) if package is not None else DocxPackage(docx_path)) as docx_zip:
+        with stats.timer('extract.rels'):
+            image_files = read_image_relationships(docx_zip)
+        log.debug(f"📋 Tìm thấy {len(image_files)} file ảnh trong document")
+
+        log.debug("🔍 Đang duyệt paragraphs + tables (streaming)...")
+        with table_pool(table_workers) as executor, stats.timer('extract.scan'):
+            images = scan_images(iter_paragraphs(docx_zip, executor), image_files, verbose=verbose,
+                                 state=state, stats=stats)
+        extensions = {}
+        for img in images:
+            if img['file_path'] not in extensions:
+                extensions[img['file_path']] = media_extension(docx_zip, img['file_path'])
+            img['ext'] = extensions[img['file_path']]
+    return AnchorTable.from_images(images, docx_path, get_rules_version(), state_in, state)
+
+def get_anchor_table(docx_path, anchors=None, state=None, stats=None, table_workers=0, verbose=True,
+                     package=None):
+    """Bảng neo ảnh của docx_path, chỉ parse DOCX khi không dùng lại được bảng có sẵn
+
+    anchors: AnchorTable (vd. từ lần preview trước) hoặc đường dẫn file bảng neo. Bảng được dùng
+    lại nếu còn khớp với DOCX (size + mtime), luật đặt tên và state đầu vào; nếu không thì quét lại,
+    và ghi bảng mới ra file khi anchors là đường dẫn.
+    """
+    stats = stats or RunStats('anchors')
+    state = state if state is not None else {}
+    anchors_path = None
+    if isinstance(anchors, str):
+        anchors_path = anchors
+        with stats.timer('extract.anchors_load'):
+            anchors = AnchorTable.load(anchors_path)
+
+    if anchors is not None and anchors.matches(docx_path, get_rules_version(), state):
+        stats.count('extract.anchors_reused')
+        state.update(anchors.state_out)
+        log.debug(f"♻️  Dùng lại bảng neo ảnh ({len(anchors)} ảnh), không parse lại DOCX")
+        return anchors
+
+    anchors = build_anchor_table(docx_path, state, stats, table_workers, verbose, package)
+    if anchors_path:
+        anchors.save(anchors_path)
+        log.debug(f"💾 Đã ghi bảng neo ảnh: {anchors_path}")
+    return anchors
+
+def extract_images(docx_path, output_folder="images", dedup=False, use_cache=False,
+                   manifest=None, base_filename=None, state=None, stats=None, table_workers=0,
+                   anchors=None):
+    """Trích xuất ảnh và gắn tên theo chỉ mục gần nhất như Bài 1.23, Hình 1.1 hoặc tiêu đề chương
+
+    Trả về dict kết quả: docx_path, output_folder, found, saved, skipped, cached, images
+    (filename, index, media, context), unmatched, errors. Log chi tiết từng ảnh ở mức DEBUG.
+
+    dedup=True: mỗi ảnh (theo SHA-256 nội dung) chỉ lưu một lần dưới tên lần xuất hiện đầu tiên,
+    các lần xuất hiện sau được ghi vào manifest (_manifest.json) trỏ tới file gốc đó.
+    use_cache=True: dùng cache SQLite cạnh thư mục output, bỏ qua DOCX không đổi và chỉ ghi lại
+    những ảnh đổi tên hoặc đổi nội dung.
+    manifest: file JSON/JSONL như code.json - tên cuối cùng được tính ngay khi trích xuất (giống
+    rename_with_json) nên mỗi ảnh chỉ ghi một lần; ảnh không khớp được liệt kê trong _rename_report.json.
+    base_filename, state: dùng khi một cuốn sách được tách thành nhiều DOCX (shard) - tên gốc chung,
+    và state (current_index, current_title, next_stt) nối tiếp giữa các shard để STT và chỉ mục liên tục.
+    stats (RunStats, tuỳ chọn): cộng dồn thời gian từng bước (extract.*) và bộ đếm của lần chạy.
+    table_workers: số process đọc song song các bảng lớn (0 = đọc tuần tự).
+    anchors: AnchorTable hoặc đường dẫn file bảng neo (xem get_anchor_table) - dùng lại kết quả
+    quét của preview thay vì parse lại DOCX.
+    """
+
+    stats = stats or RunStats('extract')
+    stats.count('extract.documents')
+    result = {
+        'docx_path': docx_path,
+        'output_folder': output_folder,
+        'found': 0,
+        'saved': 0,
+        'skipped': 0,
+        'cached': False,
+        'images': [],
+        'unmatched': [],
+        'errors': [],
+    }
+
+    # Tạo thư mục lưu ảnh
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    cache = None
+    previous = {}
+    if use_cache:
+        from extract_cache import ExtractCache, file_sha256
+        lookup_start = time.perf_counter()
+        cache = ExtractCache.for_output(output_folder)
+        docx_sha256 = file_sha256(docx_path)
+        rules_version = get_rules_version()
+        if manifest:
+            # Tên cuối cùng phụ thuộc cả manifest JSON; manifest không đọc được thì load_mapping báo lỗi
+            # bên dưới và kết quả không được ghi vào cache
+            try:
+                rules_version += "-" + file_sha256(manifest)[:16]
+            except OSError:
+                rules_version += "-manifest-unreadable"
+        cached_count = cache.lookup_document(output_folder, docx_sha256, rules_version, dedup)
+        stats.add_time('extract.cache_lookup', time.perf_counter() - lookup_start)
+        if cached_count is not None:
+            stats.count('extract.cached_documents')
+            cache.close()
+            log.info(f"⏭️  Không có thay đổi, bỏ qua: {docx_path} ({cached_count} ảnh)",
+                     extra=event('extract.cached', docx=docx_path, output=output_folder, saved=cached_count))
+            result.update(saved=cached_count, skipped=cached_count, cached=True)
+            return result
+        previous = cache.load_images(output_folder)
+
+    # ✅ SỬA: LẤY TÊN FILE GỐC VÀ CẮT TRƯỚC CHỮ "RUOT"
+    base_filename = base_filename or get_base_filename(docx_path)
+    log.debug(f"📁 Tên file gốc (đã cắt): {base_filename}")
+
+    state = state if state is not None else {}
+    stt_start = state.get('next_stt', 1)
+
+    # Bước 1 + 2: Mapping relationship ID -> file ảnh, duyệt đoạn văn + bảng theo thứ tự trong
+    # tài liệu (một lượt streaming), hoặc dùng lại bảng neo ảnh đã có.
+    # Gói DOCX chỉ mở (mmap) một lần, dùng cho cả lúc quét lẫn lúc ghi ảnh.
+    package = None
+    try:
+        package = DocxPackage(docx_path)
+        anchors = get_anchor_table(docx_path, anchors, state, stats, table_workers, package=package)
+    except Exception as e:
+        if package is not None:
+            package.close()
+        if cache:
+            cache.close()
+        log.error(f"❌ Không thể đọc tài liệu: {e}",
+                  extra=event('extract.error', docx=docx_path, error=str(e)))
+        result['errors'].append(f"document: {e}")
+        return result
+    images_to_save = anchors.images()
+    state['next_stt'] = stt_start + len(images_to_save)
+    result['found'] = len(images_to_save)
 
     # Bước 3: Lưu ảnh theo format mới
-    print(f"\n🖼️ Tìm thấy {len(images_to_save)} ảnh:")
+    log.debug(f"🖼️ Tìm thấy {len(images_to_save)} ảnh:")
 
     if len(images_to_save) == 0:
-        print("❌ Không tìm thấy ảnh nào để lưu.")
-        return
-
+        log.warning(f"❌ Không tìm thấy ảnh nào để lưu: {docx_path}",
+                    extra=event('extract.done', docx=docx_path, output=output_folder, found=0, saved=0))
+        package.close()
+        if cache:
+            # Ghi nhận kết quả 0 ảnh: lần sau bỏ qua file này, ảnh của lần chạy trước bị xoá
+            stale = cache.record_document(output_folder, docx_path, docx_sha256, rules_version, dedup, 0, [])
+            cache.close()
+            remove_stale_files(output_folder, stale)
+        return result
+
+    # ✅ TẠO TÊN FILE MỚI: STT + tên file gốc + bài/hình/title
+    filenames = [build_image_filename(i, base_filename, img)
+                 for i, img in enumerate(images_to_save, stt_start)]
+
+    # Chế độ manifest: đổi sang tên cuối cùng theo JSON ngay trong bộ nhớ
+    unmatched = []
+    if manifest:
+        with stats.timer('extract.manifest'):
+            loaded = load_mapping(manifest)
+        if loaded is None:
+            # Ảnh vẫn được ghi với tên tạm, nhưng lần chạy phải báo lỗi
+            result['errors'].append(f"manifest: không đọc được {manifest}")
+        else:
+            provisional = filenames
+            filenames, unmatched = resolve_final_names(provisional, loaded[0])
+            report = {
+                'manifest': os.path.abspath(manifest),
+                'matched': [{'provisional': old, 'filename': new}
+                            for old, new in zip(provisional, filenames) if old != new],
+                'unmatched': [{'filename': name, 'key': key} for name, key in unmatched],
+            }
+            with open(os.path.join(output_folder, RENAME_REPORT), 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    verbose = log.isEnabledFor(logging.DEBUG)  # Log từng ảnh chỉ khi thật sự được in ra
     saved_count = 0
+    skipped_count = 0
+    linked_count = 0
+    bytes_written = 0
+    cache_entries = []  # (filename, media, fingerprint, size) của các file thật sự nằm trên đĩa
+    written = {}  # media/... -> file đã giải nén đầu tiên trên đĩa
+    digests = {}  # media/... -> sha256 (chế độ dedup)
+    canonical = {}  # sha256 -> tên file được lưu thật
+    dedup_manifest = []
 
     # ✅ ĐẾM STT THEO THỨ TỰ XUẤT HIỆN
-    with zipfile.ZipFile(docx_path, 'r') as docx_zip:
+    with package as docx_zip, stats.timer('extract.write'):
         for i, img in enumerate(images_to_save, 1):
             try:
-                # Đọc dữ liệu ảnh
-                image_data = docx_zip.read(f"word/{img['file_path']}")
-                
-                # Xác định extension từ file gốc
-                _, ext = os.path.splitext(img['file_path'])
-                ext = ext.lower() or ".png"
-
-                # ✅ TẠO TÊN FILE MỚI: STT + tên file gốc + bài/hình/title
-                index = img['index'] or "Không xác định"
-                
-                filename = f"{i:02d} - {base_filename} - {index}{ext}"
-                
-                # Lưu file
+                filename = filenames[i - 1]
                 filepath = os.path.join(output_folder, filename)
-                with open(filepath, 'wb') as f:
-                    f.write(image_data)
-
-                print(f"✅ {filename}")
-                if img['context'].strip():
-                    print(f"    Context: {img['context']}")
+                member = f"word/{img['file_path']}"
+                fingerprint, size = media_fingerprint(docx_zip, member)
+
+                if dedup:
+                    # Băm mỗi media part một lần, ảnh trùng nội dung chỉ ghi vào manifest
+                    digest = digests.get(img['file_path'])
+                    if digest is None:
+                        tmp_path = filepath + ".part"
+                        try:
+                            digest = save_zip_member(docx_zip, member, tmp_path, "sha256")
+                            if digest in canonical:
+                                os.remove(tmp_path)
+                            else:
+                                os.replace(tmp_path, filepath)
+                        except BaseException:
+                            if os.path.exists(tmp_path):
+                                os.remove(tmp_path)
+                            raise
+                        bytes_written += size
+                        digests[img['file_path']] = digest
+                        if digest not in canonical:
+                            canonical[digest] = filename
+                            cache_entries.append((filename, img['file_path'], fingerprint, size))
+                    dedup_manifest.append({
+                        'filename': filename,
+                        'canonical': canonical[digest],
+                        'sha256': digest,
+                        'media': img['file_path'],
+                        'index': img['index'],
+                    })
+                    if canonical[digest] != filename:
+                        if verbose:
+                            log.debug(f"♻️  {filename}\n    = {canonical[digest]}")
+                        saved_count += 1
+                        continue
+                elif cache and cache.is_current(previous, filename, fingerprint, filepath, size):
+                    # Cache: file đã đúng tên và đúng nội dung, không ghi lại
+                    written.setdefault(img['file_path'], filepath)
+                    cache_entries.append((filename, img['file_path'], fingerprint, size))
+                    saved_count += 1
+                    skipped_count += 1
+                    continue
+                else:
+                    # Lưu file: giải nén mỗi media một lần, các lần tham chiếu sau thì link/copy trên đĩa
+                    first_path = written.get(img['file_path'])
+                    if first_path and os.path.exists(first_path):
+                        link_or_copy(first_path, filepath)
+                        linked_count += 1
+                    else:
+                        save_zip_member(docx_zip, member, filepath)
+                        bytes_written += size
+                        written[img['file_path']] = filepath
+                    cache_entries.append((filename, img['file_path'], fingerprint, size))
+
+                if verbose:
+                    log.debug(f"✅ {filename}")
+                    if img['context'].strip():
+                        log.debug(f"    Context: {img['context']}")
                 
                 saved_count += 1
 
             except Exception as e:
-                print(f"❌ Lỗi khi lưu ảnh {i}: {e}")
+                log.error(f"❌ Lỗi khi lưu ảnh {i}: {e}")
+                result['errors'].append(f"{filenames[i - 1]}: {e}")
+
+    stats.count('extract.images_saved', saved_count)
+    stats.count('extract.cache_skipped', skipped_count)
+    stats.count('extract.files_linked', linked_count)
+    stats.count('extract.bytes_written', bytes_written)
+    stats.count('extract.errors', len(result['errors']))
 
     # Báo cáo kết quả
-    print(f"\n🎉 Đã lưu {saved_count}/{len(images_to_save)} ảnh vào '{output_folder}'")
+    log.info(f"🎉 Đã lưu {saved_count}/{len(images_to_save)} ảnh vào '{output_folder}'",
+             extra=event('extract.done', docx=docx_path, output=output_folder, found=len(images_to_save),
+                         saved=saved_count, skipped=skipped_count, unmatched=len(unmatched),
+                         errors=len(result['errors'])))
+
+    if manifest and unmatched:
+        log.warning(f"❓ {len(unmatched)} ảnh không khớp manifest (giữ tên tạm), xem {RENAME_REPORT}")
+        for name, key in unmatched:
+            log.debug(f"   - {name}" + (f" (key: '{key}')" if key else ""))
+
+    if dedup:
+        manifest_path = os.path.join(output_folder, DEDUP_MANIFEST)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(dedup_manifest, f, ensure_ascii=False, indent=2)
+        log.info(f"♻️  Dedup: {len(canonical)} ảnh duy nhất, manifest: {manifest_path}")
+
+    if cache and result['errors']:
+        # Kết quả chưa đầy đủ: không ghi vào cache để lần sau trích xuất lại (và thử lại ảnh lỗi)
+        cache.close()
+        log.info(f"💾 Cache: không ghi nhận vì có {len(result['errors'])} lỗi")
+    elif cache:
+        record_start = time.perf_counter()
+        stale = cache.record_document(output_folder, docx_path, docx_sha256, rules_version, dedup,
+                                      saved_count, cache_entries)
+        cache.close()
+        stats.add_time('extract.cache_record', time.perf_counter() - record_start)
+        # Xoá các file của lần chạy trước không còn trong kết quả mới (vd. do đổi luật đặt tên)
+        remove_stale_files(output_folder, stale)
+        log.info(f"💾 Cache: giữ nguyên {skipped_count} ảnh, ghi {saved_count - skipped_count} ảnh, "
+                 f"xoá {len(stale)} file cũ")
     
     if saved_count > 0:
         indices = [img['index'] for img in images_to_save if img['index']]
         unique_indices = sorted(set(indices), key=lambda x: (x.startswith('Bài'), x.startswith('Hình'), x))
-        print(f"📊 Các chỉ mục được sử dụng: {unique_indices}")
-
-def preview_images_and_indices(docx_path):
-    """Xem trước danh sách ảnh và chỉ mục mà không lưu ảnh"""
+        log.debug(f"📊 Các chỉ mục được sử dụng: {unique_indices}")
+
+    result.update(saved=saved_count, skipped=skipped_count)
+    result['images'] = [{'filename': filename, 'index': img['index'], 'media': img['file_path'],
+                         'context': img['text']}
+                        for filename, img in zip(filenames, images_to_save)]
+    result['unmatched'] = [{'filename': name, 'key': key} for name, key in unmatched]
+    return result
+
+def extract_images_with_precise_index(docx_path, output_folder="images", **options):
+    """Trích xuất ảnh (xem extract_images), trả về số ảnh đã lưu"""
+    return extract_images(docx_path, output_folder, **options)['saved']
+
+def plan_images(docx_path, base_filename=None, stats=None, table_workers=0, anchors=None):
+    """Danh sách ảnh sẽ được trích xuất (không ghi file): list dict stt, filename, index, media, context,
+    title, paragraph. anchors: như extract_images."""
+    stats = stats or RunStats('preview')
+    base_filename = base_filename or get_base_filename(docx_path)
+    anchors = get_anchor_table(docx_path, anchors, stats=stats, table_workers=table_workers, verbose=False)
+
+    return [{
+        'stt': stt,
+        'filename': build_image_filename(stt, base_filename, img),
+        'index': img['index'],
+        'media': img['file_path'],
+        'context': img['text'],
+        'title': img['title'],
+        'paragraph': img['paragraph'],
+    } for stt, img in enumerate(anchors.images(), 1)]
+
+def preview_images_and_indices(docx_path, stats=None, table_workers=0, anchors=None):
+    """Xem trước danh sách ảnh và chỉ mục mà không lưu ảnh (cùng logic với extract)"""
     
-    doc = Document(docx_path)
-    base_filename = os.path.splitext(os.path.basename(docx_path))[0]
-    current_index = None
-    current_title = None
-    image_count = 0
+    base_filename = get_base_filename(docx_path)
     
     print("=" * 70)
     print("🔍 XEM TRƯỚC ẢNH VÀ CHỈ MỤC")
@@ -236,101 +564,216 @@ def preview_images_and_indices(docx_path):
     print(f"📁 Tên file gốc: {base_filename}")
     print()
 
-    def is_title_paragraph(para):
-        """Hàm kiểm tra tiêu đề tương tự như trên"""
-        text = para.text.strip()
-        title_patterns = [
-            r'^[A-Z][^a-z]*$',
-            r'^[A-Z]\.\s*[A-Z]',
-            r'^[IVX]+\.\s*[A-Z]',
-            r'^\d+\.\s*[A-Z]',
-            r'^BÀI\s*$',
-            r'^CHƯƠNG\s+[IVX\d]',
-        ]
+    images = plan_images(docx_path, base_filename, stats, table_workers, anchors)
+    for img in images:
+        text = img['context']
+        display_text = text[:50] + "..." if len(text) > 50 else text
+        if not display_text.strip():
+            display_text = "[Paragraph chỉ có ảnh]"
         
-        if len(text) > 100:
-            return False
-            
-        for pattern in title_patterns:
-            if re.match(pattern, text):
-                return True
-                
-        if para.style and para.style.name:
-            style_name = para.style.name.lower()
-            if any(keyword in style_name for keyword in ['heading', 'title', 'header']):
-                return True
-                
-        return False
-
-    def clean_title(title):
-        """Hàm làm sạch tiêu đề tương tự như trên"""
-        cleaned = re.sub(r'[<>:"/\\|?*]', '', title)
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        if len(cleaned) > 50:
-            cleaned = cleaned[:47] + "..."
-        return cleaned
-
-    def process(paragraphs):
-        nonlocal current_index, current_title, image_count
-
-        for para in paragraphs:
-            text = para.text.strip()
-            
-            # Kiểm tra tiêu đề
-            if is_title_paragraph(para):
-                current_title = clean_title(text)
-                print(f"📋 Title: {current_title}")
-                continue
-            
-            # Tìm chỉ mục theo thứ tự ưu tiên
-            found_index = None
-            
-            hinh_matches = re.findall(r'Hình\s+(\d+\.\d+)', text, re.IGNORECASE)
-            if hinh_matches:
-                found_index = f"Hình {hinh_matches[-1]}"
-            
-            if not found_index:
-                bai_matches = re.findall(r'(\d+\.\d+)', text)
-                if bai_matches:
-                    found_index = f"Bài {bai_matches[-1]}"
-            
-            if found_index:
-                current_index = found_index
-
-            # Kiểm tra ảnh
-            for run in para.runs:
-                if run._element.xpath('.//a:blip'):
-                    image_count += 1
-                    
-                    # ✅ LOGIC MỚI: Ưu tiên current_index → current_title → "Không xác định"
-                    index_display = current_index or current_title or "Không xác định"
-                    filename_preview = f"{image_count:02d} - {base_filename} - {index_display}.png"
-                    
-                    display_text = text[:50] + "..." if len(text) > 50 else text
-                    if not display_text.strip():
-                        display_text = "[Paragraph chỉ có ảnh]"
-                    
-                    print(f"🖼️  Ảnh {image_count:2d}: {filename_preview}")
-                    print(f"    📝 Context: {display_text}")
-                    print()
-
-    # Xử lý document
-    process(doc.paragraphs)
-
-    # Xử lý tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                if cell.text.strip():
-                    process(cell.paragraphs)
+        print(f"🖼️  Ảnh {img['stt']:2d}: {img['filename']}")
+        print(f"    📝 Context: {display_text}")
+        print()
 
     print("=" * 70)
-    print(f"📊 Tổng cộng: {image_count} ảnh sẽ được trích xuất")
+    print(f"📊 Tổng cộng: {len(images)} ảnh sẽ được trích xuất")
     print("=" * 70)
+    return images
 
-def main():
-    """Hàm main với menu"""
-    
+def find_docx_files(source):
+    """Danh sách file DOCX từ một thư mục (đệ quy) hoặc một glob pattern"""
+    if os.path.isdir(source):
+        pattern = os.path.join(source, '**', '*.docx')
+    else:
+        pattern = source
+    files = [path for path in glob.glob(pattern, recursive=True)
+             if path.lower().endswith('.docx') and not os.path.basename(path).startswith('~$')]
+    return sorted(files)
+
+def batch_output_folders(docx_files, source, output_root):
+    """Thư mục output của từng file trong batch, theo đường dẫn tương đối so với source
+
+    source là thư mục thì tính từ thư mục đó, là glob thì từ thư mục chung của các file tìm được, nên
+    hai file cùng tên ở hai thư mục con không ghi đè lên nhau. Vẫn trùng (vd. khác hoa/thường) thì ValueError.
+    """
+    root = source if os.path.isdir(source) else os.path.commonpath([os.path.dirname(os.path.abspath(path))
+                                                                     for path in docx_files])
+    folders = {}
+    seen = {}
+    for docx_path in docx_files:
+        relative = os.path.relpath(os.path.abspath(docx_path), os.path.abspath(root))
+        folder = os.path.join(output_root, os.path.splitext(relative)[0])
+        key = os.path.normcase(folder).lower()
+        if key in seen:
+            raise ValueError(f"Hai file DOCX trùng thư mục output '{folder}': {seen[key]}, {docx_path}")
+        seen[key] = docx_path
+        folders[docx_path] = folder
+    return folders
+
+def extract_one(docx_path, output_folder, dedup=False, use_cache=False):
+    """Chạy trong process con: trích xuất một file, trả về (số ảnh, thời gian, lỗi, stats.to_dict())"""
+    start = time.perf_counter()
+    stats = RunStats('extract')
+    try:
+        result = extract_images(docx_path, output_folder, dedup=dedup, use_cache=use_cache, stats=stats)
+        errors = result['errors']
+        error = f"{len(errors)} lỗi: {errors[0]}" if errors else None
+        return result['saved'], time.perf_counter() - start, error, stats.to_dict()
+    except Exception as e:
+        return 0, time.perf_counter() - start, f"{type(e).__name__}: {e}", stats.to_dict()
+
+def extract_batch(source, output_root="images", workers=None, dedup=False, use_cache=False, stats=None):
+    """Trích xuất song song mọi file DOCX trong thư mục/glob, mỗi file một thư mục output riêng
+
+    Thư mục output giữ đường dẫn tương đối của file so với source (xem batch_output_folders).
+    Một file lỗi không làm dừng cả batch. Trả về list dict kết quả theo từng file.
+    stats (RunStats, tuỳ chọn): gộp thời gian/bộ đếm của mọi process con.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    docx_files = find_docx_files(source)
+    if not docx_files:
+        log.error(f"❌ Không tìm thấy file DOCX nào trong: {source}")
+        return []
+
+    try:
+        output_folders = batch_output_folders(docx_files, source, output_root)
+    except ValueError as e:
+        log.error(f"❌ {e}")
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(docx_files))
+    log.info(f"📚 Batch: {len(docx_files)} file DOCX, {workers} worker")
+
+    results = []
+    batch_start = time.perf_counter()
+    # Process con chỉ in cảnh báo/lỗi, không in log từng ảnh ra cùng một console
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging) as executor:
+        futures = {}
+        for docx_path in docx_files:
+            output_folder = output_folders[docx_path]
+            future = executor.submit(extract_one, docx_path, output_folder, dedup, use_cache)
+            futures[future] = (docx_path, output_folder)
+
+        for future in as_completed(futures):
+            docx_path, output_folder = futures[future]
+            try:
+                saved_count, seconds, error, worker_stats = future.result()
+            except Exception as e:
+                # Process con bị chết (BrokenProcessPool, ...)
+                saved_count, seconds, error, worker_stats = 0, 0.0, f"{type(e).__name__}: {e}", {}
+            if stats:
+                stats.merge(worker_stats)
+
+            results.append({
+                'docx_path': docx_path,
+                'output_folder': output_folder,
+                'saved': saved_count,
+                'seconds': seconds,
+                'error': error,
+            })
+            fields = event('extract.file', docx=docx_path, output=output_folder, saved=saved_count,
+                           seconds=round(seconds, 3), error=error)
+            if error:
+                log.error(f"❌ {os.path.basename(docx_path)} ({seconds:.1f}s): {error}", extra=fields)
+            else:
+                log.debug(f"✅ {os.path.basename(docx_path)}: {saved_count} ảnh ({seconds:.1f}s)", extra=fields)
+
+    # Báo cáo tổng kết
+    failed = [r for r in results if r['error']]
+    total_saved = sum(r['saved'] for r in results)
+    batch_seconds = time.perf_counter() - batch_start
+    log.info(f"🎉 KẾT QUẢ BATCH: ✅ {len(results) - len(failed)}/{len(results)} file, "
+             f"🖼️  {total_saved} ảnh, ⏱️  {batch_seconds:.1f}s",
+             extra=event('batch.done', files=len(results), failed=len(failed), saved=total_saved,
+                         seconds=round(batch_seconds, 3)))
+    for r in failed:
+        log.warning(f"   ❌ {r['docx_path']}: {r['error']}")
+
+    results.sort(key=lambda r: r['docx_path'])
+    return results
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Trích xuất ảnh từ DOCX (không có lệnh → menu tương tác)")
+    commands = parser.add_subparsers(dest='command')
+    common = argparse.ArgumentParser(add_help=False)
+    add_logging_arguments(common)
+    add_stats_arguments(common)
+
+    preview = commands.add_parser('preview', parents=[common], help="Xem trước ảnh và tên file, không ghi gì")
+    preview.add_argument('docx', help="File DOCX")
+    preview.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+
+    extract = commands.add_parser('extract', parents=[common], help="Trích xuất ảnh của một file DOCX")
+    extract.add_argument('docx', help="File DOCX")
+    extract.add_argument('-o', '--output', default="images", help="Thư mục lưu ảnh")
+    extract.add_argument('--manifest', default=None,
+                         help="Manifest JSON/JSONL: đặt tên cuối cùng ngay khi ghi ảnh")
+    extract.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+
+    batch = commands.add_parser('batch', parents=[common], help="Trích xuất song song mọi DOCX trong thư mục hoặc glob")
+    batch.add_argument('source', metavar='DIR_OR_GLOB', help="Thư mục hoặc glob pattern")
+    batch.add_argument('-o', '--output', default="images",
+                       help="Thư mục gốc chứa output, mỗi file một thư mục con")
+    batch.add_argument('-j', '--workers', type=int, default=None,
+                       help="Số process song song (mặc định: số core)")
+    batch.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+
+    for command in (preview, extract):
+        command.add_argument('--table-workers', type=int, default=0,
+                             help="Số process đọc song song các bảng lớn (mặc định: 0 = tuần tự)")
+        command.add_argument('--anchors', metavar='PATH', default=None,
+                             help="File bảng neo ảnh: dùng lại nếu còn khớp với DOCX, không thì quét và ghi ra")
+    for command in (extract, batch):
+        command.add_argument('--dedup', action='store_true',
+                             help="Chỉ lưu mỗi ảnh trùng nội dung một lần, kèm manifest JSON")
+        command.add_argument('--cache', action='store_true',
+                             help="Dùng cache SQLite: bỏ qua DOCX không đổi, chỉ ghi lại ảnh thay đổi")
+    return parser
+
+def print_json(data):
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+def run_command(args, stats):
+    """Chạy một lệnh CLI không tương tác, trả về exit code"""
+    if args.command == 'preview':
+        if args.json:
+            print_json(plan_images(args.docx, stats=stats, table_workers=args.table_workers,
+                                   anchors=args.anchors))
+        else:
+            preview_images_and_indices(args.docx, stats, args.table_workers, args.anchors)
+        return 0
+
+    if args.command == 'extract':
+        result = extract_images(args.docx, args.output, dedup=args.dedup, use_cache=args.cache,
+                                manifest=args.manifest, stats=stats, table_workers=args.table_workers,
+                                anchors=args.anchors)
+        if args.json:
+            print_json(result)
+        return 1 if result['errors'] else 0
+
+    if args.command == 'batch':
+        results = extract_batch(args.source, args.output, args.workers, args.dedup, args.cache, stats)
+        if args.json:
+            print_json(results)
+        return 1 if not results or any(r['error'] for r in results) else 0
+
+def main(argv=None):
+    """CLI với các lệnh preview/extract/batch; không có lệnh thì hiện menu tương tác"""
+    args = build_parser().parse_args(argv)
+    if args.command:
+        # Log ra stderr; --json thì mặc định chỉ in cảnh báo để stdout chỉ có JSON
+        setup_logging_from_args(args, logging.WARNING if args.json else logging.INFO)
+        stats = RunStats(args.command)
+        with profile_to(args.profile):
+            exit_code = run_command(args, stats)
+        if args.stats:
+            stats.write_report(args.stats)
+            log.info(f"⏱️  Báo cáo thời gian: {args.stats}")
+        return exit_code
+
+    setup_logging(logging.DEBUG)  # Menu tương tác: in chi tiết từng ảnh như trước
     print("🎯 CHƯƠNG TRÌNH TRÍCH XUẤT ẢNH TỪ DOCX")
     print("🏷️  Format: STT - Tên_file - Bài/Hình/Tiêu_đề")
     print("🧠 Ưu tiên: Số bài → Hình → Tiêu đề chương")
@@ -363,14 +806,16 @@ def main():
         extract_images_with_precise_index(docx_path)
         
     elif choice == "3":
-        preview_images_and_indices(docx_path)
+        # Quét một lần, preview và extract dùng chung bảng neo ảnh
+        anchors = build_anchor_table(docx_path, verbose=False)
+        preview_images_and_indices(docx_path, anchors=anchors)
         confirm = input("\n❓ Tiếp tục trích xuất? (y/n): ").strip().lower()
         if confirm == 'y':
-            extract_images_with_precise_index(docx_path)
+            extract_images_with_precise_index(docx_path, anchors=anchors)
         else:
             print("✋ Hủy trích xuất.")
     else:
         print("❌ Lựa chọn không hợp lệ!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
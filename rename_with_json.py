@@ -1,192 +1,459 @@
+import argparse
+import logging
 import os
 import json
 import re
 import shutil
+import uuid
 
-def rename_images_with_json(images_folder, json_file):
-    """Đổi tên file ảnh dựa trên dữ liệu JSON"""
-    
-    # Đọc dữ liệu JSON
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        print(f"📋 Đã đọc {len(json_data)} entries từ JSON")
-    except Exception as e:
-        print(f"❌ Lỗi đọc file JSON: {e}")
-        return
-    
-    # Tạo mapping từ JSON
+from event_log import add_logging_arguments, event, get_logger, setup_logging, setup_logging_from_args
+
+# ✅ Các pattern được compile một lần, dùng chung cho JSON và tên file ảnh (theo thứ tự ưu tiên)
+BAI_RE = re.compile(r'Bài (\d+\.\d+)')
+HINH_RE = re.compile(r'Hình (\d+\.\d+)')
+SPECIAL_PATTERNS = [
+    re.compile(r'KIẾN THỨC CẦN NHỚ'),
+    re.compile(r'A\. KIẾN THỨC CẦN NHỚ'),
+    re.compile(r'SƠ ĐỒ TỔNG KẾT CHƯƠNG [IVX]+'),
+    re.compile(r'Lời giải Bài \d+\.\d+'),
+    re.compile(r'Bìa sách'),
+]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+STT_RE = re.compile(r'^(\d+)')
+
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,[]'
+RENAME_JOURNAL = ".rename_journal.jsonl"
+RENAME_TMP_SUFFIX = ".renaming"
+_MAPPING_CACHE = {}  # (đường dẫn, mtime, size) -> (mapping, số entry)
+
+log = get_logger('rename')
+
+def extract_key(filename):
+    """Lấy key (Bài X.Y, Hình X.Y, KIẾN THỨC CẦN NHỚ, ...) từ tên file JSON hoặc tên file ảnh"""
+    bai_match = BAI_RE.search(filename)
+    if bai_match:
+        return f"Bài {bai_match.group(1)}"
+
+    hinh_match = HINH_RE.search(filename)
+    if hinh_match:
+        return f"Hình {hinh_match.group(1)}"
+
+    for pattern in SPECIAL_PATTERNS:
+        match = pattern.search(filename)
+        if match:
+            key = match.group(0)
+            # Normalize key
+            if key == "A. KIẾN THỨC CẦN NHỚ":
+                key = "KIẾN THỨC CẦN NHỚ"
+            return key
+    return None
+
+def build_mapping(json_data):
+    """Index key -> list tên file đích theo thứ tự trong JSON (key lặp lại được giữ đủ)
+
+    json_data có thể là list hoặc generator (vd. iter_json_entries), chỉ duyệt một lần.
+    """
     mapping = {}
     for item in json_data:
         filename = item['filename']
-        
-        # Extract key từ filename JSON (Bài X.Y, Hình X.Y, etc.)
-        bai_match = re.search(r'Bài (\d+\.\d+)', filename)
-        hinh_match = re.search(r'Hình (\d+\.\d+)', filename)
-        
-        if bai_match:
-            key = f"Bài {bai_match.group(1)}"
-            mapping[key] = filename + ".jpg"  # Thêm extension
-        elif hinh_match:
-            key = f"Hình {hinh_match.group(1)}"
-            mapping[key] = filename + ".jpg"  # Thêm extension
-        else:
-            # Các trường hợp khác như "KIẾN THỨC CẦN NHỚ", "SƠ ĐỒ TỔNG KẾT"
-            special_patterns = [
-                r'KIẾN THỨC CẦN NHỚ',
-                r'SƠ ĐỒ TỔNG KẾT CHƯƠNG [IVX]+',
-                r'Lời giải Bài \d+\.\d+',
-                r'Bìa sách'
-            ]
-            
-            for pattern in special_patterns:
-                if re.search(pattern, filename):
-                    # Lấy phần pattern làm key
-                    match = re.search(pattern, filename)
-                    if match:
-                        key = match.group(0)
-                        if key not in mapping:  # Chỉ lấy cái đầu tiên
-                            mapping[key] = filename + ".jpg"
-                        break
-    
-    print(f"🗂️  Tạo được {len(mapping)} mapping keys")
+        key = extract_key(filename)
+        if key:
+            mapping.setdefault(key, []).append(filename + ".jpg")  # Thêm extension
+    return mapping
+
+def iter_json_entries(json_file, chunk_size=JSON_CHUNK_SIZE):
+    """Đọc từng entry của file JSON (mảng object) hoặc JSON Lines mà không load cả file
+
+    Đọc file theo chunk, decode từng object bằng raw_decode, bỏ qua '[', ']', ',' và khoảng trắng
+    giữa các object - nên cùng một hàm đọc được cả hai định dạng.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r', encoding='utf-8-sig') as f:
+        buffer = ''
+        position = 0  # Vị trí đọc trong buffer; phần đã decode chỉ bị cắt bỏ khi đọc thêm chunk
+        eof = False
+        while True:
+            # Bỏ các ký tự phân cách giữa các entry
+            while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+                position += 1
+
+            if position == len(buffer):
+                if eof:
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, position = chunk, 0
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                # Số/true/false/null bị cắt ngang vẫn decode được ("12" của "123") → chỉ nhận khi
+                # đã thấy ký tự phân cách phía sau hoặc đã hết file
+                complete = eof or isinstance(item, (dict, list, str)) or \
+                    (end < len(buffer) and buffer[end] in JSON_SEPARATORS)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                # Entry bị cắt ngang giữa hai chunk → đọc thêm
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+
+            yield item
+            position = end
+
+def load_mapping(json_file):
+    """Đọc JSON/JSONL một lượt và trả về (mapping, số entry); kết quả được cache trong bộ nhớ
+
+    Cache theo (đường dẫn, mtime, size) nên preview → xác nhận → đổi tên chỉ parse file một lần.
+    Trả về None nếu lỗi.
+    """
+    try:
+        stat = os.stat(json_file)
+        cache_key = (os.path.abspath(json_file), stat.st_mtime_ns, stat.st_size)
+        if cache_key in _MAPPING_CACHE:
+            mapping, entry_count = _MAPPING_CACHE[cache_key]
+            log.debug(f"📋 Dùng lại {entry_count} entries đã đọc từ JSON")
+            return mapping, entry_count
+
+        counter = {'entries': 0}
+
+        def counted(entries):
+            for item in entries:
+                counter['entries'] += 1
+                yield item
+
+        mapping = build_mapping(counted(iter_json_entries(json_file)))
+        entry_count = counter['entries']
+        _MAPPING_CACHE.clear()
+        _MAPPING_CACHE[cache_key] = (mapping, entry_count)
+        log.info(f"📋 Đã đọc {entry_count} entries từ JSON")
+        return mapping, entry_count
+    except Exception as e:
+        log.error(f"❌ Lỗi đọc file JSON: {e}")
+        return None
+
+def scan_folder(images_folder):
+    """Một lượt os.scandir: (danh sách ảnh sắp theo STT, tập tên mọi file trong thư mục)"""
+    with os.scandir(images_folder) as entries:
+        all_names = {entry.name for entry in entries}
+    image_files = [filename for filename in all_names if filename.endswith(IMAGE_EXTENSIONS)]
+
+    def sort_key(filename):
+        stt = STT_RE.match(filename)
+        return (int(stt.group(1)) if stt else float('inf'), filename)
+
+    return sorted(image_files, key=sort_key), all_names
+
+def list_image_files(images_folder):
+    """Danh sách file ảnh trong thư mục, sắp theo STT ở đầu tên file"""
+    return scan_folder(images_folder)[0]
+
+def match_images(image_files, mapping):
+    """Ghép từng ảnh với tên đích; ảnh cùng key lấy lần lượt các entry JSON theo thứ tự
+
+    Trả về list (old_filename, new_filename hoặc None, key hoặc None).
+    """
+    cursors = {}
+    matches = []
+    for old_filename in image_files:
+        key = extract_key(old_filename)
+        targets = mapping.get(key) if key else None
+        position = cursors.get(key, 0)
+
+        if not targets or position >= len(targets):
+            matches.append((old_filename, None, key))
+            continue
+
+        cursors[key] = position + 1
+        # Đảm bảo extension đúng
+        old_ext = os.path.splitext(old_filename)[1]
+        new_filename = os.path.splitext(targets[position])[0] + old_ext
+        matches.append((old_filename, new_filename, key))
+    return matches
+
+def resolve_final_names(image_files, mapping):
+    """Tính tên cuối cùng cho danh sách tên ảnh (chưa có trên đĩa) theo mapping JSON
+
+    Dùng khi trích xuất ghi thẳng ra tên cuối cùng. Giống đổi tên hai bước (scan_folder), chỉ ảnh
+    .jpg/.jpeg/.png được ghép với JSON; các file khác, ảnh không khớp hoặc bị trùng tên đích giữ
+    nguyên tên cũ. Trả về (list tên cuối cùng theo đúng thứ tự, list (tên, key) không khớp).
+    """
+    final_names = list(image_files)
+    positions = [i for i, filename in enumerate(image_files) if filename.endswith(IMAGE_EXTENSIONS)]
+    unmatched = []
+    used = set()
+    matches = match_images([image_files[i] for i in positions], mapping)
+    for i, (old_filename, new_filename, found_key) in zip(positions, matches):
+        if not new_filename or new_filename in used:
+            new_filename = old_filename
+            unmatched.append((old_filename, found_key))
+        used.add(new_filename)
+        final_names[i] = new_filename
+    return final_names, unmatched
+
+def plan_renames(images_folder, mapping):
+    """Tính toàn bộ tập đổi tên trước khi làm, phát hiện trùng đích và chu trình
+
+    Trả về dict:
+      ops: list (old, new) sẽ thực hiện
+      matches: kết quả match_images (để in báo cáo)
+      collisions: list (old, new, lý do) bị bỏ qua vì trùng đích
+      cycles: số chu trình (a → b → a) - được xử lý nhờ đổi tên qua tên tạm
+      image_count: số file ảnh
+    """
+    image_files, all_names = scan_folder(images_folder)
+    matches = match_images(image_files, mapping)
+    ops = [(old, new) for old, new, _ in matches if new and old != new]
+
+    # Nhiều ảnh cùng đổi về một tên → bỏ tất cả các ảnh đó
+    sources_by_target = {}
+    for old, new in ops:
+        sources_by_target.setdefault(new, []).append(old)
+    collisions = [(old, new, f"{len(sources_by_target[new])} ảnh cùng đổi thành một tên")
+                  for old, new in ops if len(sources_by_target[new]) > 1]
+    ops = [(old, new) for old, new in ops if len(sources_by_target[new]) == 1]
+
+    # Tên đích đang bị một file khác chiếm (file đó không được đổi tên đi) → bỏ, lặp tới khi ổn định
+    while True:
+        moving = {old for old, _ in ops}
+        blocked = [(old, new) for old, new in ops if new in all_names and new not in moving]
+        if not blocked:
+            break
+        collisions.extend((old, new, "tên đích đã tồn tại") for old, new in blocked)
+        blocked = set(blocked)
+        ops = [op for op in ops if op not in blocked]
+
+    # Đếm chu trình trong đồ thị old → new
+    next_name = dict(ops)
+    cycles = 0
+    visited = set()
+    for start in next_name:
+        path = set()
+        name = start
+        while name in next_name and name not in visited:
+            visited.add(name)
+            path.add(name)
+            name = next_name[name]
+        if name in path:
+            cycles += 1
+
+    return {
+        'ops': ops,
+        'matches': matches,
+        'collisions': collisions,
+        'cycles': cycles,
+        'image_count': len(image_files),
+    }
+
+def _write_journal_line(journal, record):
+    journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+    journal.flush()
+    os.fsync(journal.fileno())
+
+def _read_journal(images_folder):
+    """Đọc journal → (list [old, tmp, new], đã sang pha 2 chưa); None nếu không có journal"""
+    journal_path = os.path.join(images_folder, RENAME_JOURNAL)
+    if not os.path.exists(journal_path):
+        return None
+    ops = []
+    phase2 = False
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Dòng cuối bị ghi dở khi crash
+            if record['type'] == 'plan':
+                ops = record['ops']
+            elif record['type'] == 'phase2':
+                phase2 = True
+    return ops, phase2
+
+def execute_renames(images_folder, ops, completed=None):
+    """Đổi tên theo 2 pha qua tên tạm, có journal để hoàn tác/tiếp tục nếu bị gián đoạn
+
+    Pha 1: old → tên tạm cho mọi file; pha 2: tên tạm → new. Nhờ vậy chuỗi và chu trình
+    (a → b, b → a) không ghi đè lên nhau. Journal bị xoá khi hoàn tất.
+    completed (list, tuỳ chọn): nhận từng (old, new) ngay khi file đã mang tên mới, nên vẫn đúng
+    khi bị lỗi giữa chừng. Trả về số file đã đổi tên.
+    """
+    if not ops:
+        return 0
+
+    journal_path = os.path.join(images_folder, RENAME_JOURNAL)
+    if os.path.exists(journal_path):
+        raise RuntimeError(f"Còn journal của lần đổi tên trước: {journal_path} - hãy tiếp tục hoặc hoàn tác trước")
+
+    token = uuid.uuid4().hex[:8]
+    journal_ops = [[old, f".{token}-{i}{RENAME_TMP_SUFFIX}", new] for i, (old, new) in enumerate(ops)]
+
+    with open(journal_path, 'w', encoding='utf-8') as journal:
+        _write_journal_line(journal, {'type': 'plan', 'ops': journal_ops})
+        for old, tmp, _ in journal_ops:
+            os.rename(os.path.join(images_folder, old), os.path.join(images_folder, tmp))
+        _write_journal_line(journal, {'type': 'phase2'})
+        for old, tmp, new in journal_ops:
+            os.rename(os.path.join(images_folder, tmp), os.path.join(images_folder, new))
+            if completed is not None:
+                completed.append((old, new))
+
+    os.remove(journal_path)
+    return len(journal_ops)
+
+def recover_renames(images_folder, rollback=False):
+    """Xử lý lần đổi tên bị gián đoạn: tiếp tục (mặc định) hoặc hoàn tác (rollback=True)
+
+    Vị trí hiện tại của mỗi file: còn tên tạm → ở tên tạm; nếu không thì ở tên cũ (pha 1)
+    hoặc tên mới (pha 2). Trả về số file được xử lý, None nếu không có journal.
+    """
+    journal = _read_journal(images_folder)
+    if journal is None:
+        return None
+    journal_ops, phase2 = journal
+
+    def path(name):
+        return os.path.join(images_folder, name)
+
+    # Đưa mọi file về tên tạm trước (tránh ghi đè khi có chuỗi/chu trình)
+    for old, tmp, new in journal_ops:
+        if os.path.exists(path(tmp)):
+            continue
+        current = new if phase2 else old
+        if os.path.exists(path(current)):
+            os.rename(path(current), path(tmp))
+
+    count = 0
+    for old, tmp, new in journal_ops:
+        target = old if rollback else new
+        if os.path.exists(path(tmp)):
+            os.rename(path(tmp), path(target))
+            count += 1
+
+    os.remove(path(RENAME_JOURNAL))
+    return count
+
+def rename_folder(images_folder, json_file, dry_run=False):
+    """Đổi tên ảnh theo JSON không in gì, trả về dict kết quả (dry_run=True: chỉ lập kế hoạch)
+
+    Các khoá: images_folder, json_file, dry_run, entries, image_count, renamed (old, new, key),
+    already_named, collisions (old, new, reason), unmatched (filename, key), cycles, error.
+    """
+    result = {
+        'images_folder': images_folder,
+        'json_file': json_file,
+        'dry_run': dry_run,
+        'entries': 0,
+        'image_count': 0,
+        'renamed': [],
+        'already_named': [],
+        'collisions': [],
+        'unmatched': [],
+        'cycles': 0,
+        'error': None,
+    }
+
+    loaded = load_mapping(json_file)
+    if loaded is None:
+        result['error'] = f"Không đọc được file JSON: {json_file}"
+        return result
+    mapping, result['entries'] = loaded
+
+    plan = plan_renames(images_folder, mapping)
+    keys = {old: key for old, _, key in plan['matches']}
+    result['image_count'] = plan['image_count']
+    result['cycles'] = plan['cycles']
+    result['collisions'] = [{'old': old, 'new': new, 'reason': reason}
+                            for old, new, reason in plan['collisions']]
+    result['already_named'] = [old for old, new, _ in plan['matches'] if new == old]
+    result['unmatched'] = [{'filename': old, 'key': key} for old, new, key in plan['matches'] if not new]
+
+    if dry_run:
+        done = plan['ops']
+    else:
+        # Chỉ báo các file thật sự đã mang tên mới (lỗi giữa chừng thì phần còn lại nằm trong journal)
+        done = []
+        try:
+            execute_renames(images_folder, plan['ops'], done)
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+    result['renamed'] = [{'old': old, 'new': new, 'key': keys[old]} for old, new in done]
+    return result
+
+def rename_images_with_json(images_folder, json_file):
+    """Đổi tên file ảnh dựa trên dữ liệu JSON (log từng file ở mức DEBUG), trả về số file đã đổi tên"""
     
-    # Lấy danh sách file ảnh hiện tại
-    image_files = []
-    for filename in os.listdir(images_folder):
-        if filename.endswith(('.jpg', '.jpeg', '.png')):
-            image_files.append(filename)
+    # Đọc dữ liệu JSON + tạo mapping (một lượt streaming, dùng lại kết quả của preview)
+    loaded = load_mapping(json_file)
+    if loaded is None:
+        return 0
+    mapping, _ = loaded
+    log.debug(f"🗂️  Tạo được {len(mapping)} mapping keys")
     
-    print(f"📁 Tìm thấy {len(image_files)} file ảnh")
+    # Lập kế hoạch đổi tên (một lượt scandir) rồi mới thực hiện
+    plan = plan_renames(images_folder, mapping)
+    log.debug(f"📁 Tìm thấy {plan['image_count']} file ảnh")
     
-    # Đổi tên file
-    renamed_count = 0
+    renamed = dict(plan['ops'])
+    collided = {old: (new, reason) for old, new, reason in plan['collisions']}
     not_found_count = 0
+    verbose = log.isEnabledFor(logging.DEBUG)
     
-    for old_filename in image_files:
-        old_path = os.path.join(images_folder, old_filename)
-        
-        # Extract key từ tên file ảnh hiện tại
-        found_key = None
-        new_filename = None
-        
-        # Tìm Bài X.Y
-        bai_match = re.search(r'Bài (\d+\.\d+)', old_filename)
-        if bai_match:
-            found_key = f"Bài {bai_match.group(1)}"
-        
-        # Tìm Hình X.Y
-        if not found_key:
-            hinh_match = re.search(r'Hình (\d+\.\d+)', old_filename)
-            if hinh_match:
-                found_key = f"Hình {hinh_match.group(1)}"
-        
-        # Tìm các pattern đặc biệt
-        if not found_key:
-            special_patterns = [
-                r'KIẾN THỨC CẦN NHỚ',
-                r'A\. KIẾN THỨC CẦN NHỚ',  # Thêm pattern này
-                r'SƠ ĐỒ TỔNG KẾT CHƯƠNG [IVX]+',
-                r'Lời giải Bài \d+\.\d+',
-                r'Bìa sách'
-            ]
-            
-            for pattern in special_patterns:
-                match = re.search(pattern, old_filename)
-                if match:
-                    found_key = match.group(0)
-                    # Normalize key
-                    if found_key == "A. KIẾN THỨC CẦN NHỚ":
-                        found_key = "KIẾN THỨC CẦN NHỚ"
-                    break
-        
-        # Tìm mapping
-        if found_key and found_key in mapping:
-            new_filename = mapping[found_key]
-            
-            # Đảm bảo extension đúng
-            old_ext = os.path.splitext(old_filename)[1]
-            new_filename = os.path.splitext(new_filename)[0] + old_ext
-            
-            new_path = os.path.join(images_folder, new_filename)
-            
-            # Đổi tên file
-            try:
-                if old_path != new_path:  # Tránh đổi tên file giống nhau
-                    os.rename(old_path, new_path)
-                    print(f"✅ {old_filename}")
-                    print(f"   → {new_filename}")
-                    renamed_count += 1
-                else:
-                    print(f"⚠️  {old_filename} (đã đúng tên)")
-            except Exception as e:
-                print(f"❌ Lỗi đổi tên {old_filename}: {e}")
+    for old_filename, new_filename, found_key in plan['matches']:
+        if old_filename in renamed:
+            if verbose:
+                log.debug(f"✅ {old_filename}\n   → {new_filename}")
+        elif old_filename in collided:
+            new_filename, reason = collided[old_filename]
+            log.warning(f"⛔ Bỏ qua {old_filename} → {new_filename} ({reason})")
+        elif new_filename:
+            if verbose:
+                log.debug(f"⚠️  {old_filename} (đã đúng tên)")
         else:
-            print(f"❓ Không tìm thấy mapping cho: {old_filename}")
-            if found_key:
-                print(f"   Key tìm được: '{found_key}'")
+            if verbose:
+                log.debug(f"❓ Không tìm thấy mapping cho: {old_filename}"
+                          + (f"\n   Key tìm được: '{found_key}'" if found_key else ""))
             not_found_count += 1
     
+    if plan['cycles']:
+        log.info(f"🔁 Phát hiện {plan['cycles']} chu trình đổi tên (xử lý qua tên tạm)")
+    
+    # Đổi tên file (2 pha + journal)
+    renamed_count = 0
+    try:
+        renamed_count = execute_renames(images_folder, plan['ops'])
+    except Exception as e:
+        log.error(f"❌ Lỗi đổi tên: {e}", extra=event('rename.error', folder=images_folder, error=str(e)))
+        if os.path.exists(os.path.join(images_folder, RENAME_JOURNAL)):
+            log.error("   Journal vẫn còn - chọn 'Tiếp tục' hoặc 'Hoàn tác' trong menu")
+    
     # Báo cáo kết quả
-    print("\n" + "="*60)
-    print(f"🎉 KẾT QUẢ:")
-    print(f"   ✅ Đã đổi tên: {renamed_count} file")
-    print(f"   ❓ Không tìm thấy: {not_found_count} file")
-    print(f"   📊 Tổng cộng: {len(image_files)} file")
-    print("="*60)
+    log.info(f"🎉 KẾT QUẢ: ✅ đổi tên {renamed_count}, ⛔ trùng tên đích {len(plan['collisions'])}, "
+             f"❓ không tìm thấy {not_found_count}, 📊 tổng {plan['image_count']} file",
+             extra=event('rename.done', folder=images_folder, json_file=json_file, renamed=renamed_count,
+                         collisions=len(plan['collisions']), unmatched=not_found_count,
+                         total=plan['image_count']))
+    return renamed_count
 
 def preview_rename_mapping(images_folder, json_file):
     """Xem trước việc đổi tên mà không thực hiện"""
     
-    # Đọc dữ liệu JSON
-    try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-        print(f"📋 Đã đọc {len(json_data)} entries từ JSON")
-    except Exception as e:
-        print(f"❌ Lỗi đọc file JSON: {e}")
+    # Đọc dữ liệu JSON + tạo mapping (một lượt streaming)
+    loaded = load_mapping(json_file)
+    if loaded is None:
         return
+    mapping, _ = loaded
     
-    # Tạo mapping từ JSON
-    mapping = {}
-    for item in json_data:
-        filename = item['filename']
-        
-        # Extract key từ filename JSON
-        bai_match = re.search(r'Bài (\d+\.\d+)', filename)
-        hinh_match = re.search(r'Hình (\d+\.\d+)', filename)
-        
-        if bai_match:
-            key = f"Bài {bai_match.group(1)}"
-            mapping[key] = filename + ".jpg"
-        elif hinh_match:
-            key = f"Hình {hinh_match.group(1)}"
-            mapping[key] = filename + ".jpg"
-        else:
-            # Các trường hợp khác
-            special_patterns = [
-                r'KIẾN THỨC CẦN NHỚ',
-                r'SƠ ĐỒ TỔNG KẾT CHƯƠNG [IVX]+',
-                r'Lời giải Bài \d+\.\d+',
-                r'Bìa sách'
-            ]
-            
-            for pattern in special_patterns:
-                if re.search(pattern, filename):
-                    match = re.search(pattern, filename)
-                    if match:
-                        key = match.group(0)
-                        if key not in mapping:
-                            mapping[key] = filename + ".jpg"
-                        break
-    
-    # Lấy danh sách file ảnh hiện tại
-    image_files = []
-    for filename in os.listdir(images_folder):
-        if filename.endswith(('.jpg', '.jpeg', '.png')):
-            image_files.append(filename)
+    # Lập kế hoạch đổi tên (giống hệt lúc thực hiện)
+    plan = plan_renames(images_folder, mapping)
+    collided = {old: (new, reason) for old, new, reason in plan['collisions']}
     
-    print(f"📁 Tìm thấy {len(image_files)} file ảnh")
+    print(f"📁 Tìm thấy {plan['image_count']} file ảnh")
     print("\n🔍 XEM TRƯỚC VIỆC ĐỔI TÊN:")
     print("="*80)
     
@@ -194,45 +461,13 @@ def preview_rename_mapping(images_folder, json_file):
     will_rename = 0
     not_found = 0
     
-    for old_filename in image_files:
-        # Extract key từ tên file ảnh hiện tại
-        found_key = None
-        
-        # Tìm Bài X.Y
-        bai_match = re.search(r'Bài (\d+\.\d+)', old_filename)
-        if bai_match:
-            found_key = f"Bài {bai_match.group(1)}"
-        
-        # Tìm Hình X.Y
-        if not found_key:
-            hinh_match = re.search(r'Hình (\d+\.\d+)', old_filename)
-            if hinh_match:
-                found_key = f"Hình {hinh_match.group(1)}"
-        
-        # Tìm các pattern đặc biệt
-        if not found_key:
-            special_patterns = [
-                r'KIẾN THỨC CẦN NHỚ',
-                r'A\. KIẾN THỨC CẦN NHỚ',
-                r'SƠ ĐỒ TỔNG KẾT CHƯƠNG [IVX]+',
-                r'Lời giải Bài \d+\.\d+',
-                r'Bìa sách'
-            ]
-            
-            for pattern in special_patterns:
-                match = re.search(pattern, old_filename)
-                if match:
-                    found_key = match.group(0)
-                    if found_key == "A. KIẾN THỨC CẦN NHỚ":
-                        found_key = "KIẾN THỨC CẦN NHỚ"
-                    break
-        
-        # Kiểm tra mapping
-        if found_key and found_key in mapping:
-            new_filename = mapping[found_key]
-            old_ext = os.path.splitext(old_filename)[1]
-            new_filename = os.path.splitext(new_filename)[0] + old_ext
-            
+    for old_filename, new_filename, found_key in plan['matches']:
+        if old_filename in collided:
+            new_filename, reason = collided[old_filename]
+            print(f"⛔ {old_filename}")
+            print(f"   → {new_filename} (bỏ qua: {reason})")
+            print()
+        elif new_filename:
             print(f"✅ {old_filename}")
             print(f"   → {new_filename}")
             print(f"   🔑 Key: '{found_key}'")
@@ -240,7 +475,9 @@ def preview_rename_mapping(images_folder, json_file):
             will_rename += 1
         else:
             print(f"❓ {old_filename}")
-            if found_key:
+            if found_key and found_key in mapping:
+                print(f"   🔑 Key tìm được: '{found_key}' (đã dùng hết {len(mapping[found_key])} entry trong JSON)")
+            elif found_key:
                 print(f"   🔑 Key tìm được: '{found_key}' (không có trong mapping)")
             else:
                 print(f"   ❌ Không extract được key")
@@ -250,19 +487,69 @@ def preview_rename_mapping(images_folder, json_file):
     print("="*80)
     print(f"📊 TỔNG KẾT PREVIEW:")
     print(f"   ✅ Sẽ đổi tên: {will_rename} file")
+    print(f"   ⛔ Trùng tên đích: {len(plan['collisions'])} file")
     print(f"   ❓ Không tìm thấy: {not_found} file")
-    print(f"   📁 Tổng cộng: {len(image_files)} file")
+    print(f"   📁 Tổng cộng: {plan['image_count']} file")
     print("="*80)
 
-def main():
-    """Hàm main"""
-    
+def build_parser():
+    parser = argparse.ArgumentParser(description="Đổi tên file ảnh theo JSON (không có lệnh → menu tương tác)")
+    commands = parser.add_subparsers(dest='command')
+    common = argparse.ArgumentParser(add_help=False)
+    add_logging_arguments(common)
+
+    preview = commands.add_parser('preview', parents=[common], help="Xem trước việc đổi tên, không đổi gì")
+    rename = commands.add_parser('rename', parents=[common], help="Đổi tên ảnh theo JSON")
+    rename.add_argument('--dry-run', action='store_true', help="Chỉ lập kế hoạch, không đổi tên")
+    for command in (preview, rename):
+        command.add_argument('images_folder', help="Thư mục ảnh")
+        command.add_argument('json_file', help="File JSON/JSONL")
+        command.add_argument('--json', action='store_true', help="In kết quả dạng JSON")
+
+    for name, action in (('resume', "Tiếp tục"), ('rollback', "Hoàn tác")):
+        command = commands.add_parser(name, parents=[common], help=f"{action} lần đổi tên bị gián đoạn (theo journal)")
+        command.add_argument('images_folder', help="Thư mục ảnh")
+    return parser
+
+def run_command(args):
+    """Chạy một lệnh CLI không tương tác, trả về exit code"""
+    if args.command in ('resume', 'rollback'):
+        count = recover_renames(args.images_folder, rollback=(args.command == 'rollback'))
+        if count is None:
+            log.info("ℹ️  Không có journal đổi tên nào cần xử lý")
+        else:
+            log.info(f"✅ Đã {'hoàn tác' if args.command == 'rollback' else 'tiếp tục'} {count} file",
+                     extra=event('rename.recover', folder=args.images_folder, action=args.command, files=count))
+        return 0
+
+    dry_run = args.command == 'preview' or args.dry_run
+    if args.json:
+        result = rename_folder(args.images_folder, args.json_file, dry_run=dry_run)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 1 if result['error'] else 0
+
+    if dry_run:
+        preview_rename_mapping(args.images_folder, args.json_file)
+    else:
+        rename_images_with_json(args.images_folder, args.json_file)
+    return 0
+
+def main(argv=None):
+    """CLI với các lệnh preview/rename/resume/rollback; không có lệnh thì hiện menu tương tác"""
+    args = build_parser().parse_args(argv)
+    if args.command:
+        setup_logging_from_args(args, logging.WARNING if getattr(args, 'json', False) else logging.INFO)
+        return run_command(args)
+
+    setup_logging(logging.DEBUG)  # Menu tương tác: in chi tiết từng file như trước
     print("🎯 CHƯƠNG TRÌNH ĐỔI TÊN FILE ẢNH THEO JSON")
     print("="*50)
     
     # Đường dẫn mặc định
-    images_folder = r"E:\Data\Work\SeperateImage\vatly10"
-    json_file = r"E:\Data\Work\SeperateImage\vatly10.json"
+    images_folder = input("Nhập thư mục ảnh (Enter cho mặc định): ").strip() \
+        or r"E:\Data\Work\SeperateImage\vatly10"
+    json_file = input("Nhập file JSON (Enter cho mặc định): ").strip() \
+        or r"E:\Data\Work\SeperateImage\vatly10.json"
     
     # Kiểm tra đường dẫn
     if not os.path.exists(images_folder):
@@ -281,8 +568,10 @@ def main():
     print("1. Xem trước việc đổi tên")
     print("2. Đổi tên ngay")
     print("3. Xem trước rồi quyết định")
+    print("4. Tiếp tục lần đổi tên bị gián đoạn")
+    print("5. Hoàn tác lần đổi tên bị gián đoạn")
     
-    choice = input("Chọn (1-3): ").strip()
+    choice = input("Chọn (1-5): ").strip()
     
     if choice == "1":
         preview_rename_mapping(images_folder, json_file)
@@ -297,8 +586,15 @@ def main():
             rename_images_with_json(images_folder, json_file)
         else:
             print("✋ Hủy đổi tên.")
+    
+    elif choice in ("4", "5"):
+        count = recover_renames(images_folder, rollback=(choice == "5"))
+        if count is None:
+            print("ℹ️  Không có journal đổi tên nào cần xử lý")
+        else:
+            print(f"✅ Đã {'hoàn tác' if choice == '5' else 'tiếp tục'} {count} file")
     else:
         print("❌ Lựa chọn không hợp lệ!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
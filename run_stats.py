@@ -0,0 +1,90 @@
+import cProfile
+import contextlib
+import json
+import os
+import threading
+import time
+
+class RunStats:
+    """Thời gian theo stage + bộ đếm của một lần chạy, xuất ra báo cáo JSON
+
+    Dùng được từ nhiều thread (client Mathpix song song); process con trả về to_dict()
+    để process cha gộp lại bằng merge().
+    """
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.timers = {}  # stage -> {'seconds': tổng thời gian, 'calls': số lần}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Đo thời gian một khối: with stats.timer('extract.write'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            timer = self.timers.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            timer['seconds'] += seconds
+            timer['calls'] += calls
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, data):
+        """Cộng dồn to_dict() của một RunStats khác (vd. từ process con)"""
+        for stage, timer in data.get('timers', {}).items():
+            self.add_time(stage, timer['seconds'], timer['calls'])
+        for name, n in data.get('counters', {}).items():
+            self.count(name, n)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'started_at': round(self.started_at, 3),
+                'wall_seconds': round(time.perf_counter() - self._start, 3),
+                'timers': {stage: {'seconds': round(timer['seconds'], 4), 'calls': timer['calls']}
+                           for stage, timer in sorted(self.timers.items())},
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def write_report(self, path):
+        """Ghi báo cáo JSON (ghi ra file tạm rồi đổi tên)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+@contextlib.contextmanager
+def profile_to(path):
+    """Chạy khối lệnh dưới cProfile và dump ra path (đọc bằng pstats/snakeviz); path rỗng thì không làm gì
+
+    Chỉ đo process hiện tại, không đo các process con của batch.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+def add_stats_arguments(parser):
+    """Thêm --stats/--profile vào một argparse parser"""
+    parser.add_argument('--stats', metavar='PATH', default=None,
+                        help="Ghi báo cáo thời gian/bộ đếm theo stage (JSON) vào file này")
+    parser.add_argument('--profile', metavar='PATH', default=None,
+                        help="Dump cProfile của process chính vào file này")
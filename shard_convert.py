@@ -0,0 +1,122 @@
+import argparse
+import os
+import subprocess
+import time
+
+from convert_pdf_docx import convert_pdfs_concurrently
+from event_log import add_logging_arguments, event, get_logger, setup_logging_from_args
+from process import extract_images, get_base_filename
+from run_stats import RunStats, add_stats_arguments, profile_to
+from unlock_pdf import is_up_to_date
+
+DEFAULT_PAGES_PER_SHARD = 100
+
+log = get_logger('shard')
+
+def count_pages(pdf_path):
+    """Số trang của PDF (qpdf --show-npages)"""
+    result = subprocess.run(['qpdf', '--show-npages', pdf_path],
+                            check=True, capture_output=True, text=True)
+    return int(result.stdout.strip())
+
+def page_ranges(page_count, pages_per_shard):
+    """Chia 1..page_count thành các khoảng (start, end) liên tiếp"""
+    return [(start, min(start + pages_per_shard - 1, page_count))
+            for start in range(1, page_count + 1, pages_per_shard)]
+
+def split_pdf(pdf_path, shard_dir, pages_per_shard=DEFAULT_PAGES_PER_SHARD):
+    """Tách PDF thành các shard theo khoảng trang bằng qpdf, trả về list đường dẫn theo thứ tự trang
+
+    Shard đã có (khác rỗng) và mới hơn PDF gốc thì không tách lại.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    page_count = count_pages(pdf_path)
+
+    shards = []
+    for start, end in page_ranges(page_count, pages_per_shard):
+        shard_path = os.path.join(shard_dir, f"{pdf_name}_p{start:04d}-{end:04d}.pdf")
+        if not is_up_to_date(pdf_path, shard_path):
+            # Ghi ra file tạm rồi đổi tên: shard dở dang (qpdf lỗi/bị ngắt) không bao giờ được dùng lại
+            tmp_path = shard_path + ".part"
+            try:
+                command = ['qpdf', pdf_path, '--pages', '.', f"{start}-{end}", '--', tmp_path]
+                result = subprocess.run(command, capture_output=True, text=True)
+                # qpdf trả về 3 khi chỉ có cảnh báo, file output vẫn dùng được
+                if result.returncode not in (0, 3):
+                    raise subprocess.CalledProcessError(result.returncode, command, result.stdout, result.stderr)
+                os.replace(tmp_path, shard_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        shards.append(shard_path)
+
+    log.info(f"✂️  {os.path.basename(pdf_path)}: {page_count} trang → {len(shards)} shard")
+    return shards
+
+def convert_and_extract_sharded(pdf_path, output_folder="images", work_dir="output/shards",
+                                pages_per_shard=DEFAULT_PAGES_PER_SHARD, concurrency=4, stats=None):
+    """Tách PDF → convert các shard song song → trích xuất ảnh từng DOCX theo thứ tự trang
+
+    STT ảnh và current_index/current_title được nối tiếp qua ranh giới shard nên kết quả
+    giống như khi convert cả cuốn trong một job. Trả về tổng số ảnh đã lưu, None nếu lỗi.
+    """
+    stats = stats or RunStats('shard')
+    start = time.perf_counter()
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    shard_dir = os.path.join(work_dir, pdf_name)
+
+    with stats.timer('shard.split'):
+        shards = split_pdf(pdf_path, shard_dir, pages_per_shard)
+    stats.count('shard.shards', len(shards))
+    results = convert_pdfs_concurrently(shards, output_dir=shard_dir, concurrency=concurrency, stats=stats)
+
+    # Thiếu một shard thì STT của các shard sau sẽ sai → dừng
+    failed = [r for r in results if r['error']]
+    if failed:
+        for r in failed:
+            log.error(f"❌ Shard lỗi: {r['pdf_path']} - {r['error']}")
+        return None
+
+    base_filename = get_base_filename(pdf_path)
+    state = {'current_index': None, 'current_title': None, 'next_stt': 1}
+    saved_total = 0
+    for r in results:
+        extracted = extract_images(r['output_path'], output_folder, base_filename=base_filename, state=state,
+                                   stats=stats)
+        saved_total += extracted['saved']
+        # Shard trích xuất lỗi thì state (STT, chỉ mục) của các shard sau không còn đúng → dừng
+        if extracted['errors']:
+            for error in extracted['errors']:
+                log.error(f"❌ Trích xuất shard lỗi: {r['output_path']} - {error}")
+            return None
+
+    seconds = time.perf_counter() - start
+    log.info(f"🎉 {os.path.basename(pdf_path)}: {saved_total} ảnh từ {len(shards)} shard ({seconds:.1f}s)",
+             extra=event('shard.done', pdf=pdf_path, shards=len(shards), saved=saved_total,
+                         seconds=round(seconds, 3)))
+    return saved_total
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert PDF lớn theo từng khoảng trang rồi trích xuất ảnh")
+    parser.add_argument('pdf', help="File PDF (đã unlock)")
+    parser.add_argument('-o', '--output', default="images", help="Thư mục lưu ảnh")
+    parser.add_argument('--work-dir', default="output/shards", help="Thư mục chứa shard PDF/DOCX")
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_SHARD, help="Số trang mỗi shard")
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help="Số shard convert cùng lúc")
+    add_logging_arguments(parser)
+    add_stats_arguments(parser)
+    args = parser.parse_args()
+    setup_logging_from_args(args)
+
+    stats = RunStats('shard')
+    with profile_to(args.profile):
+        saved = convert_and_extract_sharded(args.pdf, args.output, args.work_dir, args.pages,
+                                            args.concurrency, stats)
+    if args.stats:
+        stats.write_report(args.stats)
+    return 0 if saved is not None else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,172 @@
+import http.server
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import convert_pdf_docx
+from conversion_ledger import ConversionLedger
+from extract_cache import file_sha256
+from run_stats import RunStats
+
+DOCX_BYTES = b"PK\x03\x04" + bytes(range(256)) * 40
+
+class MathpixStub(http.server.BaseHTTPRequestHandler):
+    """Server Mathpix giả lập: POST /v3/pdf, GET /v3/pdf/<id> và /v3/pdf/<id>.docx (Range/If-Range)"""
+
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/v3/pdf":
+            return self._send(404, b"")
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.state['uploads'].append({'content_type': self.headers['Content-Type'], 'body': body})
+        self._send(200, json.dumps({'pdf_id': f"job{len(self.state['uploads'])}"}).encode())
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v3/pdf/(\w+)(\.docx)?", self.path)
+        if not match:
+            return self._send(404, b"")
+        if not match.group(2):
+            self.state['polls'] += 1
+            if self.state['status_codes']:
+                return self._send(self.state['status_codes'].pop(0), b"{}")
+            return self._send(200, json.dumps({'status': 'completed'}).encode())
+
+        self.state['downloads'].append(dict(self.headers))
+        data, etag = self.state['docx'], self.state['etag']
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range', etag) == etag:
+            start = int(range_header.split('=')[1].split('-')[0])
+            return self._send(206, data[start:], {
+                'ETag': etag, 'Content-Range': f"bytes {start}-{len(data) - 1}/{len(data)}"})
+        self._send(200, data, {'ETag': etag})
+
+    def _send(self, code, body, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class ConvertPdfDocxTest(unittest.TestCase):
+    """Client Mathpix chạy với server giả lập qua MATHPIX_BASE_URL"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MathpixStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/v3"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp.name, "sach.pdf")
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b"%PDF-1.4\n" + os.urandom(5000))
+        self.output_dir = os.path.join(self.tmp.name, "output")
+        self.ledger_path = os.path.join(self.tmp.name, "ledger.sqlite")
+        MathpixStub.state = {'uploads': [], 'polls': 0, 'status_codes': [], 'downloads': [],
+                             'docx': DOCX_BYTES, 'etag': '"v1"'}
+        for patcher in (mock.patch.object(convert_pdf_docx, 'MATHPIX_BASE_URL', self.base_url),
+                        mock.patch.object(convert_pdf_docx, 'POLL_INITIAL_DELAY', 0.01)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _convert(self, stats=None):
+        return convert_pdf_docx.convert_pdfs_concurrently(
+            [self.pdf_path], self.output_dir, concurrency=2, max_wait_time=30,
+            ledger_path=self.ledger_path, stats=stats)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_multipart_upload_streams_pdf(self):
+        [result] = self._convert()
+        self.assertIsNone(result['error'])
+        self.assertEqual(self._read(result['output_path']), DOCX_BYTES)
+
+        [upload] = MathpixStub.state['uploads']
+        boundary = re.fullmatch(r"multipart/form-data; boundary=(\w+)", upload['content_type']).group(1)
+        preamble, rest = upload['body'].split(b"\r\n\r\n", 1)
+        self.assertTrue(preamble.startswith(f"--{boundary}\r\n".encode()))
+        self.assertIn(b'name="file"; filename="sach.pdf"', preamble)
+        self.assertIn(b"Content-Type: application/pdf", preamble)
+        self.assertEqual(rest, self._read(self.pdf_path) + f"\r\n--{boundary}--\r\n".encode())
+
+    def test_rate_limit_and_unavailable_are_polled_again(self):
+        MathpixStub.state['status_codes'] = [429, 503, 429]
+        stats = RunStats('convert')
+        [result] = self._convert(stats)
+        self.assertIsNone(result['error'])
+        self.assertEqual(MathpixStub.state['polls'], 4)
+        self.assertEqual(stats.counters['convert.polls'], 4)
+        self.assertEqual(self._read(result['output_path']), DOCX_BYTES)
+
+    def test_rerun_skips_converted_pdf(self):
+        [first] = self._convert()
+        self.assertIsNone(first['error'])
+        [second] = self._convert()
+        self.assertTrue(second['skipped'])
+        self.assertEqual(second['output_path'], first['output_path'])
+        self.assertEqual(len(MathpixStub.state['uploads']), 1)
+        self.assertEqual(len(MathpixStub.state['downloads']), 1)
+
+        ledger = ConversionLedger(self.ledger_path)
+        try:
+            self.assertEqual(ledger.get(file_sha256(self.pdf_path))['status'], 'downloaded')
+        finally:
+            ledger.close()
+
+    def _download_over_part(self, part_bytes, validator):
+        output_path = os.path.join(self.output_dir, "sach.docx")
+        os.makedirs(self.output_dir)
+        with open(output_path + ".part", 'wb') as f:
+            f.write(part_bytes)
+        with open(output_path + ".part.json", 'w', encoding='utf-8') as f:
+            json.dump({'job_id': "job1", 'validator': validator}, f)
+
+        session = convert_pdf_docx.make_session(1)
+        try:
+            convert_pdf_docx.stream_download(session, f"{self.base_url}/pdf/job1.docx", output_path,
+                                             job_id="job1")
+        finally:
+            session.close()
+        self.assertFalse(os.path.exists(output_path + ".part"))
+        self.assertFalse(os.path.exists(output_path + ".part.json"))
+        return self._read(output_path)
+
+    def test_part_resumes_when_validator_matches(self):
+        half = len(DOCX_BYTES) // 2
+        self.assertEqual(self._download_over_part(DOCX_BYTES[:half], '"v1"'), DOCX_BYTES)
+        [request] = MathpixStub.state['downloads']
+        self.assertEqual(request['Range'], f"bytes={half}-")
+        self.assertEqual(request['If-Range'], '"v1"')
+
+    def test_part_is_discarded_when_validator_changed(self):
+        MathpixStub.state['etag'] = '"v2"'
+        stale = b"x" * (len(DOCX_BYTES) // 2)
+        self.assertEqual(self._download_over_part(stale, '"v1"'), DOCX_BYTES)
+        [request] = MathpixStub.state['downloads']
+        self.assertEqual(request['If-Range'], '"v1"')
+
+if __name__ == "__main__":
+    unittest.main()
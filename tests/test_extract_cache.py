@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process
+from bench import generate_book
+
+class ExtractCacheTest(unittest.TestCase):
+    """extract_images(use_cache=True): chỉ DOCX trích xuất không lỗi mới được bỏ qua ở lần sau"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docx_path = os.path.join(self.tmp.name, "sach ruot.docx")
+        self.book = generate_book(self.docx_path, 2)
+        self.output = os.path.join(self.tmp.name, "images")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _extract(self, **options):
+        return process.extract_images(self.docx_path, self.output, use_cache=True, **options)
+
+    def test_failed_member_is_retried(self):
+        failing = f"word/{self.book['expected'][1][0]}"
+        save_zip_member = process.save_zip_member
+
+        def flaky(docx_zip, member, filepath, hash_name=None):
+            if member == failing:
+                raise OSError("ghi lỗi giả lập")
+            return save_zip_member(docx_zip, member, filepath, hash_name)
+
+        with mock.patch.object(process, 'save_zip_member', flaky):
+            first = self._extract()
+        self.assertEqual(len(first['errors']), 1)
+        self.assertEqual(first['saved'], self.book['images'] - 1)
+
+        second = self._extract()
+        self.assertFalse(second['cached'])
+        self.assertEqual(second['errors'], [])
+        self.assertEqual(second['saved'], self.book['images'])
+        self.assertEqual(len(os.listdir(self.output)), self.book['images'])
+
+        third = self._extract()
+        self.assertTrue(third['cached'])
+        self.assertEqual(third['saved'], self.book['images'])
+
+    def test_broken_manifest_is_not_cached(self):
+        manifest = os.path.join(self.tmp.name, "code.json")
+        with open(manifest, 'w', encoding='utf-8') as f:
+            f.write('[{"filename": ')  # JSON hỏng
+        first = self._extract(manifest=manifest)
+        self.assertEqual(len(first['errors']), 1)
+
+        keyed = [(n, label) for n, (_, label) in enumerate(self.book['expected'], 1)
+                 if label.startswith(("Bài ", "Hình "))]
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump([{'filename': f"SBT {n:03d} {label}"} for n, label in keyed], f, ensure_ascii=False)
+        second = self._extract(manifest=manifest)
+        self.assertFalse(second['cached'])
+        self.assertEqual(second['errors'], [])
+        names = set(os.listdir(self.output))
+        for n, label in keyed:
+            self.assertIn(f"SBT {n:03d} {label}.png", names)
+
+    def test_missing_manifest_is_reported(self):
+        result = self._extract(manifest=os.path.join(self.tmp.name, "khong-co.json"))
+        self.assertFalse(result['cached'])
+        self.assertEqual(len(result['errors']), 1)
+
+if __name__ == "__main__":
+    unittest.main()
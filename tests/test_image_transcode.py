@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_transcode import list_images, transcode_folder
+
+JPEG_BYTES = b'\xff\xd8\xff\xe0' + b'\x00' * 60
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 60
+
+class TranscodeFolderTest(unittest.TestCase):
+    """Sửa extension theo magic bytes (không cần Pillow), ra thư mục khác hoặc tại chỗ"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images = os.path.join(self.tmp.name, "images")
+        os.makedirs(self.images)
+        self._write("001_Bài 1.1.png", JPEG_BYTES)  # JPEG mang nhầm extension .png
+        self._write("002_Hình 1.2.png", PNG_BYTES)
+        self._write("_manifest.json", b"[]")
+        self._write(".DS_Store", b"\x00\x00\x00\x01Bud1")
+        self._write("003.png.part", PNG_BYTES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data):
+        with open(os.path.join(self.images, name), 'wb') as f:
+            f.write(data)
+
+    def test_list_images_skips_hidden_and_temporary_files(self):
+        self.assertEqual(list_images(self.images), ["001_Bài 1.1.png", "002_Hình 1.2.png"])
+
+    def test_output_folder_keeps_originals(self):
+        output = os.path.join(self.tmp.name, "web")
+        results = transcode_folder(self.images, output, workers=1)
+        self.assertEqual([r['error'] for r in results], [None, None])
+        self.assertEqual(sorted(os.listdir(output)), ["001_Bài 1.1.jpg", "002_Hình 1.2.png"])
+        self.assertIn("001_Bài 1.1.png", os.listdir(self.images))
+
+    def test_in_place_replaces_renamed_originals(self):
+        results = transcode_folder(self.images, self.images, workers=1)
+        self.assertEqual([r['error'] for r in results], [None, None])
+        self.assertEqual(sorted(list_images(self.images)), ["001_Bài 1.1.jpg", "002_Hình 1.2.png"])
+        with open(os.path.join(self.images, "001_Bài 1.1.jpg"), 'rb') as f:
+            self.assertEqual(f.read(), JPEG_BYTES)
+
+    def test_in_place_refuses_same_stem(self):
+        self._write("002_Hình 1.2.jpg", JPEG_BYTES)
+        with self.assertRaises(ValueError):
+            transcode_folder(self.images, self.images, workers=1)
+        self.assertEqual(len(list_images(self.images)), 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def _image_bytes(color, fmt):
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 80), color).save(buffer, fmt)
+    return buffer.getvalue()
+
+@unittest.skipUnless(pymupdf and Image, "cần PyMuPDF và Pillow")
+class ExtractPdfImagesTest(unittest.TestCase):
+    """Tạo PDF nhỏ: ảnh JPEG (DCT), PNG (Flate), JPEG nén thêm Flate và JPEG 2000 (JPX)"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp.name, "sach.pdf")
+        self.output = os.path.join(self.tmp.name, "images")
+        jpeg = _image_bytes('red', 'JPEG')
+        text = dict(fontfile=FONT_PATH, fontname='dv') if os.path.exists(FONT_PATH) else {}
+
+        doc = pymupdf.open()
+        page = doc.new_page()
+        page.insert_text((50, 60), "Bài 1.1 Cho hàm số", **text)
+        page.insert_image(pymupdf.Rect(50, 80, 170, 160), stream=jpeg)
+        page.insert_text((50, 190), "Hình 1.2", **text)
+        page.insert_image(pymupdf.Rect(50, 210, 170, 290), stream=_image_bytes('blue', 'PNG'))
+        page.insert_text((50, 320), "Câu 3", **text)
+        # Ảnh JPEG khác (để không bị gộp xref) rồi nén thêm Flate: [/FlateDecode /DCTDecode]
+        xref = page.insert_image(pymupdf.Rect(50, 340, 170, 420), stream=_image_bytes('green', 'JPEG'))
+        doc.update_stream(xref, zlib.compress(doc.xref_stream_raw(xref)), compress=False)
+        doc.xref_set_key(xref, 'Filter', '[/FlateDecode /DCTDecode]')
+        page.insert_text((50, 450), "Câu 4", **text)
+        page.insert_image(pymupdf.Rect(50, 470, 170, 550), stream=_image_bytes('yellow', 'JPEG2000'))
+        doc.save(self.pdf_path)
+        doc.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _extract(self, **kwargs):
+        from pdf_images import extract_pdf_images
+        with ThreadPoolExecutor(2) as executor:
+            return extract_pdf_images(self.pdf_path, self.output, executor=executor, **kwargs)
+
+    def test_filenames_follow_indices(self):
+        result = self._extract(dry_run=True)
+        names = [img['filename'] for img in result['images']]
+        self.assertEqual(len(names), 4)
+        self.assertEqual([img['page'] for img in result['images']], [1, 1, 1, 1])
+        self.assertTrue(names[0].endswith(".jpg"), names)
+        self.assertTrue(names[1].endswith(".png"), names)
+        self.assertTrue(names[2].endswith(".png"), names)  # Flate + DCT: không copy nguyên stream
+        self.assertTrue(names[3].endswith(".jpx"), names)  # Extension JPX theo extract_image
+        if os.path.exists(FONT_PATH):
+            self.assertIn("1.1", names[0])
+            self.assertIn("Hình 1.2", names[1])
+            self.assertIn("Câu 3", names[2])
+            self.assertIn("Câu 4", names[3])
+
+    def test_written_files_match_their_extension(self):
+        result = self._extract()
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['saved'], 4)
+        signatures = {'.jpg': JPEG_SIGNATURE, '.png': PNG_SIGNATURE}
+        for img in result['images']:
+            with open(os.path.join(self.output, img['filename']), 'rb') as f:
+                head = f.read(8)
+            signature = signatures.get(os.path.splitext(img['filename'])[1], b'')
+            self.assertTrue(head.startswith(signature), img['filename'])
+            with Image.open(os.path.join(self.output, img['filename'])) as image:
+                self.assertEqual(image.size, (120, 80))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_with_json import RENAME_JOURNAL, execute_renames, iter_json_entries, recover_renames
+
+ENTRIES = [
+    {'filename': "001_Bài 1.1"},
+    {'filename': "002_Hình 2.3", 'page': 12},
+    {'filename': "003_KIẾN THỨC CẦN NHỚ", 'tags': ["a", "b"]},
+]
+
+class IterJsonEntriesTest(unittest.TestCase):
+    """iter_json_entries với chunk nhỏ: entry nào cũng có thể nằm vắt qua ranh giới chunk"""
+
+    CHUNK_SIZES = (1, 3, 7)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, text, encoding='utf-8'):
+        path = os.path.join(self.tmp.name, "entries.json")
+        with open(path, 'w', encoding=encoding) as f:
+            f.write(text)
+        return {chunk_size: list(iter_json_entries(path, chunk_size)) for chunk_size in self.CHUNK_SIZES}
+
+    def test_json_array(self):
+        text = json.dumps(ENTRIES, ensure_ascii=False, indent=2)
+        for chunk_size, entries in self._read(text).items():
+            self.assertEqual(entries, ENTRIES, chunk_size)
+
+    def test_json_lines(self):
+        text = "\n".join(json.dumps(item, ensure_ascii=False) for item in ENTRIES) + "\n"
+        for chunk_size, entries in self._read(text, encoding='utf-8-sig').items():
+            self.assertEqual(entries, ENTRIES, chunk_size)
+
+    def test_scalar_across_chunk_boundary(self):
+        values = [123456789, -1.5e10, 0.25, True, False, None, "Bài 1.1"]
+        cases = {
+            json.dumps(values): values,
+            "\n".join(json.dumps(value) for value in values): values,
+            "123456789": [123456789],
+            "  -1.5e10\n": [-1.5e10],
+        }
+        for text, expected in cases.items():
+            for chunk_size, entries in self._read(text).items():
+                self.assertEqual(entries, expected, (chunk_size, text))
+
+    def test_truncated_file_raises(self):
+        for chunk_size in self.CHUNK_SIZES:
+            path = os.path.join(self.tmp.name, "broken.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('[{"filename": "Bài 1.1"}, {"filename": "Hì')
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_json_entries(path, chunk_size))
+
+class Crash(Exception):
+    """Giả lập process bị dừng giữa chừng"""
+
+class RenameJournalTest(unittest.TestCase):
+    """execute_renames bị dừng sau từng bước của journal, rồi recover_renames tiếp tục hoặc hoàn tác"""
+
+    # Chu trình a → b → c → a cùng một chuỗi d → e
+    OPS = [('a.jpg', 'b.jpg'), ('b.jpg', 'c.jpg'), ('c.jpg', 'a.jpg'), ('d.jpg', 'e.jpg')]
+    ORIGINAL = {'a.jpg': 'A', 'b.jpg': 'B', 'c.jpg': 'C', 'd.jpg': 'D'}
+    RENAMED = {'b.jpg': 'A', 'c.jpg': 'B', 'a.jpg': 'C', 'e.jpg': 'D'}
+
+    def setUp(self):
+        self._make_folder()
+
+    def _make_folder(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        for name, content in self.ORIGINAL.items():
+            with open(os.path.join(self.folder, name), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    def _contents(self):
+        """Tên file → nội dung (không tính journal)"""
+        contents = {}
+        for name in os.listdir(self.folder):
+            if name == RENAME_JOURNAL:
+                continue
+            with open(os.path.join(self.folder, name), 'r', encoding='utf-8') as f:
+                contents[name] = f.read()
+        return contents
+
+    def _crash_after(self, renames):
+        """Chạy execute_renames nhưng dừng sau `renames` lần os.rename (0 = ngay sau khi ghi plan,
+        2 * len(OPS) = đã đổi tên xong nhưng chưa xoá journal)"""
+        real_rename = os.rename
+        calls = []
+
+        def rename(src, dst):
+            if len(calls) == renames:
+                raise Crash()
+            calls.append(src)
+            real_rename(src, dst)
+
+        def remove(path):
+            raise Crash()
+
+        with mock.patch('os.rename', rename), mock.patch('os.remove', remove):
+            with self.assertRaises(Crash):
+                execute_renames(self.folder, self.OPS)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, RENAME_JOURNAL)))
+        # Không file nào bị ghi đè: đủ nội dung, chỉ khác tên
+        self.assertEqual(sorted(self._contents().values()), ['A', 'B', 'C', 'D'])
+
+    def test_completes_cycle(self):
+        completed = []
+        self.assertEqual(execute_renames(self.folder, self.OPS, completed), 4)
+        self.assertEqual(self._contents(), self.RENAMED)
+        self.assertEqual(completed, self.OPS)
+        self.assertIsNone(recover_renames(self.folder))
+
+    def test_resume_after_each_step(self):
+        for renames in range(2 * len(self.OPS) + 1):
+            with self.subTest(renames=renames):
+                self._make_folder()
+                self._crash_after(renames)
+                self.assertEqual(recover_renames(self.folder), len(self.OPS))
+                self.assertEqual(self._contents(), self.RENAMED)
+
+    def test_rollback_after_each_step(self):
+        for renames in range(2 * len(self.OPS) + 1):
+            with self.subTest(renames=renames):
+                self._make_folder()
+                self._crash_after(renames)
+                self.assertEqual(recover_renames(self.folder, rollback=True), len(self.OPS))
+                self.assertEqual(self._contents(), self.ORIGINAL)
+
+    def test_truncated_journal_line_is_ignored(self):
+        # Dừng ngay trước pha 2 rồi ghi dở dòng 'phase2' (crash khi đang ghi journal)
+        self._crash_after(len(self.OPS))
+        with open(os.path.join(self.folder, RENAME_JOURNAL), 'a', encoding='utf-8') as f:
+            f.write('{"type": "pha')
+        self.assertEqual(recover_renames(self.folder), len(self.OPS))
+        self.assertEqual(self._contents(), self.RENAMED)
+
+    def test_leftover_journal_blocks_new_run(self):
+        self._crash_after(1)
+        with self.assertRaises(RuntimeError):
+            execute_renames(self.folder, self.OPS)
+        self.assertEqual(recover_renames(self.folder, rollback=True), len(self.OPS))
+        self.assertEqual(self._contents(), self.ORIGINAL)
+
+if __name__ == "__main__":
+    unittest.main()
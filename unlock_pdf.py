@@ -1,7 +1,23 @@
+import argparse
 import subprocess
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def remove_pdf_restrictions_batch(input_dir, output_dir):
+from event_log import add_logging_arguments, event, get_logger, setup_logging_from_args
+
+log = get_logger('unlock')
+
+def is_up_to_date(input_pdf_path, output_pdf_path):
+    """File output đã có và mới hơn file gốc thì không cần decrypt lại"""
+    if not os.path.exists(output_pdf_path):
+        return False
+    output_stat = os.stat(output_pdf_path)
+    return output_stat.st_size > 0 and output_stat.st_mtime >= os.stat(input_pdf_path).st_mtime
+
+def find_pdf_jobs(input_dir, output_dir):
+    """Duyệt thư mục input, trả về list (input_pdf_path, output_pdf_path) giữ nguyên cấu trúc thư mục"""
+    jobs = []
     for root, dirs, files in os.walk(input_dir):
         for file in files:
             if file.lower().endswith('.pdf'):
@@ -10,22 +26,93 @@ def remove_pdf_restrictions_batch(input_dir, output_dir):
                 # Tạo đường dẫn tương ứng trong thư mục output
                 relative_path = os.path.relpath(root, input_dir)
                 output_folder = os.path.join(output_dir, relative_path)
-                os.makedirs(output_folder, exist_ok=True)
                 output_pdf_path = os.path.join(output_folder, file)
-                try:
-                    command = [
-                        'qpdf',
-                        '--decrypt',
-                        input_pdf_path,
-                        output_pdf_path
-                    ]
-                    subprocess.run(command, check=True, shell=True)
-                    print(f"✅ Đã xử lý: {input_pdf_path}")
-                except subprocess.CalledProcessError as e:
-                    print(f"❌ Lỗi với file: {input_pdf_path} - {e}")
-
-# 👉 Ví dụ sử dụng:
-input_directory = r'E:\Data\Work\SeperateImage\lock'      # Thư mục chứa các PDF gốc
-output_directory = 'Unlock_SBT'  # Thư mục lưu PDF đã xử lý
-
-remove_pdf_restrictions_batch(input_directory, output_directory)
+                jobs.append((input_pdf_path, output_pdf_path))
+    return jobs
+
+def remove_pdf_restrictions(input_pdf_path, output_pdf_path):
+    """Decrypt một file bằng qpdf, trả về (thời gian, lỗi hoặc None)"""
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output_pdf_path) or ".", exist_ok=True)
+    # Ghi ra file tạm rồi đổi tên, tránh để lại output dở dang được coi là "đã xử lý"
+    tmp_path = output_pdf_path + ".part"
+    command = [
+        'qpdf',
+        '--decrypt',
+        input_pdf_path,
+        tmp_path
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+        # qpdf trả về 3 khi chỉ có cảnh báo, file output vẫn dùng được
+        if result.returncode not in (0, 3):
+            raise subprocess.CalledProcessError(result.returncode, command, result.stdout, result.stderr)
+        os.replace(tmp_path, output_pdf_path)
+        return time.perf_counter() - start, None
+    except (OSError, subprocess.CalledProcessError) as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        detail = getattr(e, 'stderr', None) or e
+        return time.perf_counter() - start, str(detail).strip()
+
+def remove_pdf_restrictions_batch(input_dir, output_dir, workers=None, force=False):
+    """Decrypt mọi PDF trong input_dir sang output_dir bằng một pool qpdf song song
+
+    Bỏ qua file đã có output mới hơn file gốc (trừ khi force=True).
+    Trả về list dict: input, output, seconds, status ('ok', 'skipped', 'error'), error.
+    """
+    jobs = find_pdf_jobs(input_dir, output_dir)
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+    pending = []
+    for input_pdf_path, output_pdf_path in jobs:
+        if not force and is_up_to_date(input_pdf_path, output_pdf_path):
+            results.append({'input': input_pdf_path, 'output': output_pdf_path,
+                            'seconds': 0.0, 'status': 'skipped', 'error': None})
+        else:
+            pending.append((input_pdf_path, output_pdf_path))
+
+    log.info(f"🔓 {len(jobs)} file PDF: {len(pending)} cần xử lý, {len(results)} đã cập nhật, {workers} worker")
+
+    batch_start = time.perf_counter()
+    # qpdf là process riêng nên chỉ cần thread để chờ
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(remove_pdf_restrictions, input_pdf_path, output_pdf_path):
+                   (input_pdf_path, output_pdf_path)
+                   for input_pdf_path, output_pdf_path in pending}
+        for future in as_completed(futures):
+            input_pdf_path, output_pdf_path = futures[future]
+            seconds, error = future.result()
+            results.append({'input': input_pdf_path, 'output': output_pdf_path, 'seconds': seconds,
+                            'status': 'error' if error else 'ok', 'error': error})
+            fields = event('unlock.file', input=input_pdf_path, output=output_pdf_path,
+                           seconds=round(seconds, 3), error=error)
+            if error:
+                log.error(f"❌ Lỗi với file: {input_pdf_path} ({seconds:.1f}s) - {error}", extra=fields)
+            else:
+                log.debug(f"✅ Đã xử lý: {input_pdf_path} ({seconds:.1f}s)", extra=fields)
+
+    ok = sum(1 for r in results if r['status'] == 'ok')
+    skipped = sum(1 for r in results if r['status'] == 'skipped')
+    failed = sum(1 for r in results if r['status'] == 'error')
+    batch_seconds = time.perf_counter() - batch_start
+    log.info(f"🎉 Xong: {ok} đã xử lý, {skipped} bỏ qua, {failed} lỗi ({batch_seconds:.1f}s)",
+             extra=event('unlock.done', ok=ok, skipped=skipped, failed=failed, seconds=round(batch_seconds, 3)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Gỡ mật khẩu/hạn chế của các file PDF bằng qpdf")
+    parser.add_argument('input_dir', help="Thư mục chứa các PDF gốc")
+    parser.add_argument('output_dir', nargs='?', default='Unlock_SBT', help="Thư mục lưu PDF đã xử lý")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Số qpdf chạy song song (mặc định: số core)")
+    parser.add_argument('--force', action='store_true', help="Xử lý lại cả file đã có output mới hơn")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    setup_logging_from_args(args)
+
+    results = remove_pdf_restrictions_batch(args.input_dir, args.output_dir, args.workers, args.force)
+    return 1 if any(r['status'] == 'error' for r in results) else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())